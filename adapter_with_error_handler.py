@@ -4,13 +4,21 @@ import sys
 import traceback
 from datetime import datetime
 
+from typing import List
+
 from botbuilder.core import (
     BotFrameworkAdapter,
     BotFrameworkAdapterSettings,
     ConversationState,
     TurnContext,
 )
-from botbuilder.schema import ActivityTypes, Activity
+from botbuilder.schema import ActivityTypes, Activity, ResourceResponse
+from botframework.connector.aio import ConnectorClient
+from botframework.connector.auth import ClaimsIdentity
+
+from dialogs.message_catalog import messages_for
+from recognizer_quota import QuotaExceededError
+from streaming_endpoint import SERVICE_URL_PREFIX as STREAM_SERVICE_URL
 
 
 class AdapterWithErrorHandler(BotFrameworkAdapter):
@@ -21,9 +29,16 @@ class AdapterWithErrorHandler(BotFrameworkAdapter):
     ):
         super().__init__(settings)
         self._conversation_state = conversation_state
+        # Sends the activities of the turns received over a WebSocket, see streaming_endpoint.py
+        self.streams = None
 
         # Catch-all for errors.
         async def on_error(context: TurnContext, error: Exception):
+            if isinstance(error, QuotaExceededError):
+                # Over a LUIS budget: the turn is dropped, its state was not saved.
+                await context.send_activity(messages_for(context).activity("quota.exceeded"))
+                return
+
             # This check writes out errors to console log
             # NOTE: In production environment, you should consider logging this to Azure
             #       application insights.
@@ -54,3 +69,25 @@ class AdapterWithErrorHandler(BotFrameworkAdapter):
             await self._conversation_state.delete(context)
 
         self.on_turn_error = on_error
+
+    async def authenticate(self, activity: Activity, auth_header: str) -> ClaimsIdentity:
+        """Validate the request's bearer token without running a turn.
+
+        Raises PermissionError when the request is not authorized.
+        """
+        return await self._authenticate_request(activity, auth_header or "")
+
+    async def send_activities(
+        self, context: TurnContext, activities: List[Activity]
+    ) -> List[ResourceResponse]:
+        if self.streams is not None and self.streams.owns(context.activity.service_url):
+            return await self.streams.send(context, activities)
+        return await super().send_activities(context, activities)
+
+    async def create_connector_client(
+        self, service_url: str, identity: ClaimsIdentity = None, audience: str = None
+    ) -> ConnectorClient:
+        # Clients are cached by service url: the streams, one url each, share one (unused) client.
+        if self.streams is not None and self.streams.owns(service_url):
+            service_url = STREAM_SERVICE_URL
+        return await super().create_connector_client(service_url, identity, audience)
@@ -8,6 +8,15 @@ This sample shows how to create a bot that demonstrates the following:
 - Handle user interruptions for such things as `Help` or `Cancel`.
 - Prompt for and validate requests for information from the user.
 """
+import time
+
+IMPORTS_STARTED = time.perf_counter()
+
+# pylint: disable=wrong-import-position
+import asyncio
+import copy
+import glob
+import os.path
 from http import HTTPStatus
 
 from aiohttp import web
@@ -15,39 +24,66 @@ from aiohttp.web import Request, Response, json_response
 from botbuilder.core import (
     BotFrameworkAdapterSettings,
     ConversationState,
-    MemoryStorage,
+    InvokeResponse,
+    Recognizer,
     UserState,
     TelemetryLoggerMiddleware,
 )
 from botbuilder.core.integration import aiohttp_error_middleware
-from botbuilder.schema import Activity
+from botbuilder.schema import Activity, ActivityTypes, DeliveryModes
 from botbuilder.applicationinsights import ApplicationInsightsTelemetryClient
 from botbuilder.integration.applicationinsights.aiohttp import (
     AiohttpTelemetryProcessor,
     bot_telemetry_middleware,
 )
+from botframework.connector.auth import ClaimsIdentity, MicrosoftAppCredentials
 
 from config import DefaultConfig
 from dialogs import MainDialog, BookingDialog
+from booking_snapshot import BookingSnapshotStore
 from bots import DialogAndWelcomeBot
 
 from adapter_with_error_handler import AdapterWithErrorHandler
 from flight_booking_recognizer import FlightBookingRecognizer
+from local_recognizer import LocalFlightBookingRecognizer
+from recognizer_circuit_breaker import CircuitBreakerRecognizer
+from recognizer_quota import QuotaRecognizer, RecognizerQuota
+from streaming_endpoint import StreamingEndpoint
+from recognizer_cache import NearDuplicateRecognizer
+from model_artifact import ArtifactReloader
+from helpers import activity_codec
+from turn_scheduler import TurnScheduler, TurnRejected
+from background_turn_processor import BackgroundTurnProcessor, DurableTurnQueue
+from compacting_storage import CompactingStorage
+from bounded_memory_storage import BoundedMemoryStorage, SpillStore
+from dialogs.flight_itinerary_card import CARD_PATH, load_card_template
+from dialogs.message_catalog import AVAILABLE_LOCALES, CATALOGS, DEFAULT_LOCALE
+from locale_resources import LocaleCache, LocaleRecognizer
+from bots.dialog_and_welcome_bot import load_welcome_card
+from startup import StartupMonitor, warm_open_id_metadata
+from money import RateRefresher, default_rate_table
+from prompt_models import warm_up as warm_up_prompt_models
+from loop_watchdog import LoopWatchdog
+from typing_middleware import DeferredTypingMiddleware
+from write_behind_storage import SqliteStorage, WriteBehindStorage
+from shard_router import ShardMembership
 
-CONFIG = DefaultConfig()
-
-# Create adapter.
-# See https://aka.ms/about-bot-adapter to learn more about how bots work.
-SETTINGS = BotFrameworkAdapterSettings(CONFIG.APP_ID, CONFIG.APP_PASSWORD)
+STARTUP = StartupMonitor()
+STARTUP.record("imports", IMPORTS_STARTED)
+INITIALIZATION_STARTED = time.perf_counter()
 
-# Create MemoryStorage, UserState and ConversationState
-MEMORY = MemoryStorage()
-USER_STATE = UserState(MEMORY)
-CONVERSATION_STATE = ConversationState(MEMORY)
+CONFIG = DefaultConfig()
 
 # Create adapter.
 # See https://aka.ms/about-bot-adapter to learn more about how bots work.
-ADAPTER = AdapterWithErrorHandler(SETTINGS, CONVERSATION_STATE)
+# The credentials are created here, rather than by the adapter on the first
+# reply, so that their access token can be fetched during warm-up.
+APP_CREDENTIALS = (
+    MicrosoftAppCredentials(CONFIG.APP_ID, CONFIG.APP_PASSWORD) if CONFIG.APP_ID else None
+)
+SETTINGS = BotFrameworkAdapterSettings(
+    CONFIG.APP_ID, CONFIG.APP_PASSWORD, app_credentials=APP_CREDENTIALS
+)
 
 # Create telemetry client.
 # Note the small 'client_queue_size'.  This is for demonstration purposes.  Larger queue sizes
@@ -57,41 +93,452 @@ INSTRUMENTATION_KEY = CONFIG.APPINSIGHTS_INSTRUMENTATION_KEY
 TELEMETRY_CLIENT = ApplicationInsightsTelemetryClient(
     INSTRUMENTATION_KEY, telemetry_processor=AiohttpTelemetryProcessor(), client_queue_size=10
 )
+STARTUP.telemetry_client = TELEMETRY_CLIENT
+
+# Create the state storage, UserState and ConversationState
+# Dialog state is compacted before it is stored, see compacting_storage.py, in a store
+# that bounds its memory use, see bounded_memory_storage.py, optionally written behind
+# to a durable store, see write_behind_storage.py
+STATE_SPILL = SpillStore(CONFIG.STATE_SPILL_PATH) if CONFIG.STATE_SPILL_PATH else None
+LOCAL_STATE = BoundedMemoryStorage(
+    max_bytes=CONFIG.STATE_MEMORY_BUDGET_BYTES,
+    ttl_seconds=CONFIG.STATE_TTL_SECONDS,
+    spill=STATE_SPILL,
+    telemetry_client=TELEMETRY_CLIENT,
+)
+WRITE_BEHIND = (
+    WriteBehindStorage(
+        LOCAL_STATE,
+        SqliteStorage(CONFIG.DURABLE_STATE_PATH),
+        flush_seconds=CONFIG.WRITE_BEHIND_SECONDS,
+        telemetry_client=TELEMETRY_CLIENT,
+    )
+    if CONFIG.DURABLE_STATE_PATH
+    else None
+)
+MEMORY = CompactingStorage(
+    WRITE_BEHIND or LOCAL_STATE,
+    max_state_bytes=CONFIG.MAX_CONVERSATION_STATE_BYTES,
+    telemetry_client=TELEMETRY_CLIENT,
+)
+# Unfinished bookings are offered again on the user's next visit: kept durably.
+USER_STORAGE = SqliteStorage(CONFIG.USER_STATE_PATH) if CONFIG.USER_STATE_PATH else None
+USER_STATE = UserState(USER_STORAGE or MEMORY)
+CONVERSATION_STATE = ConversationState(MEMORY)
+
+# Create adapter.
+# See https://aka.ms/about-bot-adapter to learn more about how bots work.
+ADAPTER = AdapterWithErrorHandler(SETTINGS, CONVERSATION_STATE)
 
 # Code for enabling activity and personal information logging.
 TELEMETRY_LOGGER_MIDDLEWARE = TelemetryLoggerMiddleware(
     telemetry_client=TELEMETRY_CLIENT, log_personal_information=False
 )
 ADAPTER.use(TELEMETRY_LOGGER_MIDDLEWARE)
+if CONFIG.TYPING_DELAY_MS:
+    ADAPTER.use(
+        DeferredTypingMiddleware(
+            CONFIG.TYPING_DELAY_MS / 1000,
+            CONFIG.TYPING_PERIOD_MS / 1000,
+            telemetry_client=TELEMETRY_CLIENT,
+        )
+    )
+
+# Budgets of the LUIS calls, shared by the LUIS apps of every locale
+RECOGNIZER_QUOTA = RecognizerQuota(
+    tps=CONFIG.RECOGNIZER_TPS,
+    max_wait_seconds=CONFIG.RECOGNIZER_QUOTA_MAX_WAIT_MS / 1000,
+    user_calls_per_minute=CONFIG.RECOGNIZER_USER_CALLS_PER_MINUTE,
+    user_burst=CONFIG.RECOGNIZER_USER_BURST,
+    conversation_calls_per_minute=CONFIG.RECOGNIZER_CONVERSATION_CALLS_PER_MINUTE,
+    conversation_burst=CONFIG.RECOGNIZER_CONVERSATION_BURST,
+    reject_over_quota=CONFIG.RECOGNIZER_OVER_QUOTA == "reject",
+    telemetry_client=TELEMETRY_CLIENT,
+)
 
 # Create dialogs and Bot
-RECOGNIZER = FlightBookingRecognizer(CONFIG)
-BOOKING_DIALOG = BookingDialog(telemetry_client=TELEMETRY_CLIENT)
-DIALOG = MainDialog(RECOGNIZER, BOOKING_DIALOG, telemetry_client=TELEMETRY_CLIENT)
+LUIS_RECOGNIZER = FlightBookingRecognizer(CONFIG, quota=RECOGNIZER_QUOTA)
+
+
+# Local models mapped from compiled artifacts, see model_artifact.py
+MODEL_ARTIFACTS = (
+    ArtifactReloader(
+        CONFIG.LOCAL_MODEL_ARTIFACT_DIR,
+        CONFIG.LOCAL_MODEL_RELOAD_SECONDS,
+        telemetry_client=TELEMETRY_CLIENT,
+    )
+    if CONFIG.LOCAL_MODEL_ARTIFACT_DIR
+    else None
+)
+# Keeps the currency rates fresh while the worker runs, see money.py.
+RATE_REFRESHER = (
+    RateRefresher(
+        default_rate_table(),
+        CONFIG.CURRENCY_RATES_CHECK_SECONDS,
+        telemetry_client=TELEMETRY_CLIENT,
+    )
+    if CONFIG.CURRENCY_RATES_URL
+    else None
+)
+
+
+def local_recognizer(model_path: str) -> LocalFlightBookingRecognizer:
+    """The local model at `model_path`, batching the recognitions of concurrent turns if enabled."""
+    options = dict(
+        batch_window_seconds=CONFIG.LOCAL_RECOGNITION_BATCH_WINDOW_MS / 1000,
+        max_batch_size=CONFIG.LOCAL_RECOGNITION_MAX_BATCH,
+        executor_batch_size=CONFIG.LOCAL_RECOGNITION_EXECUTOR_BATCH,
+        telemetry_client=TELEMETRY_CLIENT,
+    )
+    if MODEL_ARTIFACTS is not None:
+        return MODEL_ARTIFACTS.load(model_path, **options)
+    return LocalFlightBookingRecognizer.from_luis_export(model_path, **options)
+
+
+LOCAL_RECOGNIZER = local_recognizer(CONFIG.LOCAL_MODEL_PATH)
+PRIMARY_RECOGNIZER = LUIS_RECOGNIZER
+if CONFIG.RECOGNIZER_CASSETTE_MODE:
+    from recognizer_cassette import CassetteRecognizer
+
+    PRIMARY_RECOGNIZER = CassetteRecognizer(
+        LUIS_RECOGNIZER,
+        CONFIG.RECOGNIZER_CASSETTE_PATH,
+        CONFIG.RECOGNIZER_CASSETTE_MODE,
+        telemetry_client=TELEMETRY_CLIENT,
+    )
+
+
+def with_quota(recognizer: Recognizer) -> Recognizer:
+    # Replayed cassettes do not call LUIS.
+    if not RECOGNIZER_QUOTA.enabled or CONFIG.RECOGNIZER_CASSETTE_MODE == "replay":
+        return recognizer
+    return QuotaRecognizer(recognizer, RECOGNIZER_QUOTA)
+
+
+def with_recognizer_cache(recognizer: Recognizer) -> Recognizer:
+    # Near-duplicate utterances reuse an earlier LUIS result. Replayed cassettes are exact already.
+    if not CONFIG.RECOGNIZER_CACHE_CAPACITY or CONFIG.RECOGNIZER_CASSETTE_MODE == "replay":
+        return recognizer
+    return NearDuplicateRecognizer(
+        recognizer,
+        capacity=CONFIG.RECOGNIZER_CACHE_CAPACITY,
+        threshold=CONFIG.RECOGNIZER_CACHE_THRESHOLD,
+        telemetry_client=TELEMETRY_CLIENT,
+    )
+
+
+PRIMARY_RECOGNIZER = with_recognizer_cache(with_quota(PRIMARY_RECOGNIZER))
+
+
+def with_circuit_breaker(recognizer: Recognizer, fallback: Recognizer) -> CircuitBreakerRecognizer:
+    # LUIS behind a circuit breaker that falls back to the local model while LUIS is down or slow.
+    return CircuitBreakerRecognizer(
+        recognizer,
+        fallback,
+        window_size=CONFIG.RECOGNIZER_BREAKER_WINDOW,
+        minimum_calls=CONFIG.RECOGNIZER_BREAKER_MIN_CALLS,
+        error_rate_threshold=CONFIG.RECOGNIZER_BREAKER_ERROR_RATE,
+        slow_call_ms=CONFIG.RECOGNIZER_BREAKER_SLOW_CALL_MS,
+        slow_call_rate_threshold=CONFIG.RECOGNIZER_BREAKER_SLOW_CALL_RATE,
+        open_seconds=CONFIG.RECOGNIZER_BREAKER_OPEN_SECONDS,
+        half_open_probes=CONFIG.RECOGNIZER_BREAKER_PROBES,
+        telemetry_client=TELEMETRY_CLIENT,
+    )
+
+
+def locale_model_paths() -> dict:
+    """Locale -> local model exported for that locale, see LOCALE_MODEL_PATH_PATTERN."""
+    prefix, suffix = CONFIG.LOCALE_MODEL_PATH_PATTERN.split("{locale}")
+    return {
+        path[len(prefix):len(path) - len(suffix)]: path
+        for path in glob.glob(CONFIG.LOCALE_MODEL_PATH_PATTERN.format(locale="*"))
+    }
+
+
+def create_locale_recognizer(locale: str) -> Recognizer:
+    """The recognizer of `locale`: its LUIS app, if any, in front of its local model."""
+    if locale == DEFAULT_LOCALE:
+        return RECOGNIZER
+    model_path = LOCALE_MODEL_PATHS.get(locale)
+    local = local_recognizer(model_path) if model_path else LOCAL_RECOGNIZER
+    config = copy.copy(CONFIG)
+    config.LUIS_APP_ID = CONFIG.LUIS_APP_IDS_BY_LOCALE.get(locale, "")
+    luis = FlightBookingRecognizer(config, quota=RECOGNIZER_QUOTA)
+    if not luis.is_configured:
+        luis.close()
+        return local
+    return with_circuit_breaker(with_recognizer_cache(with_quota(luis)), local)
+
+
+def _close_recognizer(locale: str, recognizer: Recognizer):
+    if hasattr(recognizer, "close"):
+        recognizer.close()
+
+
+RECOGNIZER = with_circuit_breaker(PRIMARY_RECOGNIZER, LOCAL_RECOGNIZER)
+# Turns are recognized in their own locale when it has a LUIS app or a local model,
+# see locale_resources.py. Recorded cassettes only cover the default locale.
+LOCALE_MODEL_PATHS = locale_model_paths()
+LOCALE_RECOGNIZER = LocaleRecognizer(
+    LocaleCache(
+        create_locale_recognizer,
+        DEFAULT_LOCALE,
+        max_resident=CONFIG.MAX_RESIDENT_LOCALES,
+        idle_seconds=CONFIG.LOCALE_IDLE_SECONDS,
+        on_evict=_close_recognizer,
+        name="recognizer",
+        telemetry_client=TELEMETRY_CLIENT,
+    ),
+    [DEFAULT_LOCALE, *CONFIG.LUIS_APP_IDS_BY_LOCALE, *LOCALE_MODEL_PATHS],
+)
+CATALOGS.telemetry_client = TELEMETRY_CLIENT
+BOOKING_SNAPSHOTS = BookingSnapshotStore(USER_STATE, TELEMETRY_CLIENT)
+LOOP_WATCHDOG = (
+    LoopWatchdog(
+        CONFIG.LOOP_WATCHDOG_INTERVAL_MS / 1000,
+        CONFIG.LOOP_STALL_MS / 1000,
+        CONFIG.LOOP_LAG_REPORT_SECONDS,
+        telemetry_client=TELEMETRY_CLIENT,
+    )
+    if CONFIG.LOOP_WATCHDOG_INTERVAL_MS
+    else None
+)
+BOOKING_DIALOG = BookingDialog(
+    telemetry_client=TELEMETRY_CLIENT,
+    luis_recognizer=LOCALE_RECOGNIZER,
+    snapshots=BOOKING_SNAPSHOTS,
+)
+DIALOG = MainDialog(
+    LOCALE_RECOGNIZER, BOOKING_DIALOG, telemetry_client=TELEMETRY_CLIENT, snapshots=BOOKING_SNAPSHOTS
+)
 BOT = DialogAndWelcomeBot(CONVERSATION_STATE, USER_STATE, DIALOG, TELEMETRY_CLIENT)
 
+# Serialize turns per conversation and bound the number of turns in flight.
+SCHEDULER = TurnScheduler(
+    max_in_flight=CONFIG.MAX_CONCURRENT_TURNS,
+    max_queued=CONFIG.MAX_QUEUED_TURNS,
+    max_queued_per_conversation=CONFIG.MAX_QUEUED_TURNS_PER_CONVERSATION,
+    max_queue_wait=CONFIG.MAX_TURN_QUEUE_WAIT_SECONDS,
+    retry_after=CONFIG.TURN_RETRY_AFTER_SECONDS,
+    telemetry_client=TELEMETRY_CLIENT,
+)
+
+# Optionally acknowledge activities right away and run the turns in the background.
+BACKGROUND_PROCESSOR = (
+    BackgroundTurnProcessor(
+        ADAPTER,
+        BOT.on_turn,
+        DurableTurnQueue(CONFIG.TURN_QUEUE_PATH),
+        SCHEDULER,
+        workers=CONFIG.TURN_WORKERS,
+        capacity=CONFIG.TURN_QUEUE_CAPACITY,
+        telemetry_client=TELEMETRY_CLIENT,
+    )
+    if CONFIG.ASYNC_TURN_PROCESSING
+    else None
+)
+
+# Serve only the conversations this worker owns, see shard_router.py.
+SHARD = (
+    ShardMembership(
+        CONFIG.SHARD_SELF,
+        CONFIG.SHARD_WORKERS,
+        WRITE_BEHIND,
+        secret=CONFIG.SHARD_SECRET,
+        telemetry_client=TELEMETRY_CLIENT,
+    )
+    if CONFIG.SHARD_SELF
+    else None
+)
+
+STARTUP.record("initialization", INITIALIZATION_STARTED)
+
+
+def warm_up_tasks() -> dict:
+    """What the first turns would otherwise load lazily, see startup.py."""
+    loop = asyncio.get_event_loop()
+    tasks = {
+        "local_model": lambda: loop.run_in_executor(None, LOCAL_RECOGNIZER.model.warm_up),
+        "cards": lambda: loop.run_in_executor(None, _load_cards),
+        "currency_rates": lambda: loop.run_in_executor(None, _load_currency_rates),
+        "prompt_models": lambda: loop.run_in_executor(
+            None, warm_up_prompt_models, AVAILABLE_LOCALES
+        ),
+    }
+    if LUIS_RECOGNIZER.is_configured and CONFIG.RECOGNIZER_CASSETTE_MODE != "replay":
+        tasks["luis"] = LUIS_RECOGNIZER.warm_up
+    if APP_CREDENTIALS is not None:
+        tasks["open_id_metadata"] = warm_open_id_metadata
+        tasks["access_token"] = lambda: loop.run_in_executor(
+            None, APP_CREDENTIALS.get_access_token
+        )
+    return tasks
+
+
+def _load_cards():
+    load_card_template(CARD_PATH)
+    load_welcome_card()
+
+
+def _load_currency_rates():
+    rates = default_rate_table()
+    if rates.is_stale:
+        rates.refresh()
+
+
+def runs_in_background(activity: Activity) -> bool:
+    # Invokes and expectReplies need the turn's result in the HTTP response.
+    return (
+        BACKGROUND_PROCESSOR is not None
+        and activity.type != ActivityTypes.invoke
+        and activity.delivery_mode != DeliveryModes.expect_replies
+    )
+
 
 # Listen for incoming requests on /api/messages.
 async def messages(req: Request) -> Response:
     # Main bot message handler.
-    if "application/json" in req.headers["Content-Type"]:
-        body = await req.json()
-    else:
+    if "application/json" not in req.headers["Content-Type"]:
         return Response(status=HTTPStatus.UNSUPPORTED_MEDIA_TYPE)
 
-    activity = Activity().deserialize(body)
+    if CONFIG.FAST_ACTIVITY_CODEC:
+        body = await req.json(loads=activity_codec.loads)
+        activity = activity_codec.deserialize_activity(body)
+    else:
+        body = await req.json()
+        activity = Activity().deserialize(body)
     auth_header = req.headers["Authorization"] if "Authorization" in req.headers else ""
 
-    response = await ADAPTER.process_activity(activity, auth_header, BOT.on_turn)
+    conversation_id = activity.conversation.id if activity.conversation else ""
+    if SHARD is not None and not SHARD.owns(conversation_id):
+        # Moved to another worker: the router sends it there.
+        return Response(status=HTTPStatus.MISDIRECTED_REQUEST)
+
+    if runs_in_background(activity):
+        try:
+            identity = await ADAPTER.authenticate(activity, auth_header)
+        except PermissionError:
+            return Response(status=HTTPStatus.UNAUTHORIZED)
+        try:
+            await BACKGROUND_PROCESSOR.submit(activity, identity)
+        except TurnRejected as rejection:
+            return Response(
+                status=rejection.status,
+                headers={"Retry-After": str(rejection.retry_after)},
+            )
+        return Response(status=HTTPStatus.ACCEPTED)
+
+    try:
+        response = await SCHEDULER.run(
+            conversation_id,
+            lambda: _process_activity(activity, auth_header, conversation_id),
+        )
+    except TurnRejected as rejection:
+        return Response(
+            status=rejection.status,
+            headers={"Retry-After": str(rejection.retry_after)},
+        )
     if response:
-        return json_response(data=response.body, status=response.status)
+        return json_response(
+            data=response.body, status=response.status, dumps=activity_codec.dumps
+        )
     return Response(status=HTTPStatus.OK)
 
 
+async def _process_activity(
+    activity: Activity, auth_header: str, conversation_id: str, identity: ClaimsIdentity = None
+):
+    async def run_turn():
+        # Streamed activities are authenticated before their service url is replaced.
+        if identity is not None:
+            return await ADAPTER.process_activity_with_identity(activity, identity, BOT.on_turn)
+        return await ADAPTER.process_activity(activity, auth_header, BOT.on_turn)
+
+    if SHARD is None:
+        return await run_turn()
+    # A rebalance waits for the turn before handing the conversation over; a turn
+    # queued by the scheduler meanwhile is sent back.
+    async with SHARD.turn(conversation_id):
+        if not SHARD.owns(conversation_id):
+            return InvokeResponse(status=HTTPStatus.MISDIRECTED_REQUEST)
+        return await run_turn()
+
+
+async def _process_streamed_activity(activity: Activity, identity: ClaimsIdentity):
+    conversation_id = activity.conversation.id if activity.conversation else ""
+    if SHARD is not None and not SHARD.owns(conversation_id):
+        return InvokeResponse(status=HTTPStatus.MISDIRECTED_REQUEST)
+    # _process_activity enters SHARD.turn(), so that a rebalance waits for streamed turns too.
+    return await SCHEDULER.run(
+        conversation_id,
+        lambda: _process_activity(activity, "", conversation_id, identity),
+    )
+
+
+# Turns and replies over one WebSocket per client, see streaming_endpoint.py
+STREAMING = (
+    StreamingEndpoint(
+        ADAPTER.authenticate,
+        _process_streamed_activity,
+        heartbeat_seconds=CONFIG.STREAMING_HEARTBEAT_SECONDS,
+        telemetry_client=TELEMETRY_CLIENT,
+    )
+    if CONFIG.STREAMING_ENDPOINT
+    else None
+)
+ADAPTER.streams = STREAMING
+
+
+async def _close_cassette():
+    PRIMARY_RECOGNIZER.close()
+
+
+async def _close_locale_recognizers():
+    LOCALE_RECOGNIZER.close()
+
+
+async def _start_warm_up():
+    STARTUP.start_warm_up(warm_up_tasks())
+
+
 # python3.8 -m aiohttp.web -H 0.0.0.0 -P 8000 app:init_func
 def init_func(argv):
     app = web.Application(middlewares=[bot_telemetry_middleware, aiohttp_error_middleware])
     app.router.add_post("/api/messages", messages)
+    if STREAMING is not None:
+        app.router.add_get("/api/stream", STREAMING.handler)
+    # Answers 503 until the warm-up is done
+    app.router.add_get("/api/ready", STARTUP.ready_handler)
+    app.on_startup.append(lambda _: _start_warm_up())
+    app.on_cleanup.append(lambda _: STARTUP.stop())
+    if LOOP_WATCHDOG is not None:
+        # Lag histogram and recent stalls
+        app.router.add_get("/api/loop", LOOP_WATCHDOG.lag_handler)
+        app.on_startup.append(lambda _: LOOP_WATCHDOG.start())
+        app.on_cleanup.append(lambda _: LOOP_WATCHDOG.stop())
+    if RATE_REFRESHER is not None:
+        app.on_startup.append(lambda _: RATE_REFRESHER.start())
+        app.on_cleanup.append(lambda _: RATE_REFRESHER.stop())
+    if MODEL_ARTIFACTS is not None:
+        app.on_startup.append(lambda _: MODEL_ARTIFACTS.start())
+        app.on_cleanup.append(lambda _: MODEL_ARTIFACTS.stop())
+    if BACKGROUND_PROCESSOR is not None:
+        app.on_startup.append(lambda _: BACKGROUND_PROCESSOR.start())
+        app.on_cleanup.append(lambda _: BACKGROUND_PROCESSOR.stop())
+    if WRITE_BEHIND is not None:
+        app.on_startup.append(lambda _: WRITE_BEHIND.start())
+        app.on_cleanup.append(lambda _: WRITE_BEHIND.stop())
+        app.on_cleanup.append(lambda _: WRITE_BEHIND.durable.close())
+    if SHARD is not None and SHARD.secret:
+        # New list of workers, from the router; requires the shared secret
+        app.router.add_post("/api/shard", SHARD.shard_handler)
+    if STATE_SPILL is not None:
+        app.on_cleanup.append(lambda _: STATE_SPILL.close())
+    if USER_STORAGE is not None:
+        app.on_cleanup.append(lambda _: USER_STORAGE.close())
+    if CONFIG.RECOGNIZER_CASSETTE_MODE:
+        app.on_cleanup.append(lambda _: _close_cassette())
+    app.on_cleanup.append(lambda _: _close_locale_recognizers())
     return app
 
 
@@ -0,0 +1,228 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Acknowledge activities immediately and run their turns in the background.
+
+In this mode `messages()` only authenticates the activity, writes it to a
+local SQLite journal and answers 202. A bounded pool of workers then runs the
+turns; replies leave through the connector client bound to the stored
+activity's conversation reference (service url, conversation, recipient),
+exactly like proactive messages, so a slow recognizer no longer holds the
+channel's HTTP request open. Journal rows are only deleted once their turn
+has run, so turns accepted before a restart are replayed on the next start.
+
+The turns of a conversation run one at a time, in the order they were
+accepted: a worker takes the conversation's lock before handing the turn to
+the TurnScheduler, and a turn the scheduler sheds is retried in place,
+still holding it.
+"""
+
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from botbuilder.core import BotTelemetryClient, NullTelemetryClient
+from botbuilder.schema import Activity
+from botframework.connector.auth import ClaimsIdentity
+
+from turn_scheduler import TurnScheduler, TurnRejected
+
+
+class DurableTurnQueue:
+    """SQLite journal of accepted turns.
+
+    All statements run on a single dedicated thread so the event loop never
+    waits on the disk and the connection never crosses threads.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._connection = None
+
+    def _open(self):
+        # Imported here: only bots running in background mode need sqlite3.
+        import sqlite3
+
+        self._connection = sqlite3.connect(self.path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS turns ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "activity TEXT NOT NULL, "
+            "claims TEXT NOT NULL, "
+            "enqueued_at REAL NOT NULL)"
+        )
+        self._connection.commit()
+
+    def _put(self, activity: str, claims: str, enqueued_at: float) -> int:
+        cursor = self._connection.execute(
+            "INSERT INTO turns (activity, claims, enqueued_at) VALUES (?, ?, ?)",
+            (activity, claims, enqueued_at),
+        )
+        self._connection.commit()
+        return cursor.lastrowid
+
+    def _remove(self, row_id: int):
+        self._connection.execute("DELETE FROM turns WHERE id = ?", (row_id,))
+        self._connection.commit()
+
+    def _pending(self) -> List[Tuple[int, str, str, float]]:
+        return self._connection.execute(
+            "SELECT id, activity, claims, enqueued_at FROM turns ORDER BY id"
+        ).fetchall()
+
+    def _close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    async def _run(self, function, *args):
+        return await asyncio.get_event_loop().run_in_executor(
+            self._executor, function, *args
+        )
+
+    async def open(self):
+        await self._run(self._open)
+
+    async def put(self, activity: dict, claims: dict, enqueued_at: float) -> int:
+        return await self._run(
+            self._put, json.dumps(activity), json.dumps(claims), enqueued_at
+        )
+
+    async def remove(self, row_id: int):
+        await self._run(self._remove, row_id)
+
+    async def pending(self) -> List[Tuple[int, dict, dict, float]]:
+        rows = await self._run(self._pending)
+        return [
+            (row_id, json.loads(activity), json.loads(claims), enqueued_at)
+            for row_id, activity, claims, enqueued_at in rows
+        ]
+
+    async def close(self):
+        await self._run(self._close)
+        self._executor.shutdown(wait=True)
+
+
+class _ConversationTurns:
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        # Turns of the conversation taken by a worker and not done yet
+        self.pending = 0
+
+
+class BackgroundTurnProcessor:
+    """Bounded worker pool draining a DurableTurnQueue."""
+
+    def __init__(
+        self,
+        adapter,
+        logic: Callable[..., Awaitable],
+        journal: DurableTurnQueue,
+        scheduler: TurnScheduler,
+        workers: int = 8,
+        capacity: int = 1024,
+        telemetry_client: BotTelemetryClient = None,
+    ):
+        self.adapter = adapter
+        self.logic = logic
+        self.journal = journal
+        self.scheduler = scheduler
+        self.workers = workers
+        self.capacity = capacity
+        self.telemetry_client = telemetry_client or NullTelemetryClient()
+
+        self._queue: asyncio.Queue = None
+        self._tasks: List[asyncio.Task] = []
+        self._conversations: Dict[str, _ConversationTurns] = {}
+
+    @property
+    def backlog(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self):
+        """Open the journal, requeue turns left over from a previous run and start the workers."""
+        self._queue = asyncio.Queue()
+        await self.journal.open()
+        for row_id, activity, claims, enqueued_at in await self.journal.pending():
+            self._queue.put_nowait((row_id, activity, claims, enqueued_at))
+        self._tasks = [
+            asyncio.ensure_future(self._work()) for _ in range(self.workers)
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.journal.close()
+
+    async def submit(self, activity: Activity, identity: ClaimsIdentity):
+        """Durably enqueue an authenticated activity. Raises TurnRejected when full."""
+        if self.backlog >= self.capacity:
+            raise TurnRejected(
+                HTTPStatus.SERVICE_UNAVAILABLE,
+                self.scheduler.retry_after,
+                "background turn queue full",
+            )
+        activity_data = activity.serialize()
+        enqueued_at = time.time()
+        row_id = await self.journal.put(activity_data, identity.claims, enqueued_at)
+        self._queue.put_nowait((row_id, activity_data, identity.claims, enqueued_at))
+        self.telemetry_client.track_metric("BackgroundTurnBacklog", self.backlog)
+
+    async def _work(self):
+        while True:
+            row_id, activity_data, claims, enqueued_at = await self._queue.get()
+            activity = Activity().deserialize(activity_data)
+            identity = ClaimsIdentity(claims, True)
+            conversation_id = activity.conversation.id if activity.conversation else ""
+            # Registered before any await: the lock is granted in the order turns are taken.
+            turns = self._conversations.get(conversation_id)
+            if turns is None:
+                turns = self._conversations[conversation_id] = _ConversationTurns()
+            turns.pending += 1
+            try:
+                async with turns.lock:
+                    await self._run_in_place(conversation_id, activity, identity, enqueued_at)
+            except Exception as error:  # pylint: disable=broad-except
+                # The adapter's on_turn_error has already answered the user.
+                self._report(error, conversation_id)
+            finally:
+                turns.pending -= 1
+                if not turns.pending:
+                    del self._conversations[conversation_id]
+            try:
+                await self.journal.remove(row_id)
+            except Exception as error:  # pylint: disable=broad-except
+                # The turn ran; it will run again after a restart.
+                self._report(error, conversation_id)
+
+    async def _run_in_place(
+        self, conversation_id: str, activity: Activity, identity: ClaimsIdentity, enqueued_at: float
+    ):
+        """Run the turn, retrying it while the scheduler sheds it."""
+        while True:
+            try:
+                return await self.scheduler.run(
+                    conversation_id,
+                    lambda: self._process(activity, identity, enqueued_at),
+                )
+            except TurnRejected as rejection:
+                # Still journaled, and still ahead of the conversation's later turns.
+                await asyncio.sleep(rejection.retry_after)
+
+    def _report(self, error: Exception, conversation_id: str):
+        self.telemetry_client.track_exception(
+            type(error), error, error.__traceback__,
+            properties={"conversation_id": conversation_id},
+        )
+
+    async def _process(self, activity: Activity, identity: ClaimsIdentity, enqueued_at: float):
+        self.telemetry_client.track_metric(
+            "BackgroundTurnLagMs", (time.time() - enqueued_at) * 1000
+        )
+        await self.adapter.process_activity_with_identity(activity, identity, self.logic)
@@ -0,0 +1,4 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Benchmarks module. Run each benchmark from the repository root with
+``python -m benchmarks.<name>``."""
@@ -0,0 +1,72 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Compare the msrest activity path with helpers.activity_codec.
+
+    python -m benchmarks.activity_codec_benchmark [iterations]
+
+For each payload, reports activities/sec and bytes allocated per activity for
+decoding (raw JSON to Activity) and encoding (Activity to JSON text).
+"""
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from botbuilder.schema import Activity
+
+from helpers import activity_codec
+from helpers.activity_helper import create_activity_reply
+
+PAYLOADS_DIR = os.path.join(os.path.dirname(__file__), "payloads")
+PAYLOADS = ("teams_message.json", "directline_message.json")
+
+
+def msrest_decode(raw: bytes) -> Activity:
+    return Activity().deserialize(json.loads(raw))
+
+
+def msrest_encode(activity: Activity) -> str:
+    return json.dumps(activity.serialize())
+
+
+def measure(function, argument, iterations: int):
+    """Return (operations per second, retained bytes per operation)."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function(argument)
+    rate = iterations / (time.perf_counter() - start)
+
+    sample = max(iterations // 10, 1)
+    tracemalloc.start()
+    results = [function(argument) for _ in range(sample)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del results
+    return rate, current / sample
+
+
+def main(iterations: int = 20000):
+    print(f"JSON library: {activity_codec.JSON_LIBRARY}, {iterations} iterations")
+    print(f"{'payload':<26}{'path':<14}{'activities/s':>14}{'bytes/act':>12}")
+    for name in PAYLOADS:
+        with open(os.path.join(PAYLOADS_DIR, name), "rb") as payload_file:
+            raw = payload_file.read()
+
+        inbound = msrest_decode(raw)
+        reply = create_activity_reply(inbound, "What can I help you with today?")
+        reply.timestamp = None
+        cases = (
+            ("decode msrest", msrest_decode, raw),
+            ("decode fast", activity_codec.decode_activity, raw),
+            ("encode msrest", msrest_encode, reply),
+            ("encode fast", activity_codec.encode_activity, reply),
+        )
+        for label, function, argument in cases:
+            rate, allocated = measure(function, argument, iterations)
+            print(f"{name:<26}{label:<14}{rate:>14,.0f}{allocated:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
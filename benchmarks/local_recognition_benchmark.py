@@ -0,0 +1,74 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Compare local recognition one utterance at a time with micro-batching.
+
+    python -m benchmarks.local_recognition_benchmark [concurrency]
+
+Reports intents scored per second one by one and in one batch (NumPy when
+installed), then `concurrency` concurrent turns recognized through
+LocalFlightBookingRecognizer with and without a batching window: the batch
+sizes formed and the utterances recognized per second.
+"""
+
+import asyncio
+import sys
+import time
+
+from botbuilder.schema import Activity, ConversationAccount
+
+import local_recognizer
+from local_recognizer import LocalFlightBookingModel, LocalFlightBookingRecognizer, tokenize
+
+UTTERANCES = (
+    "I want to fly from Paris to London",
+    "book a flight to Berlin for 2 adults",
+    "help",
+    "cancel",
+    "Paris",
+    "I have a budget of 800$",
+)
+
+
+class FakeContext:
+    def __init__(self, text):
+        self.activity = Activity(type="message", text=text, conversation=ConversationAccount(id="c"))
+
+
+def measure(function, runs: int, per_run: int) -> float:
+    start = time.perf_counter()
+    for _ in range(runs):
+        function()
+    return runs * per_run / (time.perf_counter() - start)
+
+
+async def recognize_all(recognizer, contexts) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(recognizer.recognize(context) for context in contexts))
+    return len(contexts) / (time.perf_counter() - start)
+
+
+def main(concurrency: int = 64):
+    model = LocalFlightBookingModel.from_luis_export("cognitiveModels/Flight Booking Chatbot.json")
+    model.warm_up()
+    texts = [UTTERANCES[index % len(UTTERANCES)] for index in range(concurrency)]
+    tokens = [[token for token, _, _ in tokenize(text)] for text in texts]
+
+    print(f"numpy: {'yes' if local_recognizer.numpy is not None else 'no'}")
+    print(f"{'intent scoring':<28}{'utterances/s':>14}")
+    for name, function in (
+        ("one by one", lambda: [model.score_intents(item) for item in tokens]),
+        ("batch", lambda: model.score_intents_batch(tokens)),
+    ):
+        print(f"{name:<28}{measure(function, 50, len(tokens)):>14,.0f}")
+
+    contexts = [FakeContext(text) for text in texts]
+    print(f"\n{'concurrent turns':<28}{'utterances/s':>14}  batch sizes")
+    for name, window in (("no batching", 0), ("2 ms window", 0.002)):
+        recognizer = LocalFlightBookingRecognizer(model, batch_window_seconds=window)
+        rate = asyncio.run(recognize_all(recognizer, contexts))
+        sizes = dict(recognizer.batcher.sizes) if recognizer.batcher else {}
+        print(f"{name:<28}{rate:>14,.0f}  {sizes}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 64)
@@ -0,0 +1,100 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Compare building bot messages per turn with the pre-rendered catalog.
+
+    python -m benchmarks.message_catalog_benchmark [iterations]
+
+For each kind of turn, reports turns/sec and bytes allocated per turn for the
+messages that turn sends: a slot prompt with its retry, the confirmation
+summary, and the booking confirmed reply. The end-to-end turn latency is
+measured by `python -m transcript_replay replay tests/transcripts`.
+"""
+
+import sys
+import time
+import tracemalloc
+
+from botbuilder.core import MessageFactory
+from botbuilder.dialogs.prompts import PromptOptions
+from botbuilder.schema import InputHints
+
+from booking_details import BookingDetails
+from dialogs.message_catalog import MESSAGES
+
+DETAILS = BookingDetails(
+    dst_city="London", or_city="Paris", str_date="2025-06-12", end_date="2025-06-20",
+    budget="500 dollars", n_adults=2, n_children=1,
+)
+RETRY = """Sorry, I couldn't process your budget input. Try
+            in a different way. Eg. 'I have a budget of 500$.'."""
+
+
+def inline_prompt(details: BookingDetails):
+    return PromptOptions(
+        prompt=MessageFactory.text("What is your budget?"),
+        retry_prompt=MessageFactory.text(RETRY),
+    )
+
+
+def catalog_prompt(details: BookingDetails):
+    return MESSAGES.prompt_options("booking.budget", "booking.budget_retry")
+
+
+def inline_confirm(details: BookingDetails):
+    msg = (f"Just confirming, you are traveling from {details.or_city} to {details.dst_city} "
+           f"from {details.str_date} to {details.end_date} with {details.n_adults} adult(s) "
+           f"and {details.n_children} child(ren), and a budget of {details.budget}. Does this sound correct?")
+    return PromptOptions(prompt=MessageFactory.text(msg))
+
+
+def catalog_confirm(details: BookingDetails):
+    return MESSAGES.prompt_options("booking.confirm", **vars(details))
+
+
+def inline_confirmed(details: BookingDetails):
+    msg_txt = f"""Your flight is confirmed for {details.n_adults}
+            adult(s) and {details.n_children}, from {details.or_city} to
+            {details.dst_city}, on {details.str_date} and return on
+            {details.end_date}.
+            All of the booking details will be sent to you via email. Have a
+            good flight!
+            """
+    return MessageFactory.text(msg_txt, msg_txt, InputHints.ignoring_input)
+
+
+def catalog_confirmed(details: BookingDetails):
+    return MESSAGES.activity("main.confirmed", **vars(details))
+
+
+def measure(function, argument, iterations: int):
+    """Return (operations per second, retained bytes per operation)."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function(argument)
+    rate = iterations / (time.perf_counter() - start)
+
+    sample = max(iterations // 10, 1)
+    tracemalloc.start()
+    results = [function(argument) for _ in range(sample)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del results
+    return rate, current / sample
+
+
+def main(iterations: int = 100000):
+    print(f"{iterations} iterations")
+    print(f"{'turn':<18}{'path':<10}{'turns/s':>14}{'bytes/turn':>12}")
+    cases = (
+        ("slot prompt", inline_prompt, catalog_prompt),
+        ("confirmation", inline_confirm, catalog_confirm),
+        ("confirmed reply", inline_confirmed, catalog_confirmed),
+    )
+    for name, inline, catalog in cases:
+        for path, function in (("inline", inline), ("catalog", catalog)):
+            rate, allocated = measure(function, DETAILS, iterations)
+            print(f"{name:<18}{path:<10}{rate:>14,.0f}{allocated:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,54 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Compare parse_money() with the Recognizers-Text currency model.
+
+    python -m benchmarks.money_benchmark [iterations]
+
+Reports budgets parsed per second by each, over utterances like the ones
+the budget prompt receives, and the amounts each one found.
+"""
+
+import sys
+import time
+
+from recognizers_number_with_unit import recognize_currency
+from recognizers_text import Culture
+
+from money import parse_money
+
+UTTERANCES = (
+    "800$",
+    "I only have a budget of 800$, I hope it's enough",
+    "1,500 euros",
+    "around £2k",
+    "my budget is 1.500,50 EUR for the whole family",
+    "500 dollars",
+)
+
+
+def recognizers_text(text: str):
+    results = recognize_currency(text, Culture.English)
+    return results[0].resolution if results else None
+
+
+def measure(function, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for text in UTTERANCES:
+            function(text)
+    return iterations * len(UTTERANCES) / (time.perf_counter() - start)
+
+
+def main(iterations: int = 2000):
+    for text in UTTERANCES:
+        print(f"{text!r:<52}{str(parse_money(text)):<14}{recognizers_text(text)}")
+    print(f"\n{'parser':<20}{'budgets/s':>14}")
+    for name, function, runs in (
+        ("parse_money", parse_money, iterations * 10),
+        ("recognizers-text", recognizers_text, iterations),
+    ):
+        print(f"{name:<20}{measure(function, runs):>14,.0f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,109 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Recognition time of the number, date-time and confirm prompts.
+
+    python -m benchmarks.prompt_recognition_benchmark [iterations]
+
+For each prompt type, a fresh interpreter times the first recognition of
+the stock botbuilder prompt (cold) and of the shared-model prompt after
+prompt_models.warm_up(). Then, in this process, reports the mean
+recognition time of both over typical answers, trivial ones ("2",
+"2025-06-12") included.
+"""
+
+import asyncio
+import json
+import subprocess
+import sys
+import time
+
+from botbuilder.core import TurnContext
+from botbuilder.core.adapters import TestAdapter
+from botbuilder.dialogs.prompts import ConfirmPrompt, DateTimePrompt, NumberPrompt
+from botbuilder.schema import Activity, ActivityTypes
+
+from dialogs.custom_prompts import (
+    SharedModelConfirmPrompt,
+    SharedModelDateTimePrompt,
+    SharedModelNumberPrompt,
+)
+
+PROMPTS = {
+    "number": (NumberPrompt, SharedModelNumberPrompt, ("2", "two adults", "3 kids")),
+    "datetime": (
+        DateTimePrompt,
+        SharedModelDateTimePrompt,
+        ("2025-06-12", "June 20 2025", "the 15th of August 2025"),
+    ),
+    "confirm": (ConfirmPrompt, SharedModelConfirmPrompt, ("yes", "no thanks", "1")),
+}
+
+CHILD = """
+import asyncio, json, sys, time
+from benchmarks.prompt_recognition_benchmark import PROMPTS, recognize
+
+def main(kind, path):
+    stock, shared, utterances = PROMPTS[kind]
+    warm_up_ms = 0.0
+    if path == "shared":
+        import prompt_models
+        started = time.perf_counter()
+        prompt_models.warm_up(["en-US"])
+        warm_up_ms = (time.perf_counter() - started) * 1000
+    prompt = (stock if path == "stock" else shared)("prompt")
+    started = time.perf_counter()
+    asyncio.run(recognize(prompt, utterances[1]))
+    first = (time.perf_counter() - started) * 1000
+    print(json.dumps({"first_ms": first, "warm_up_ms": warm_up_ms}))
+
+main(sys.argv[1], sys.argv[2])
+"""
+
+
+async def recognize(prompt, text: str):
+    context = TurnContext(
+        TestAdapter(), Activity(type=ActivityTypes.message, text=text, locale="en-US")
+    )
+    return await prompt.on_recognize(context, {}, None)
+
+
+def first_recognition(kind: str, path: str) -> dict:
+    completed = subprocess.run(
+        [sys.executable, "-c", CHILD, kind, path],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+async def mean_ms(prompt, utterances, iterations: int) -> dict:
+    means = {}
+    for text in utterances:
+        await recognize(prompt, text)
+        started = time.perf_counter()
+        for _ in range(iterations):
+            await recognize(prompt, text)
+        means[text] = (time.perf_counter() - started) * 1000 / iterations
+    return means
+
+
+async def main(iterations: int = 20):
+    print(f"{'prompt':<10}{'first, stock':>16}{'first, shared':>16}{'warm-up':>12}  (ms)")
+    for kind in PROMPTS:
+        stock = first_recognition(kind, "stock")
+        shared = first_recognition(kind, "shared")
+        print(
+            f"{kind:<10}{stock['first_ms']:>16.1f}{shared['first_ms']:>16.1f}"
+            f"{shared['warm_up_ms']:>12.1f}"
+        )
+
+    print(f"\n{iterations} iterations")
+    print(f"{'prompt':<10}{'utterance':<28}{'stock ms':>10}{'shared ms':>11}")
+    for kind, (stock, shared, utterances) in PROMPTS.items():
+        stock_ms = await mean_ms(stock("prompt"), utterances, iterations)
+        shared_ms = await mean_ms(shared("prompt"), utterances, iterations)
+        for text in utterances:
+            print(f"{kind:<10}{text!r:<28}{stock_ms[text]:>10.3f}{shared_ms[text]:>11.3f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20))
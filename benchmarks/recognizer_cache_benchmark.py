@@ -0,0 +1,61 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Hit rate and lookup cost of the near-duplicate recognizer cache.
+
+    python -m benchmarks.recognizer_cache_benchmark [capacity]
+
+Sends the utterances of the LUIS export, in order, through a
+NearDuplicateRecognizer wrapping the local recognizer (standing in for
+LUIS), and reports exact and near hits, the candidates rejected by the
+entity checks, and the time spent in the cache per utterance.
+"""
+
+import asyncio
+import json
+import sys
+import time
+
+from botbuilder.schema import Activity, ConversationAccount
+
+from local_recognizer import LocalFlightBookingRecognizer
+from recognizer_cache import NearDuplicateRecognizer
+
+MODEL_PATH = "cognitiveModels/Flight Booking Chatbot.json"
+
+
+class FakeContext:
+    def __init__(self, text):
+        self.activity = Activity(type="message", text=text, conversation=ConversationAccount(id="c"))
+
+
+class TimedRecognizer(LocalFlightBookingRecognizer):
+    seconds = 0.0
+
+    async def recognize(self, turn_context):
+        started = time.perf_counter()
+        try:
+            return await super().recognize(turn_context)
+        finally:
+            self.seconds += time.perf_counter() - started
+
+
+async def run(capacity: int):
+    with open(MODEL_PATH, encoding="utf-8") as model_file:
+        utterances = [item["text"] for item in json.load(model_file)["utterances"]]
+    inner = TimedRecognizer.from_luis_export(MODEL_PATH)
+    inner.model.warm_up()
+    cache = NearDuplicateRecognizer(inner, capacity=capacity)
+    started = time.perf_counter()
+    for text in utterances:
+        await cache.recognize(FakeContext(text))
+    in_cache = time.perf_counter() - started - inner.seconds
+
+    stats = cache.stats
+    print(f"{len(utterances)} utterances, capacity {capacity}")
+    print(f"hits: {stats['hits']} ({cache.hit_rate:.1%}), of which near: {stats['near_hits']}")
+    print(f"rejected candidates: {stats['rejected']}")
+    print(f"cache time: {in_cache / len(utterances) * 1000:.2f} ms per utterance")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 4096))
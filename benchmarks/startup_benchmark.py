@@ -0,0 +1,87 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Measure the bot's startup: imports, initialization and warm-up.
+
+    python -m benchmarks.startup_benchmark [runs]
+
+Each run starts a fresh interpreter with ``-X importtime`` that imports app,
+runs the warm-up tasks and times the first local recognition; a second fresh
+interpreter times the same recognition without warm-up. Reports the median
+of every startup phase, the packages with the largest import self time, and
+the first-recognition latency cold and warm.
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+UTTERANCE = "I want to fly from Paris to Berlin on June 3rd"
+
+CHILD = """
+import asyncio, json, sys, time
+import app
+
+async def main(warm):
+    if warm:
+        await app.STARTUP.warm_up(app.warm_up_tasks())
+    started = time.perf_counter()
+    app.LOCAL_RECOGNIZER.model.predict(%r)
+    first = (time.perf_counter() - started) * 1000
+    print(json.dumps({"phases": app.STARTUP.phases, "first_recognition_ms": first}))
+
+asyncio.run(main(sys.argv[1] == "warm"))
+""" % UTTERANCE
+
+
+def run_child(mode: str):
+    env = dict(os.environ)
+    env.setdefault("AppInsightsInstrumentationKey", "00000000-0000-0000-0000-000000000000")
+    # No network calls from the benchmark: LUIS and channel auth stay unconfigured.
+    for name in ("LuisAppId", "LuisAPIKey", "MicrosoftAppId"):
+        env.pop(name, None)
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD, mode],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    imports = defaultdict(float)
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        imports[name.strip().split(".")[0]] += int(self_us) / 1000
+    return json.loads(completed.stdout.strip().splitlines()[-1]), imports
+
+
+def main(runs: int = 3):
+    phases = defaultdict(list)
+    packages = defaultdict(list)
+    cold, warm = [], []
+    for _ in range(runs):
+        result, imports = run_child("warm")
+        for name, duration in result["phases"].items():
+            phases[name].append(duration)
+        for name, duration in imports.items():
+            packages[name].append(duration)
+        warm.append(result["first_recognition_ms"])
+        cold.append(run_child("cold")[0]["first_recognition_ms"])
+
+    print(f"median of {runs} runs")
+    print(f"{'phase':<28}{'ms':>10}")
+    for name, durations in phases.items():
+        print(f"{name:<28}{statistics.median(durations):>10.1f}")
+
+    print(f"\n{'package (import self time)':<28}{'ms':>10}")
+    top = sorted(packages.items(), key=lambda item: -statistics.median(item[1]))[:15]
+    for name, durations in top:
+        print(f"{name:<28}{statistics.median(durations):>10.1f}")
+
+    print(f"\n{'first local recognition':<28}{'ms':>10}")
+    print(f"{'cold':<28}{statistics.median(cold):>10.1f}")
+    print(f"{'after warm-up':<28}{statistics.median(warm):>10.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
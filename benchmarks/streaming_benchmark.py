@@ -0,0 +1,156 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Turn latency and throughput over HTTP and over the WebSocket endpoint.
+
+    python -m benchmarks.streaming_benchmark [conversations] [turns]
+
+Serves an echo bot, replying twice to every message, through
+AdapterWithErrorHandler, on /api/messages and on /api/stream. Over HTTP each
+turn is a POST to /api/messages and the replies are POSTs from the bot to a
+local channel (its serviceUrl); over the WebSocket each conversation's
+client sends its turns on its own connection and gets the replies back on
+it. `conversations` clients run `turns` turns each, concurrently; a turn
+lasts until its last reply has arrived. Reports the median and p95 turn
+latency and the turns per second of each transport. Authentication is
+disabled, as for a local bot.
+"""
+
+import asyncio
+import json
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+import aiohttp
+from aiohttp import web
+from botbuilder.core import BotFrameworkAdapterSettings, ConversationState, MemoryStorage, TurnContext
+from botbuilder.schema import Activity
+
+from adapter_with_error_handler import AdapterWithErrorHandler
+from streaming_endpoint import StreamingEndpoint
+
+REPLIES = 2
+
+
+async def echo(turn_context: TurnContext):
+    for index in range(REPLIES):
+        await turn_context.send_activity(f"{index}: {turn_context.activity.text}")
+
+
+def activity(service_url: str, conversation: int, turn: int) -> dict:
+    return {
+        "type": "message",
+        "id": f"{conversation}-{turn}",
+        "channelId": "benchmark",
+        "serviceUrl": service_url,
+        "from": {"id": f"user-{conversation}"},
+        "recipient": {"id": "bot"},
+        "conversation": {"id": f"conversation-{conversation}"},
+        "text": f"turn {turn}",
+    }
+
+
+class Channel:
+    """The channel's side of HTTP turns: receives the bot's replies."""
+
+    def __init__(self):
+        # Activity id -> replies still expected
+        self.pending: Dict[str, List] = {}
+
+    def expect(self, activity_id: str) -> asyncio.Event:
+        done = asyncio.Event()
+        self.pending[activity_id] = [REPLIES, done]
+        return done
+
+    async def reply(self, req: web.Request) -> web.Response:
+        waiting = self.pending[req.match_info["reply_to"]]
+        waiting[0] -= 1
+        if not waiting[0]:
+            waiting[1].set()
+        return web.json_response({"id": "reply"})
+
+
+def create_app(adapter: AdapterWithErrorHandler, channel: Channel, streaming: StreamingEndpoint):
+    async def messages(req: web.Request) -> web.Response:
+        turn = Activity().deserialize(await req.json())
+        await adapter.process_activity(turn, req.headers.get("Authorization", ""), echo)
+        return web.Response(status=200)
+
+    app = web.Application()
+    app.router.add_post("/api/messages", messages)
+    app.router.add_get("/api/stream", streaming.handler)
+    app.router.add_post("/v3/conversations/{conversation}/activities/{reply_to}", channel.reply)
+    return app
+
+
+async def http_client(session, url: str, channel: Channel, conversation: int, turns: int) -> List[float]:
+    latencies = []
+    for turn in range(turns):
+        body = activity(url, conversation, turn)
+        done = channel.expect(body["id"])
+        started = time.perf_counter()
+        async with session.post(f"{url}/api/messages", json=body) as response:
+            response.raise_for_status()
+        await done.wait()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+async def stream_client(session, url: str, conversation: int, turns: int) -> List[float]:
+    latencies = []
+    async with session.ws_connect(f"{url}/api/stream") as socket:
+        for turn in range(turns):
+            started = time.perf_counter()
+            await socket.send_str(json.dumps({"requestId": str(turn), "activity": activity(url, conversation, turn)}))
+            while json.loads(await socket.receive_str()).get("requestId") != str(turn):
+                pass
+            latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def report(name: str, latencies: List[float], elapsed: float):
+    latencies = sorted(latencies)
+    print(
+        f"{name:<10}p50 {statistics.median(latencies) * 1000:6.2f} ms"
+        f"   p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:6.2f} ms"
+        f"   {len(latencies) / elapsed:8.0f} turns/s"
+    )
+
+
+async def run(conversations: int, turns: int):
+    adapter = AdapterWithErrorHandler(BotFrameworkAdapterSettings("", ""), ConversationState(MemoryStorage()))
+    streaming = StreamingEndpoint(
+        adapter.authenticate,
+        lambda turn, identity: adapter.process_activity_with_identity(turn, identity, echo),
+    )
+    adapter.streams = streaming
+    channel = Channel()
+    runner = web.AppRunner(create_app(adapter, channel, streaming))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"  # pylint: disable=protected-access
+    print(f"{conversations} conversations x {turns} turns, {REPLIES} replies per turn")
+    try:
+        async with aiohttp.ClientSession() as session:
+            for name, client in (
+                ("http", lambda index: http_client(session, url, channel, index, turns)),
+                ("websocket", lambda index: stream_client(session, url, index, turns)),
+            ):
+                started = time.perf_counter()
+                results = await asyncio.gather(*(client(index) for index in range(conversations)))
+                report(name, [latency for result in results for latency in result], time.perf_counter() - started)
+    finally:
+        await runner.cleanup()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    conversations = int(argv[0]) if argv else 20
+    turns = int(argv[1]) if len(argv) > 1 else 50
+    asyncio.run(run(conversations, turns))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 # Copyright (c) Microsoft Corporation. All rights reserved.
 # Licensed under the MIT License.
 
+from money import Money, RateTable
 
 # class BookingDetails:
 #     def __init__(
@@ -25,10 +26,12 @@ class BookingDetails:
         or_city: str = None,
         str_date: str = None,
         end_date: str = None,
-        budget: str = None,
+        budget: float = None,
         n_adults: str = None,
         n_children: str = None,
         unsupported_airports=None,
+        budget_amount: float = None,
+        budget_currency: str = None,
     ):
         if unsupported_airports is None:
             unsupported_airports = []
@@ -36,8 +39,22 @@ class BookingDetails:
         self.or_city = or_city
         self.str_date = str_date
         self.end_date = end_date
+        # Budget in the base currency (see money.py), and as the user gave it
         self.budget = budget
+        self.budget_amount = budget_amount
+        self.budget_currency = budget_currency
         self.n_adults = n_adults
         self.n_children = n_children
         self.unsupported_airports = unsupported_airports
+
+    def set_budget(self, money: Money, rates: RateTable):
+        self.budget_amount, self.budget_currency = money.amount, money.currency
+        self.budget = rates.to_base(money)
+
+    def summary(self) -> dict:
+        """The slots as shown to the user."""
+        values = dict(vars(self))
+        if self.budget_currency is not None:
+            values["budget"] = str(Money(self.budget_amount, self.budget_currency))
+        return values
 ### END
@@ -0,0 +1,85 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Per-user snapshot of the BookingDetails slots filled so far.
+
+The dialog stack lives in the conversation state, which is lost when the
+conversation is dropped or deleted by AdapterWithErrorHandler.on_error.
+BookingDialog therefore also keeps the filled slots, as a small dict, in the
+user state; MainDialog offers to resume from it on the user's next visit and
+BookingDialog's waterfall skips the slots that are already filled.
+
+The app keeps the user state in its own SQLite file (UserStatePath), not in
+the bounded, expiring store of the conversation state, so that a snapshot
+survives restarts, memory pressure and idle days.
+"""
+
+from typing import Optional
+
+from botbuilder.core import BotTelemetryClient, NullTelemetryClient, TurnContext, UserState
+
+from booking_details import BookingDetails
+
+SLOTS = (
+    "dst_city", "or_city", "str_date", "end_date", "budget", "budget_amount", "budget_currency",
+    "n_adults", "n_children",
+)
+
+
+class BookingSnapshotStore:
+    def __init__(self, user_state: UserState, telemetry_client: BotTelemetryClient = None):
+        self._accessor = user_state.create_property("BookingSnapshot")
+        self.telemetry_client = telemetry_client or NullTelemetryClient()
+
+    @staticmethod
+    def filled_slots(details: BookingDetails) -> dict:
+        return {
+            slot: getattr(details, slot)
+            for slot in SLOTS
+            if getattr(details, slot, None) is not None
+        }
+
+    async def get(self, turn_context: TurnContext) -> Optional[dict]:
+        """The user's unfinished booking, if at least one slot was filled."""
+        snapshot = await self._accessor.get(turn_context)
+        return snapshot if snapshot and snapshot["slots"] else None
+
+    async def start(self, turn_context: TurnContext, details: BookingDetails):
+        previous = await self._accessor.get(turn_context)
+        await self._accessor.set(turn_context, {
+            "slots": BookingSnapshotStore.filled_slots(details),
+            "turns": 1,
+            "resumed": bool(previous and previous.get("resumed")),
+        })
+
+    async def save(self, turn_context: TurnContext, details: BookingDetails):
+        snapshot = await self._accessor.get(turn_context)
+        if snapshot is not None:
+            snapshot["slots"] = BookingSnapshotStore.filled_slots(details)
+
+    async def count_turn(self, turn_context: TurnContext):
+        snapshot = await self._accessor.get(turn_context)
+        if snapshot is not None:
+            snapshot["turns"] += 1
+
+    async def resume(self, turn_context: TurnContext) -> BookingDetails:
+        """BookingDetails rebuilt from the snapshot, which is flagged as resumed."""
+        snapshot = await self._accessor.get(turn_context)
+        snapshot["resumed"] = True
+        return BookingDetails(**snapshot["slots"])
+
+    async def finish(self, turn_context: TurnContext, completed: bool):
+        """Report the turns the booking took and forget it."""
+        snapshot = await self._accessor.get(turn_context)
+        if snapshot is not None:
+            self.telemetry_client.track_metric(
+                "BookingTurns",
+                snapshot["turns"],
+                properties={
+                    "resumed": str(snapshot["resumed"]).lower(),
+                    "completed": str(completed).lower(),
+                },
+            )
+        await self.discard(turn_context)
+
+    async def discard(self, turn_context: TurnContext):
+        await self._accessor.delete(turn_context)
@@ -4,6 +4,7 @@
 import json
 import os.path
 
+from functools import lru_cache
 from typing import List
 from botbuilder.dialogs import Dialog
 from botbuilder.core import (
@@ -16,6 +17,17 @@ from botbuilder.schema import Activity, Attachment, ChannelAccount
 from helpers.activity_helper import create_activity_reply
 from .dialog_bot import DialogBot
 
+WELCOME_CARD_PATH = os.path.join(
+    os.path.abspath(os.path.dirname(__file__)), "resources/welcomeCard.json"
+)
+
+
+@lru_cache(maxsize=None)
+def load_welcome_card() -> dict:
+    # Read once; send_activity copies the activity, so the dict is never modified.
+    with open(WELCOME_CARD_PATH) as card_file:
+        return json.load(card_file)
+
 
 class DialogAndWelcomeBot(DialogBot):
     """Main dialog to welcome users."""
@@ -53,11 +65,6 @@ class DialogAndWelcomeBot(DialogBot):
     # Load attachment from file.
     def create_adaptive_card_attachment(self):
         """Create an adaptive card."""
-        relative_path = os.path.abspath(os.path.dirname(__file__))
-        path = os.path.join(relative_path, "resources/welcomeCard.json")
-        with open(path) as card_file:
-            card = json.load(card_file)
-
         return Attachment(
-            content_type="application/vnd.microsoft.card.adaptive", content=card
+            content_type="application/vnd.microsoft.card.adaptive", content=load_welcome_card()
         )
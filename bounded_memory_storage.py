@@ -0,0 +1,272 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""In-memory state store with a memory budget.
+
+MemoryStorage keeps the state of every conversation that ever started, so an
+abandoned BookingDialog stack stays resident until the process restarts.
+BoundedMemoryStorage keeps each item pickled, which gives an exact byte
+count, and in least recently used order:
+
+- items not read or written for `ttl_seconds` expire and are deleted;
+- while the resident items exceed `max_bytes`, the least recently used ones
+  are evicted, to the optional SQLite `SpillStore` if one is given (read back
+  on the next access), otherwise dropped.
+"""
+
+import asyncio
+import pickle
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from botbuilder.core import BotTelemetryClient, NullTelemetryClient, Storage, StoreItem
+
+
+class _Entry(NamedTuple):
+    data: bytes
+    e_tag: Optional[str]
+    expires_at: float
+
+
+class SpillStore:
+    """SQLite table of evicted items.
+
+    Like DurableTurnQueue, all statements run on a single dedicated thread;
+    the connection is opened on first use.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            # Imported here: only bots with a spill path need sqlite3.
+            import sqlite3
+
+            self._connection = sqlite3.connect(self.path)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS state ("
+                "key TEXT PRIMARY KEY, "
+                "data BLOB NOT NULL, "
+                "e_tag TEXT, "
+                "expires_at REAL NOT NULL)"
+            )
+            self._connection.commit()
+        return self._connection
+
+    def _put_many(self, entries: List[Tuple[str, _Entry]]):
+        connection = self._connect()
+        connection.executemany(
+            "INSERT OR REPLACE INTO state (key, data, e_tag, expires_at) VALUES (?, ?, ?, ?)",
+            [(key, entry.data, entry.e_tag, entry.expires_at) for key, entry in entries],
+        )
+        connection.commit()
+
+    def _take(self, keys: List[str], now: float) -> Dict[str, _Entry]:
+        """Remove and return the unexpired rows for `keys`; expired ones are dropped."""
+        connection = self._connect()
+        found = {}
+        for key in keys:
+            row = connection.execute(
+                "SELECT data, e_tag, expires_at FROM state WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                continue
+            connection.execute("DELETE FROM state WHERE key = ?", (key,))
+            if row[2] > now:
+                found[key] = _Entry(*row)
+        connection.commit()
+        return found
+
+    def _delete(self, keys: List[str]):
+        connection = self._connect()
+        connection.executemany("DELETE FROM state WHERE key = ?", [(key,) for key in keys])
+        connection.commit()
+
+    def _expire(self, now: float) -> int:
+        connection = self._connect()
+        cursor = connection.execute("DELETE FROM state WHERE expires_at <= ?", (now,))
+        connection.commit()
+        return cursor.rowcount
+
+    def _close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    async def _run(self, function, *args):
+        return await asyncio.get_event_loop().run_in_executor(
+            self._executor, function, *args
+        )
+
+    async def put_many(self, entries: List[Tuple[str, _Entry]]):
+        await self._run(self._put_many, entries)
+
+    async def take(self, keys: List[str], now: float) -> Dict[str, _Entry]:
+        return await self._run(self._take, keys, now)
+
+    async def delete(self, keys: List[str]):
+        await self._run(self._delete, keys)
+
+    async def expire(self, now: float) -> int:
+        return await self._run(self._expire, now)
+
+    async def close(self):
+        await self._run(self._close)
+        self._executor.shutdown(wait=True)
+
+
+class BoundedMemoryStorage(Storage):
+    def __init__(
+        self,
+        max_bytes: int = 0,
+        ttl_seconds: float = 0,
+        spill: SpillStore = None,
+        telemetry_client: BotTelemetryClient = None,
+        clock=time.time,
+    ):
+        super(BoundedMemoryStorage, self).__init__()
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.spill = spill
+        self.telemetry_client = telemetry_client or NullTelemetryClient()
+        self._clock = clock
+        # Least recently used first
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._e_tag = 0
+        self.resident_bytes = 0
+        self._next_spill_sweep = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def read(self, keys: List[str]) -> Dict[str, object]:
+        now = self._clock()
+        self._expire(now)
+        data = {}
+        missing = []
+        for key in keys or []:
+            entry = self._entries.get(key)
+            if entry is None:
+                missing.append(key)
+                continue
+            self._touch(key, entry, now)
+            data[key] = pickle.loads(entry.data)
+
+        if missing and self.spill is not None:
+            restored = await self.spill.take(missing, now)
+            for key, entry in restored.items():
+                self._store(key, entry, now)
+                data[key] = pickle.loads(entry.data)
+            if restored:
+                self.telemetry_client.track_metric("StateSpillReads", len(restored))
+            await self._evict()
+        return data
+
+    async def write(self, changes: Dict[str, StoreItem]):
+        if changes is None:
+            raise Exception("Changes are required when writing")
+        now = self._clock()
+        self._expire(now)
+        for key, change in changes.items():
+            old = self._entries.get(key)
+            if old is None and self.spill is not None:
+                # Keep the e_tag check meaningful for evicted items
+                old = (await self.spill.take([key], now)).get(key)
+            new_e_tag = BoundedMemoryStorage._get_e_tag(change)
+            if new_e_tag == "":
+                raise Exception("bounded_memory_storage.write(): etag missing")
+            if (
+                old is not None
+                and old.e_tag is not None
+                and new_e_tag is not None
+                and new_e_tag != "*"
+                and new_e_tag != old.e_tag
+            ):
+                if self.spill is not None and key not in self._entries:
+                    await self.spill.put_many([(key, old)])
+                raise KeyError(
+                    "Etag conflict.\nOriginal: %s\r\nCurrent: %s" % (new_e_tag, old.e_tag)
+                )
+
+            # As MemoryStorage: items stored without an e_tag never get one.
+            e_tag = new_e_tag
+            if old is not None and old.e_tag:
+                e_tag = str(self._e_tag)
+                if isinstance(change, dict):
+                    change = dict(change, e_tag=e_tag)
+                else:
+                    change = pickle.loads(pickle.dumps(change, pickle.HIGHEST_PROTOCOL))
+                    change.e_tag = e_tag
+            self._e_tag += 1
+            data = pickle.dumps(change, pickle.HIGHEST_PROTOCOL)
+            self._store(key, _Entry(data, e_tag, 0.0), now)
+
+        await self._evict()
+        if self.spill is not None and now >= self._next_spill_sweep:
+            self._next_spill_sweep = now + (self.ttl_seconds or 3600)
+            await self.spill.expire(now)
+        self.telemetry_client.track_metric("ResidentConversations", len(self._entries))
+        self.telemetry_client.track_metric("ResidentStateBytes", self.resident_bytes)
+
+    async def delete(self, keys: List[str]):
+        for key in keys:
+            self._discard(key)
+        if self.spill is not None:
+            await self.spill.delete(keys)
+
+    @staticmethod
+    def _get_e_tag(item: object) -> Optional[str]:
+        if isinstance(item, dict):
+            return item.get("e_tag", None)
+        return getattr(item, "e_tag", None)
+
+    def _store(self, key: str, entry: _Entry, now: float):
+        """Insert `entry` as the most recently used item with a fresh deadline."""
+        self._discard(key)
+        self._entries[key] = entry._replace(
+            expires_at=now + self.ttl_seconds if self.ttl_seconds else float("inf")
+        )
+        self.resident_bytes += len(entry.data)
+
+    def _touch(self, key: str, entry: _Entry, now: float):
+        if self.ttl_seconds:
+            self._entries[key] = entry._replace(expires_at=now + self.ttl_seconds)
+        self._entries.move_to_end(key)
+
+    def _discard(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.resident_bytes -= len(entry.data)
+
+    def _expire(self, now: float):
+        # Every access moves an item to the end with a fresh deadline, so the
+        # expired items are all at the front.
+        expired = 0
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now:
+                break
+            self._discard(key)
+            expired += 1
+        if expired:
+            self.telemetry_client.track_metric("StateExpired", expired)
+
+    async def _evict(self):
+        if not self.max_bytes:
+            return
+        evicted = []
+        # The most recently used item always stays, even when larger than the budget.
+        while self.resident_bytes > self.max_bytes and len(self._entries) > 1:
+            key, entry = self._entries.popitem(last=False)
+            self.resident_bytes -= len(entry.data)
+            evicted.append((key, entry))
+        if not evicted:
+            return
+        if self.spill is not None:
+            await self.spill.put_many(evicted)
+        self.telemetry_client.track_metric("StateEvicted", len(evicted))
@@ -0,0 +1,220 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Storage wrapper that compacts dialog state before it is persisted.
+
+Every prompt on the nested dialog stack (MainDialog -> BookingDialog ->
+DateResolverDialog / TextToLuisPrompt) persists its PromptOptions, i.e. two
+full Activity objects with ~40 attributes each, on every turn. Most of these
+prompts are static texts, so CompactingStorage replaces them with a
+reference to the copy held in a process-wide StaticPromptRegistry, drops the
+PromptOptions fields left to their defaults, and puts them back on read.
+
+It also enforces an optional per-conversation budget: a state that is still
+larger than `max_state_bytes` once compacted loses its dialog stack (the
+conversation restarts) instead of growing the store without bound.
+"""
+
+import pickle
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from botbuilder.core import BotTelemetryClient, NullTelemetryClient, Storage, StoreItem
+from botbuilder.dialogs import DialogInstance, DialogState
+from botbuilder.dialogs.prompts import PromptOptions
+from botbuilder.schema import Activity, ActivityTypes, InputHints
+
+# Attributes a prompt created by MessageFactory.text() may carry.
+_PLAIN_ACTIVITY_ATTRIBUTES = frozenset(("type", "text", "speak", "input_hint"))
+_PROMPT_OPTIONS_DEFAULTS = {
+    "prompt": None,
+    "retry_prompt": None,
+    "choices": None,
+    "style": None,
+    "validations": None,
+    "number_of_attempts": 0,
+}
+
+
+class StaticPromptRegistry:
+    """Static prompt activities, by id and by text.
+
+    `fallback`, when set, is asked for ids that are not registered (or no
+    longer are, see unregister()) before get() gives up.
+    """
+
+    def __init__(self, fallback: Callable[[str], Optional[Activity]] = None):
+        self._by_id: Dict[str, Activity] = {}
+        self._by_text: Dict[Tuple[str, str], str] = {}
+        self.fallback = fallback
+
+    def register(self, prompt_id: str, activity: Activity) -> Activity:
+        """Register a plain text activity under `prompt_id` and return it."""
+        if not StaticPromptRegistry.is_plain(activity):
+            raise ValueError(f"Prompt {prompt_id} is not a plain text activity")
+        # Prompt.begin_dialog sets this hint anyway; setting it here keeps
+        # the registered instance from being modified later.
+        activity.input_hint = activity.input_hint or InputHints.expecting_input
+        self._by_id[prompt_id] = activity
+        self._by_text[(activity.text, activity.speak)] = prompt_id
+        return activity
+
+    def unregister(self, prompt_id: str):
+        activity = self._by_id.pop(prompt_id, None)
+        if activity is not None and self._by_text.get((activity.text, activity.speak)) == prompt_id:
+            del self._by_text[(activity.text, activity.speak)]
+
+    def get(self, prompt_id: str) -> Activity:
+        activity = self._by_id.get(prompt_id)
+        if activity is None and self.fallback is not None:
+            activity = self.fallback(prompt_id)
+        if activity is None:
+            raise KeyError(prompt_id)
+        return activity
+
+    def id_of(self, activity: Activity) -> Optional[str]:
+        if not StaticPromptRegistry.is_plain(activity):
+            return None
+        return self._by_text.get((activity.text, activity.speak))
+
+    @staticmethod
+    def is_plain(activity: Activity) -> bool:
+        if activity.type != ActivityTypes.message:
+            return False
+        return not any(
+            value for name, value in activity.__dict__.items()
+            if name not in _PLAIN_ACTIVITY_ATTRIBUTES
+        )
+
+
+STATIC_PROMPTS = StaticPromptRegistry()
+
+
+class _PromptRef(NamedTuple):
+    prompt_id: str
+
+
+class _CompactPromptOptions(NamedTuple):
+    # (attribute, value) for the PromptOptions attributes that are not defaults
+    fields: Tuple[Tuple[str, object], ...]
+
+
+class CompactingStorage(Storage):
+    def __init__(
+        self,
+        storage: Storage,
+        registry: StaticPromptRegistry = STATIC_PROMPTS,
+        max_state_bytes: int = 0,
+        telemetry_client: BotTelemetryClient = None,
+        savings_sample_every: int = 100,
+    ):
+        super(CompactingStorage, self).__init__()
+        self.storage = storage
+        self.registry = registry
+        self.max_state_bytes = max_state_bytes
+        self.telemetry_client = telemetry_client or NullTelemetryClient()
+        # Measuring the savings pickles the state a second time: only every Nth write.
+        self.savings_sample_every = savings_sample_every
+        self._writes = 0
+
+    async def read(self, keys: List[str]) -> Dict[str, object]:
+        items = await self.storage.read(keys)
+        return {key: self.expand(value) for key, value in items.items()}
+
+    async def write(self, changes: Dict[str, StoreItem]):
+        compacted = {}
+        for key, value in (changes or {}).items():
+            state = self.compact(value)
+            size = CompactingStorage.size_of(state)
+            if self.max_state_bytes and size > self.max_state_bytes:
+                state = self._over_budget(key, state, size)
+                size = CompactingStorage.size_of(state)
+            self.telemetry_client.track_metric("StateBytes", size)
+            self._writes += 1
+            if self.savings_sample_every and self._writes % self.savings_sample_every == 0:
+                self.telemetry_client.track_metric(
+                    "StateBytesSaved", CompactingStorage.size_of(value) - size
+                )
+            compacted[key] = state
+        await self.storage.write(compacted)
+
+    async def delete(self, keys: List[str]):
+        await self.storage.delete(keys)
+
+    @staticmethod
+    def size_of(state: object) -> int:
+        return len(pickle.dumps(state, pickle.HIGHEST_PROTOCOL))
+
+    def compact(self, value: object) -> object:
+        """Return a compacted copy of `value`; `value` itself is left untouched."""
+        if isinstance(value, dict):
+            return {key: self.compact(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.compact(item) for item in value]
+        if isinstance(value, DialogState):
+            return DialogState([self.compact(instance) for instance in value.dialog_stack])
+        if isinstance(value, DialogInstance):
+            instance = DialogInstance.__new__(DialogInstance)
+            instance.__dict__ = dict(value.__dict__)
+            instance.state = self.compact(value.state)
+            return instance
+        if isinstance(value, PromptOptions):
+            return _CompactPromptOptions(tuple(
+                (name, self.compact(item))
+                for name, item in value.__dict__.items()
+                if _PROMPT_OPTIONS_DEFAULTS.get(name, _PROMPT_OPTIONS_DEFAULTS) != item
+            ))
+        if isinstance(value, Activity):
+            prompt_id = self.registry.id_of(value)
+            return _PromptRef(prompt_id) if prompt_id is not None else value
+        return value
+
+    def expand(self, value: object) -> object:
+        """Inverse of compact(). Containers are rebuilt rather than updated in
+        place since MemoryStorage.read hands out the stored objects."""
+        if isinstance(value, dict):
+            return {key: self.expand(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.expand(item) for item in value]
+        if isinstance(value, DialogState):
+            return DialogState([self.expand(instance) for instance in value.dialog_stack])
+        if isinstance(value, DialogInstance):
+            instance = DialogInstance.__new__(DialogInstance)
+            instance.__dict__ = dict(value.__dict__)
+            instance.state = self.expand(value.state)
+            return instance
+        if isinstance(value, _CompactPromptOptions):
+            options = PromptOptions()
+            for name, item in value.fields:
+                setattr(options, name, self.expand(item))
+            return options
+        if isinstance(value, _PromptRef):
+            return self.registry.get(value.prompt_id)
+        return value
+
+    def _over_budget(self, key: str, state: object, size: int) -> object:
+        """Drop the dialog stacks of `state`, telling which dialogs the user loses."""
+        discarded = [
+            instance.id
+            for item in (state.values() if isinstance(state, dict) else ())
+            if isinstance(item, DialogState)
+            for instance in item.dialog_stack
+        ]
+        self.telemetry_client.track_event(
+            "StateBudgetExceeded",
+            properties={"key": key},
+            measurements={"bytes": size, "budget": self.max_state_bytes},
+        )
+        if discarded:
+            self.telemetry_client.track_trace(
+                "DialogStackDiscarded",
+                {"key": key, "dialogs": ",".join(discarded), "bytes": size},
+                "WARNING",
+            )
+        return CompactingStorage._without_dialog_state(state)
+
+    @staticmethod
+    def _without_dialog_state(state: object) -> object:
+        if not isinstance(state, dict):
+            return state
+        return {
+            key: item for key, item in state.items() if not isinstance(item, DialogState)
+        }
@@ -16,6 +16,129 @@ class DefaultConfig:
     LUIS_API_KEY = os.environ.get("LuisAPIKey", "")
     # LUIS endpoint host name, ie "westus.api.cognitive.microsoft.com"
     LUIS_API_HOST_NAME = os.environ.get("LuisAPIHostName", "")
+    # Optional second region of the same LUIS app, used for hedged requests
+    LUIS_API_HOST_NAME_SECONDARY = os.environ.get("LuisAPIHostNameSecondary", "")
+    # Hedge when the first request is slower than this percentile of recent latencies (0 disables).
+    # Only with a secondary host name: a hedge is a second paid request.
+    LUIS_HEDGE_PERCENTILE = float(os.environ.get("LuisHedgePercentile", "95"))
+    # Threads running LUIS requests, abandoned ones included
+    LUIS_MAX_CONCURRENT_CALLS = int(os.environ.get("LuisMaxConcurrentCalls", "16"))
+    # Hedge delay used until enough latencies have been observed
+    LUIS_HEDGE_INITIAL_DELAY_MS = float(os.environ.get("LuisHedgeInitialDelayMs", "1000"))
+    # Channels drop the request after this long; recognition must end this margin earlier
+    CHANNEL_TIMEOUT_SECONDS = float(os.environ.get("ChannelTimeoutSeconds", "15"))
+    RECOGNIZER_DEADLINE_MARGIN_SECONDS = float(
+        os.environ.get("RecognizerDeadlineMarginSeconds", "3")
+    )
     APPINSIGHTS_INSTRUMENTATION_KEY = os.environ.get(
         "AppInsightsInstrumentationKey", ""
     )
+    # Decode inbound activities with helpers.activity_codec instead of msrest
+    FAST_ACTIVITY_CODEC = os.environ.get("FastActivityCodec", "false").lower() == "true"
+    # Admission control, see turn_scheduler.py
+    MAX_CONCURRENT_TURNS = int(os.environ.get("MaxConcurrentTurns", "64"))
+    MAX_QUEUED_TURNS = int(os.environ.get("MaxQueuedTurns", "256"))
+    MAX_QUEUED_TURNS_PER_CONVERSATION = int(
+        os.environ.get("MaxQueuedTurnsPerConversation", "8")
+    )
+    MAX_TURN_QUEUE_WAIT_SECONDS = float(os.environ.get("MaxTurnQueueWaitSeconds", "10"))
+    TURN_RETRY_AFTER_SECONDS = int(os.environ.get("TurnRetryAfterSeconds", "1"))
+    # Turns and replies over a WebSocket at /api/stream, see streaming_endpoint.py
+    STREAMING_ENDPOINT = os.environ.get("StreamingEndpoint", "false").lower() == "true"
+    STREAMING_HEARTBEAT_SECONDS = float(os.environ.get("StreamingHeartbeatSeconds", "30"))
+    # Answer 202 and run turns from a background worker pool, see background_turn_processor.py
+    ASYNC_TURN_PROCESSING = os.environ.get("AsyncTurnProcessing", "false").lower() == "true"
+    TURN_QUEUE_PATH = os.environ.get("TurnQueuePath", "turn_queue.sqlite3")
+    TURN_WORKERS = int(os.environ.get("TurnWorkers", "8"))
+    TURN_QUEUE_CAPACITY = int(os.environ.get("TurnQueueCapacity", "1024"))
+    # Largest persisted state per conversation/user once compacted, 0 for no limit
+    MAX_CONVERSATION_STATE_BYTES = int(os.environ.get("MaxConversationStateBytes", "65536"))
+    # In-memory state store, see bounded_memory_storage.py. An empty spill path drops evicted state.
+    STATE_MEMORY_BUDGET_BYTES = int(os.environ.get("StateMemoryBudgetBytes", "67108864"))
+    STATE_TTL_SECONDS = float(os.environ.get("StateTtlSeconds", "86400"))
+    STATE_SPILL_PATH = os.environ.get("StateSpillPath", "")
+    # User state (the unfinished bookings, see booking_snapshot.py) in its own SQLite file,
+    # out of the bounded store's budget and TTL, so that it survives restarts. Empty keeps
+    # it with the conversation state.
+    USER_STATE_PATH = os.environ.get("UserStatePath", "user_state.sqlite3")
+    # Record/replay LUIS results, see recognizer_cassette.py. Empty mode leaves LUIS unwrapped.
+    RECOGNIZER_CASSETTE_MODE = os.environ.get("RecognizerCassetteMode", "")
+    RECOGNIZER_CASSETTE_PATH = os.environ.get("RecognizerCassettePath", "recognizer.cassette")
+    # Other locales, see locale_resources.py: "fr-FR=<LUIS app id>,..." and the local model of
+    # each locale. Locales without either use the default recognizer.
+    LUIS_APP_IDS_BY_LOCALE = dict(
+        item.split("=", 1) for item in os.environ.get("LuisAppIdsByLocale", "").split(",") if item
+    )
+    LOCALE_MODEL_PATH_PATTERN = os.environ.get(
+        "LocaleModelPathPattern", "cognitiveModels/Flight Booking Chatbot.{locale}.json"
+    )
+    MAX_RESIDENT_LOCALES = int(os.environ.get("MaxResidentLocales", "4"))
+    LOCALE_IDLE_SECONDS = float(os.environ.get("LocaleIdleSeconds", "3600"))
+    # Budgets are converted to this currency, see money.py. Rates are refreshed from
+    # CurrencyRatesUrl, when set, once older than the max age; their age is checked
+    # every CurrencyRatesCheckSeconds.
+    CURRENCY_RATES_PATH = os.environ.get("CurrencyRatesPath", "currency_rates.json")
+    CURRENCY_RATES_CACHE_PATH = os.environ.get("CurrencyRatesCachePath", "currency_rates.cache.json")
+    CURRENCY_RATES_URL = os.environ.get("CurrencyRatesUrl", "")
+    CURRENCY_RATES_MAX_AGE_SECONDS = float(os.environ.get("CurrencyRatesMaxAgeSeconds", "86400"))
+    CURRENCY_RATES_CHECK_SECONDS = float(os.environ.get("CurrencyRatesCheckSeconds", "3600"))
+    # LUIS results reused for near-duplicate utterances, see recognizer_cache.py. Off (0) by
+    # default: a reused result may miss what a LUIS call would find; 4096 is a typical capacity.
+    RECOGNIZER_CACHE_CAPACITY = int(os.environ.get("RecognizerCacheCapacity", "0"))
+    RECOGNIZER_CACHE_THRESHOLD = float(os.environ.get("RecognizerCacheThreshold", "0.85"))
+    # Local recognizer used when the LUIS circuit breaker is open, see recognizer_circuit_breaker.py
+    LOCAL_MODEL_PATH = os.environ.get(
+        "LocalModelPath", "cognitiveModels/Flight Booking Chatbot.json"
+    )
+    # Compiled local models, see model_artifact.py: loaded from this directory (compiled there
+    # when missing) and swapped when a new version is compiled. Empty trains them at startup.
+    LOCAL_MODEL_ARTIFACT_DIR = os.environ.get("LocalModelArtifactDir", "")
+    LOCAL_MODEL_RELOAD_SECONDS = float(os.environ.get("LocalModelReloadSeconds", "30"))
+    # LUIS call budgets, see recognizer_quota.py. RecognizerTps is this process's share of the
+    # endpoint's transactions per second; a rate of 0, the default, disables its budget.
+    RECOGNIZER_TPS = float(os.environ.get("RecognizerTps", "0"))
+    RECOGNIZER_QUOTA_MAX_WAIT_MS = float(os.environ.get("RecognizerQuotaMaxWaitMs", "250"))
+    RECOGNIZER_USER_CALLS_PER_MINUTE = float(os.environ.get("RecognizerUserCallsPerMinute", "0"))
+    RECOGNIZER_USER_BURST = float(os.environ.get("RecognizerUserBurst", "10"))
+    RECOGNIZER_CONVERSATION_CALLS_PER_MINUTE = float(
+        os.environ.get("RecognizerConversationCallsPerMinute", "0")
+    )
+    RECOGNIZER_CONVERSATION_BURST = float(os.environ.get("RecognizerConversationBurst", "10"))
+    # Over a user or conversation budget: "fallback" to the local model, or "reject" the turn.
+    RECOGNIZER_OVER_QUOTA = os.environ.get("RecognizerOverQuota", "fallback").lower()
+    RECOGNIZER_BREAKER_WINDOW = int(os.environ.get("RecognizerBreakerWindow", "20"))
+    RECOGNIZER_BREAKER_MIN_CALLS = int(os.environ.get("RecognizerBreakerMinCalls", "5"))
+    RECOGNIZER_BREAKER_ERROR_RATE = float(os.environ.get("RecognizerBreakerErrorRate", "0.5"))
+    RECOGNIZER_BREAKER_SLOW_CALL_MS = float(os.environ.get("RecognizerBreakerSlowCallMs", "3000"))
+    RECOGNIZER_BREAKER_SLOW_CALL_RATE = float(
+        os.environ.get("RecognizerBreakerSlowCallRate", "0.5")
+    )
+    RECOGNIZER_BREAKER_OPEN_SECONDS = float(os.environ.get("RecognizerBreakerOpenSeconds", "30"))
+    RECOGNIZER_BREAKER_PROBES = int(os.environ.get("RecognizerBreakerProbes", "1"))
+    # Local recognitions of concurrent turns are batched within this window, see
+    # recognition_batcher.py. Off (0) by default, every utterance is predicted on its
+    # own; 2 is a typical window. Batches of LocalRecognitionExecutorBatch utterances
+    # or more are predicted in the executor.
+    LOCAL_RECOGNITION_BATCH_WINDOW_MS = float(os.environ.get("LocalRecognitionBatchWindowMs", "0"))
+    LOCAL_RECOGNITION_MAX_BATCH = int(os.environ.get("LocalRecognitionMaxBatch", "32"))
+    LOCAL_RECOGNITION_EXECUTOR_BATCH = int(os.environ.get("LocalRecognitionExecutorBatch", "4"))
+    # Event loop lag histogram and stall stacks, see loop_watchdog.py. Off (0) by default;
+    # 100 is a typical interval.
+    LOOP_WATCHDOG_INTERVAL_MS = float(os.environ.get("LoopWatchdogIntervalMs", "0"))
+    LOOP_STALL_MS = float(os.environ.get("LoopStallMs", "200"))
+    LOOP_LAG_REPORT_SECONDS = float(os.environ.get("LoopLagReportSeconds", "60"))
+    # Typing indicator for turns slower than the delay, see typing_middleware.py. Off (0) by
+    # default; 1000 is a typical delay.
+    TYPING_DELAY_MS = float(os.environ.get("TypingDelayMs", "0"))
+    TYPING_PERIOD_MS = float(os.environ.get("TypingPeriodMs", "3000"))
+    # Conversation-affinity sharding, see shard_router.py: this worker's base URL and every
+    # worker's, comma separated. An empty ShardSelf serves every conversation.
+    SHARD_SELF = os.environ.get("ShardSelf", "")
+    SHARD_WORKERS = [worker for worker in os.environ.get("ShardWorkers", "").split(",") if worker]
+    # Shared with the router, which sends new rings to /api/shard with it. Empty: the ring
+    # stays the ShardWorkers one and /api/shard is not served.
+    SHARD_SECRET = os.environ.get("ShardSecret", "")
+    # Durable store under the in-memory state, see write_behind_storage.py. Empty keeps the
+    # state in memory only.
+    DURABLE_STATE_PATH = os.environ.get("DurableStatePath", "")
+    WRITE_BEHIND_SECONDS = float(os.environ.get("WriteBehindSeconds", "1"))
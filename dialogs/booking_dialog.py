@@ -13,17 +13,29 @@ classe qui gère les intents d'annulation et d'aide."""
 
 from datatypes_date_time.timex import Timex
 
-from botbuilder.dialogs import WaterfallDialog, WaterfallStepContext, DialogTurnResult
+from botbuilder.dialogs import (
+    WaterfallDialog,
+    WaterfallStepContext,
+    DialogContext,
+    DialogTurnResult,
+    DialogTurnStatus,
+)
 from botbuilder.dialogs.prompts import (
     ConfirmPrompt,
     TextPrompt,
-    PromptOptions,
     NumberPrompt,
     )
-from botbuilder.core import MessageFactory, BotTelemetryClient, NullTelemetryClient
+from botbuilder.core import BotTelemetryClient, NullTelemetryClient, Recognizer
+from booking_snapshot import BookingSnapshotStore
+from money import Money, default_rate_table
 from .cancel_and_help_dialog import CancelAndHelpDialog
+from .message_catalog import MESSAGES, messages_for
 from .date_resolver_dialog import DateResolverDialog
-from dialogs.custom_prompts import TextToLuisPrompt
+from dialogs.custom_prompts import (
+    SharedModelConfirmPrompt,
+    SharedModelNumberPrompt,
+    TextToLuisPrompt,
+)
 
 
 class BookingDialog(CancelAndHelpDialog):
@@ -32,14 +44,18 @@ class BookingDialog(CancelAndHelpDialog):
     def __init__(
         self,
         dialog_id: str = None,
-        telemetry_client: BotTelemetryClient = NullTelemetryClient()
+        telemetry_client: BotTelemetryClient = NullTelemetryClient(),
+        luis_recognizer: Recognizer = None,
+        snapshots: BookingSnapshotStore = None,
     ):
         super(BookingDialog, self).__init__(
             dialog_id or BookingDialog.__name__, telemetry_client
         )
         self.telemetry_client = telemetry_client
+        # Keeps the filled slots in the user state so that the booking can be resumed
+        self.snapshots = snapshots
         
-        number_prompt = NumberPrompt(NumberPrompt.__name__)
+        number_prompt = SharedModelNumberPrompt(NumberPrompt.__name__)
         number_prompt.telemetry_client = telemetry_client
         
         text_prompt = TextPrompt(TextPrompt.__name__)
@@ -63,10 +79,12 @@ class BookingDialog(CancelAndHelpDialog):
 
         self.add_dialog(number_prompt)
         self.add_dialog(text_prompt)
-        self.add_dialog(TextToLuisPrompt("dst_city"))
-        self.add_dialog(TextToLuisPrompt("or_city"))
-        self.add_dialog(TextToLuisPrompt("budget"))
-        self.add_dialog(ConfirmPrompt(ConfirmPrompt.__name__))
+        # Share the bot's recognizer with the slot prompts when one is given
+        prompt_recognizer = {"luis_recognizer": luis_recognizer} if luis_recognizer else {}
+        self.add_dialog(TextToLuisPrompt("dst_city", **prompt_recognizer))
+        self.add_dialog(TextToLuisPrompt("or_city", **prompt_recognizer))
+        self.add_dialog(TextToLuisPrompt("budget", **prompt_recognizer))
+        self.add_dialog(SharedModelConfirmPrompt(ConfirmPrompt.__name__))
         self.add_dialog(
             DateResolverDialog("str_date", self.telemetry_client)
         )
@@ -77,12 +95,34 @@ class BookingDialog(CancelAndHelpDialog):
 
         self.initial_dialog_id = WaterfallDialog.__name__
         
-        # Date messages step are defined in .\dialogs\date_resolver_dialog.py
-        self.destination_step_message = "To what city would you like to travel?"
-        self.origin_step_message = "From what city will you be travelling?"
-        self.budget_step_message = "What is your budget?"
-        self.n_adults_step_message = "For how many adult(s)?"
-        self.n_children_step_message = "And how many child(ren)?"
+        # Messages, prompt and retry activities are compiled once per locale in
+        # .\dialogs\message_catalog.py; the step messages are kept, in the
+        # default locale, for the logs.
+        self.destination_step_message = MESSAGES.text("booking.destination")
+        self.origin_step_message = MESSAGES.text("booking.origin")
+        self.budget_step_message = MESSAGES.text("booking.budget")
+        self.n_adults_step_message = MESSAGES.text("booking.n_adults")
+        self.n_children_step_message = MESSAGES.text("booking.n_children")
+
+    async def on_begin_dialog(
+        self, inner_dc: DialogContext, options: object
+    ) -> DialogTurnResult:
+        if self.snapshots is not None:
+            await self.snapshots.start(inner_dc.context, options)
+        return await super(BookingDialog, self).on_begin_dialog(inner_dc, options)
+
+    async def on_continue_dialog(self, inner_dc: DialogContext) -> DialogTurnResult:
+        if self.snapshots is not None:
+            await self.snapshots.count_turn(inner_dc.context)
+        result = await super(BookingDialog, self).on_continue_dialog(inner_dc)
+        if self.snapshots is not None and result.status == DialogTurnStatus.Cancelled:
+            # The user asked to cancel, there is nothing to resume.
+            await self.snapshots.discard(inner_dc.context)
+        return result
+
+    async def save_snapshot(self, step_context: WaterfallStepContext):
+        if self.snapshots is not None:
+            await self.snapshots.save(step_context.context, step_context.options)
 
     def generate_step_log(
         self, bot_prompt:str, user_input:str, step_name:str
@@ -98,13 +138,9 @@ class BookingDialog(CancelAndHelpDialog):
         
         ### Flyme : Réadaptation des variables redéfinies dans ~/booking_details.py
         if booking_details.dst_city is None: # destination
-            retry_prompt = "Sorry, I couldn't find this place. Please enter a valid place."
             return await step_context.prompt(
                 "dst_city",
-                PromptOptions(
-                    prompt=MessageFactory.text(self.destination_step_message),
-                    retry_prompt=MessageFactory.text(retry_prompt)
-                ),
+                messages_for(step_context.context).prompt_options("booking.destination", "booking.city_retry"),
             )  # pylint: disable=line-too-long,bad-continuation
 
         return await step_context.next(booking_details.dst_city) # destination
@@ -119,21 +155,18 @@ class BookingDialog(CancelAndHelpDialog):
         booking_details.dst_city = step_context.result # destination
         
         # Sending the previous step log to the telemetry
-        bot_log = BookingDialog().generate_step_log(
+        bot_log = self.generate_step_log(
             self.destination_step_message,
             booking_details.dst_city,
             "destination_step"
         )
         self.telemetry_client.track_trace("Info", bot_log, "INFO")
+        await self.save_snapshot(step_context)
 
         if booking_details.or_city is None: # origin
-            retry_prompt = "Sorry, I couldn't find this place. Please enter a valid place."
             return await step_context.prompt(
                 "or_city",
-                PromptOptions(
-                    prompt=MessageFactory.text(self.origin_step_message),
-                    retry_prompt=MessageFactory.text(retry_prompt)
-                ),
+                messages_for(step_context.context).prompt_options("booking.origin", "booking.city_retry"),
             )  # pylint: disable=line-too-long,bad-continuation
         
         return await step_context.next(booking_details.or_city) # origin
@@ -150,12 +183,13 @@ class BookingDialog(CancelAndHelpDialog):
         booking_details.or_city = step_context.result # origin
         
         # Sending the previous step log to the telemetry
-        bot_log = BookingDialog().generate_step_log(
+        bot_log = self.generate_step_log(
             self.origin_step_message,
             booking_details.or_city,
             "origin_step"
         )
         self.telemetry_client.track_trace("Info", bot_log, "INFO")
+        await self.save_snapshot(step_context)
         
         if not booking_details.str_date or self.is_ambiguous(
             booking_details.str_date # travel_date
@@ -179,13 +213,13 @@ class BookingDialog(CancelAndHelpDialog):
         booking_details.str_date = step_context.result
         
         # Sending the previous step log to the telemetry
-        date_step_message = "On what date would you like to travel?"
-        bot_log = BookingDialog().generate_step_log(
-            date_step_message,
+        bot_log = self.generate_step_log(
+            MESSAGES.text("date.str_date"),
             booking_details.str_date,
             "travel_date_step"
         )
         self.telemetry_client.track_trace("Info", bot_log, "INFO")
+        await self.save_snapshot(step_context)
         
         if not booking_details.end_date or self.is_ambiguous(
             booking_details.end_date
@@ -206,23 +240,18 @@ class BookingDialog(CancelAndHelpDialog):
         booking_details.end_date = step_context.result
         
         # Sending the previous step log to the telemetry
-        travel_end_date_step_message = "On what date would you like to come back?"
-        bot_log = BookingDialog().generate_step_log(
-            travel_end_date_step_message,
+        bot_log = self.generate_step_log(
+            MESSAGES.text("date.end_date"),
             booking_details.end_date,
             "travel_end_date_step"
         )
         self.telemetry_client.track_trace("Info", bot_log, "INFO")
+        await self.save_snapshot(step_context)
                 
         if booking_details.budget is None:
-            retry_prompt = """Sorry, I couldn't process your budget input. Try
-            in a different way. Eg. 'I have a budget of 500$.'."""
             return await step_context.prompt(
                 "budget",
-                PromptOptions(
-                    prompt=MessageFactory.text(self.budget_step_message),
-                    retry_prompt=MessageFactory.text(retry_prompt)
-                ),
+                messages_for(step_context.context).prompt_options("booking.budget", "booking.budget_retry"),
             )  # pylint: disable=line-too-long,bad-continuation
 
         return await step_context.next(booking_details.budget)   
@@ -234,27 +263,22 @@ class BookingDialog(CancelAndHelpDialog):
         booking_details = step_context.options
 
         # Capture the response to the previous step's prompt
-        booking_details.budget = step_context.result
+        if isinstance(step_context.result, Money):
+            booking_details.set_budget(step_context.result, default_rate_table())
         
         # Sending the previous step log to the telemetry
-        bot_log = BookingDialog().generate_step_log(
+        bot_log = self.generate_step_log(
             self.budget_step_message,
-            booking_details.budget,
+            booking_details.summary()["budget"],
             "budget_step"
         )
         self.telemetry_client.track_trace("Info", bot_log, "INFO")
+        await self.save_snapshot(step_context)
         
         if booking_details.n_adults is None:
-            reprompt_msg = """Please include a numerical reference in your
-            sentence.
-            For example: "We are 2 adults traveling." or "We are two adults.".
-            """
             return await step_context.prompt(
                 NumberPrompt.__name__,
-                PromptOptions(
-                    prompt=MessageFactory.text(self.n_adults_step_message),
-                    retry_prompt=MessageFactory.text(reprompt_msg)
-                ),
+                messages_for(step_context.context).prompt_options("booking.n_adults", "booking.n_adults_retry"),
             )  # pylint: disable=line-too-long,bad-continuation
 
         return await step_context.next(booking_details.n_adults)      
@@ -269,24 +293,18 @@ class BookingDialog(CancelAndHelpDialog):
         booking_details.n_adults = step_context.result
 
         # Sending the previous step log to the telemetry
-        bot_log = BookingDialog().generate_step_log(
+        bot_log = self.generate_step_log(
             self.n_adults_step_message,
             str(booking_details.n_adults),
             "n_adults_step"
         )
         self.telemetry_client.track_trace("Info", bot_log, "INFO")
+        await self.save_snapshot(step_context)
 
         if booking_details.n_children is None:
-            reprompt_msg = """Please include a numerical reference in your
-            sentence.
-            For example: "I have 1 child." or "I have one child.".
-            """
             return await step_context.prompt(
                 NumberPrompt.__name__,
-                PromptOptions(
-                    prompt=MessageFactory.text(self.n_children_step_message),
-                    retry_prompt=MessageFactory.text(reprompt_msg)
-                ),
+                messages_for(step_context.context).prompt_options("booking.n_children", "booking.n_children_retry"),
             )  # pylint: disable=line-too-long,bad-continuation
 
         return await step_context.next(booking_details.n_children)     
@@ -301,21 +319,18 @@ class BookingDialog(CancelAndHelpDialog):
         booking_details.n_children = step_context.result
         
         # Sending the previous step log to the telemetry
-        bot_log = BookingDialog().generate_step_log(
+        bot_log = self.generate_step_log(
             self.n_children_step_message,
             str(booking_details.n_children),
             "n_children_step"
         )
         self.telemetry_client.track_trace("Info", bot_log, "INFO")      
+        await self.save_snapshot(step_context)
         
-        msg = (f"Just confirming, you are traveling from {booking_details.or_city} to {booking_details.dst_city} "
-               f"from {booking_details.str_date} to {booking_details.end_date} with {booking_details.n_adults} adult(s) "
-               f"and {booking_details.n_children} child(ren), and a budget of {booking_details.budget}. Does this sound correct?"
-              )
-
         # Offer a YES/NO prompt.
         return await step_context.prompt(
-            ConfirmPrompt.__name__, PromptOptions(prompt=MessageFactory.text(msg))
+            ConfirmPrompt.__name__,
+            messages_for(step_context.context).prompt_options("booking.confirm", **booking_details.summary()),
         )
         
     # async def final_step(self, step_context: WaterfallStepContext) -> DialogTurnResult:
@@ -338,17 +353,21 @@ class BookingDialog(CancelAndHelpDialog):
             "str_date": str(booking_details.str_date),
             "end_date": str(booking_details.end_date),
             "budget": str(booking_details.budget),
+            "budget_stated": str(booking_details.summary()["budget"]),
             "n_adults": str(booking_details.n_adults),
             "n_children": str(booking_details.n_children)
         }
 
+        if self.snapshots is not None:
+            await self.snapshots.finish(step_context.context, bool(step_context.result))
+
         if step_context.result:
             self.telemetry_client.track_trace("Success", properties, "INFO")
             return await step_context.end_dialog(booking_details)
 
         self.telemetry_client.track_trace("Fail", properties, "ERROR")
         await step_context.context.send_activity(
-            MessageFactory.text("Please consider making a new booking.")
+            messages_for(step_context.context).activity("booking.failed")
         )
 
         return await step_context.end_dialog()
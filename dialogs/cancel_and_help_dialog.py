@@ -2,7 +2,9 @@
 # Licensed under the MIT License.
 """Handle cancel and help intents."""
 
-from botbuilder.core import BotTelemetryClient, NullTelemetryClient
+from typing import Optional
+
+from botbuilder.core import BotTelemetryClient, NullTelemetryClient, TurnContext
 from botbuilder.dialogs import (
     ComponentDialog,
     DialogContext,
@@ -11,6 +13,11 @@ from botbuilder.dialogs import (
 )
 from botbuilder.schema import ActivityTypes
 
+from .message_catalog import messages_for
+
+# Turn state key caching the interruption of the current turn
+INTERRUPTION_KEY = "Interruption"
+
 
 class CancelAndHelpDialog(ComponentDialog):
     """Implementation of handling cancel and help."""
@@ -41,15 +48,31 @@ class CancelAndHelpDialog(ComponentDialog):
 
     async def interrupt(self, inner_dc: DialogContext) -> DialogTurnResult:
         """Detect interruptions."""
-        if inner_dc.context.activity.type == ActivityTypes.message:
-            text = inner_dc.context.activity.text.lower()
+        interruption = interruption_of(inner_dc.context)
 
-            if text in ("help", "?"):
-                await inner_dc.context.send_activity("Show Help...")
-                return DialogTurnResult(DialogTurnStatus.Waiting)
+        if interruption == "help":
+            await inner_dc.context.send_activity(
+                messages_for(inner_dc.context).activity("interrupt.help")
+            )
+            return DialogTurnResult(DialogTurnStatus.Waiting)
 
-            if text in ("cancel", "quit"):
-                await inner_dc.context.send_activity("Cancelling")
-                return await inner_dc.cancel_all_dialogs()
+        if interruption == "cancel":
+            await inner_dc.context.send_activity(
+                messages_for(inner_dc.context).activity("interrupt.cancel")
+            )
+            return await inner_dc.cancel_all_dialogs()
 
         return None
+
+
+def interruption_of(turn_context: TurnContext) -> Optional[str]:
+    """The interruption in the turn's message, matched once per turn: the
+    nested dialogs (BookingDialog, then its DateResolverDialog) reuse it."""
+    if INTERRUPTION_KEY not in turn_context.turn_state:
+        activity = turn_context.activity
+        turn_context.turn_state[INTERRUPTION_KEY] = (
+            messages_for(turn_context).interruptions.match(activity.text)
+            if activity.type == ActivityTypes.message
+            else None
+        )
+    return turn_context.turn_state[INTERRUPTION_KEY]
@@ -1,22 +1,41 @@
-from botbuilder.dialogs.prompts import Prompt, PromptOptions, PromptRecognizerResult
+from babel.numbers import parse_decimal
+from botbuilder.dialogs.prompts import (
+    ConfirmPrompt,
+    DateTimePrompt,
+    DateTimeResolution,
+    NumberPrompt,
+    Prompt,
+    PromptOptions,
+    PromptRecognizerResult,
+)
 from botbuilder.core.turn_context import TurnContext
 from botbuilder.schema import ActivityTypes
 
 from flight_booking_recognizer import FlightBookingRecognizer
 from config import DefaultConfig
+from money import budget_from_entities, default_rate_table, parse_money
+from prompt_models import iso_date, plain_integer, prompt_models
 
+from functools import lru_cache
 from typing import Dict
 
 
+@lru_cache(maxsize=None)
+def default_luis_recognizer() -> FlightBookingRecognizer:
+    # Built on first use rather than as an import-time default argument, so
+    # that importing the dialogs does not create an unused recognizer.
+    return FlightBookingRecognizer(DefaultConfig)
+
+
 class TextToLuisPrompt(Prompt):
     def __init__(
         self,
         dialog_id: str,
-        luis_recognizer: FlightBookingRecognizer = FlightBookingRecognizer(DefaultConfig),
+        luis_recognizer: FlightBookingRecognizer = None,
         validator : object = None
         ):
         self.dialog_id = dialog_id
-        self.luis_recognizer = luis_recognizer
+        self.luis_recognizer = luis_recognizer or default_luis_recognizer()
         self.detected_intent = None
         super().__init__(dialog_id, validator=validator)
 
@@ -50,6 +69,17 @@ class TextToLuisPrompt(Prompt):
 
         prompt_result = PromptRecognizerResult()
         recognizer_result = await self.luis_recognizer.recognize(turn_context)
+
+        if self.dialog_id == "budget":
+            # The answer to "What is your budget?": a bare amount is in the base currency.
+            rates = default_rate_table()
+            money = budget_from_entities(recognizer_result.entities, rates.base_currency)
+            if money is None:
+                money = parse_money(turn_context.activity.text, rates.base_currency)
+            # Amounts in a currency without a rate are retried.
+            prompt_result.succeeded = money is not None and rates.to_base(money) is not None
+            prompt_result.value = money if prompt_result.succeeded else None
+            return prompt_result
         
         def retrieve_entity(
             luis_result=recognizer_result,
@@ -60,18 +90,11 @@ class TextToLuisPrompt(Prompt):
             from_entities = entities.get(entity_to_retrieve, [])
             # Double check with prebuilt model entity
             is_valid = ["geographyV2" in key for key in entities.keys()]
-            if entity_to_retrieve == "budget":
-                if len(from_entities) > 0:
-                    if luis_result.entities.get(
-                            entity_to_retrieve, [{"$instance": {}}]):
-                        entity = str(from_entities[0]["text"])
-                        print(f"found {entity_to_retrieve} :", entity)
-            else:
-                if len(from_entities) > 0 and True in is_valid:
-                    if luis_result.entities.get(
-                            entity_to_retrieve, [{"$instance": {}}]):
-                        entity = str(from_entities[0]["text"]).title()
-                        print(f"found {entity_to_retrieve} :", entity)
+            if len(from_entities) > 0 and True in is_valid:
+                if luis_result.entities.get(
+                        entity_to_retrieve, [{"$instance": {}}]):
+                    entity = str(from_entities[0]["text"]).title()
+                    print(f"found {entity_to_retrieve} :", entity)
             return entity
         
         entity = retrieve_entity()
@@ -87,3 +110,75 @@ class TextToLuisPrompt(Prompt):
 
         return prompt_result
     
+
+
+# The prompts below recognize with the models shared by the whole process,
+# see prompt_models.py, instead of looking them up on every turn.
+class SharedModelNumberPrompt(NumberPrompt):
+    async def on_recognize(
+        self,
+        turn_context: TurnContext,
+        state: Dict[str, object],
+        options: PromptOptions,
+    ) -> PromptRecognizerResult:
+        result = PromptRecognizerResult()
+        utterance = turn_context.activity.text
+        if turn_context.activity.type != ActivityTypes.message or not utterance:
+            return result
+        value = plain_integer(utterance)
+        if value is None:
+            culture = self._get_culture(turn_context)
+            results = prompt_models(culture).number.parse(utterance)
+            if results:
+                value = parse_decimal(
+                    results[0].resolution["value"], locale=culture.replace("-", "_")
+                )
+        result.succeeded = value is not None
+        result.value = value
+        return result
+
+
+class SharedModelDateTimePrompt(DateTimePrompt):
+    async def on_recognize(
+        self,
+        turn_context: TurnContext,
+        state: Dict[str, object],
+        options: PromptOptions,
+    ) -> PromptRecognizerResult:
+        result = PromptRecognizerResult()
+        utterance = turn_context.activity.text
+        if turn_context.activity.type != ActivityTypes.message or not utterance:
+            return result
+        date = iso_date(utterance)
+        if date is not None:
+            result.succeeded = True
+            result.value = [DateTimeResolution(timex=date, value=date)]
+            return result
+        models = prompt_models(turn_context.activity.locale or self.default_locale)
+        results = models.datetime.parse(utterance)
+        if results:
+            result.succeeded = True
+            result.value = [
+                self.read_resolution(value) for value in results[0].resolution["values"]
+            ]
+        return result
+
+
+class SharedModelConfirmPrompt(ConfirmPrompt):
+    async def on_recognize(
+        self,
+        turn_context: TurnContext,
+        state: Dict[str, object],
+        options: PromptOptions,
+    ) -> PromptRecognizerResult:
+        utterance = turn_context.activity.text
+        if turn_context.activity.type == ActivityTypes.message and utterance:
+            culture = self._determine_culture(turn_context.activity)
+            results = prompt_models(culture).boolean.parse(utterance)
+            if results and "value" in results[0].resolution:
+                result = PromptRecognizerResult()
+                result.succeeded = True
+                result.value = results[0].resolution["value"]
+                return result
+        # Not a yes or no: the choice numbers ("1", "2") are recognized by ConfirmPrompt.
+        return await super().on_recognize(turn_context, state, options)
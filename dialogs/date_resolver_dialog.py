@@ -4,15 +4,16 @@
 
 from datatypes_date_time.timex import Timex
 
-from botbuilder.core import MessageFactory, BotTelemetryClient, NullTelemetryClient
+from botbuilder.core import BotTelemetryClient, NullTelemetryClient
 from botbuilder.dialogs import WaterfallDialog, DialogTurnResult, WaterfallStepContext
 from botbuilder.dialogs.prompts import (
     DateTimePrompt,
     PromptValidatorContext,
-    PromptOptions,
     DateTimeResolution,
 )
 from .cancel_and_help_dialog import CancelAndHelpDialog
+from .custom_prompts import SharedModelDateTimePrompt
+from .message_catalog import messages_for
 
 
 class DateResolverDialog(CancelAndHelpDialog):
@@ -28,7 +29,7 @@ class DateResolverDialog(CancelAndHelpDialog):
         )
         self.telemetry_client = telemetry_client
         self.dialog_id = dialog_id
-        date_time_prompt = DateTimePrompt(
+        date_time_prompt = SharedModelDateTimePrompt(
             DateTimePrompt.__name__, DateResolverDialog.datetime_prompt_validator
         )
         date_time_prompt.telemetry_client = telemetry_client
@@ -48,32 +49,20 @@ class DateResolverDialog(CancelAndHelpDialog):
     ) -> DialogTurnResult:
         """Prompt for the date."""
         timex = step_context.options
-
-        if self.dialog_id == "str_date":
-            prompt_msg = "On what date would you like to travel?"
-        elif self.dialog_id == "end_date":
-            prompt_msg = "On what date would you like to come back?"
-            
-        reprompt_msg = (
-            "I'm sorry, for best results, please enter your travel "
-            "date including the month, day and year."
-        )
+        messages = messages_for(step_context.context)
 
         if timex is None:
             # We were not given any date at all so prompt the user.
             return await step_context.prompt(
                 DateTimePrompt.__name__,
-                PromptOptions(  # pylint: disable=bad-continuation
-                    prompt=MessageFactory.text(prompt_msg),
-                    retry_prompt=MessageFactory.text(reprompt_msg),
-                ),
+                messages.prompt_options(f"date.{self.dialog_id}", "date.retry"),
             )
 
         # We have a Date we just need to check it is unambiguous.
         if "definite" in Timex(timex).types:
             # This is essentially a "reprompt" of the data we were given up front.
             return await step_context.prompt(
-                DateTimePrompt.__name__, PromptOptions(prompt=reprompt_msg)
+                DateTimePrompt.__name__, messages.prompt_options("date.retry")
             )
 
         return await step_context.next(DateTimeResolution(timex=timex))
@@ -1,30 +1,38 @@
 import json
+from functools import lru_cache
 
 from botbuilder.schema import Attachment
 
+CARD_PATH = "bots/resources/FlightItineraryCard.json"
+
+
+@lru_cache(maxsize=None)
+def load_card_template(path: str = CARD_PATH) -> str:
+    """The card's JSON text, read once per process."""
+    with open(path) as f:
+        return json.dumps(json.load(f))
+
 
 class FlightItineraryCard:
     def __init__(self, flight_data):
         self.flight_data = flight_data
 
     @staticmethod
-    def _replace_placeholders(card, data):
-        card_str = json.dumps(card)
+    def _replace_placeholders(card_str, data):
         for key, value in data.items():
             pattern = "${{{}}}".format(key)
             card_str = card_str.replace(pattern, str(value))
         return json.loads(card_str)
 
-    def create_attachment(self, path="bots/resources/FlightItineraryCard.json"):
-        with open(path) as f:
-            card = json.load(f)
+    def create_attachment(self, path=CARD_PATH):
+        card = load_card_template(path)
 
         template_card = {
             "or_city": self.flight_data.or_city,
             "dst_city": self.flight_data.dst_city,
             "str_date": self.flight_data.str_date,
             "end_date": self.flight_data.end_date,
-            "budget": self.flight_data.budget,
+            "budget": self.flight_data.summary()["budget"],
             "n_adults": self.flight_data.n_adults,
             "n_children": self.flight_data.n_children
         }
@@ -0,0 +1,60 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Interruption phrases ("help", "cancel"...), matched against the whole utterance.
+
+Each message catalog lists, under "interruptions", the phrases of every kind
+of interruption in its language, and under "interruption_fillers" the words
+that may surround a phrase ("please", "can you"). An utterance is an
+interruption only when it is one of the phrases, ignoring case and
+punctuation, possibly between filler words: "Cancel!", "can you help me?"
+and "ok, never mind" are, "I want to quit my job and fly to Paris" and
+"help me book a flight to Paris" are not. A cancel ends every dialog of the
+conversation, so a phrase inside a longer request never triggers it.
+Phrases without letters or digits, like "?", only match a whole utterance.
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional
+
+_WORD = re.compile(r"\w+")
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(text.casefold())
+
+
+class InterruptionMatcher:
+    def __init__(self, phrases: Dict[str, Iterable[str]] = None, fillers: Iterable[str] = ()):
+        # Words of a phrase, joined by a space -> kind
+        self._phrases: Dict[str, str] = {}
+        self._whole: Dict[str, str] = {}
+        self._fillers = {word for filler in fillers for word in _words(filler)}
+        for kind, kind_phrases in (phrases or {}).items():
+            for phrase in kind_phrases:
+                words = _words(phrase)
+                if words:
+                    self._phrases.setdefault(" ".join(words), kind)
+                elif phrase.strip():
+                    self._whole.setdefault("".join(phrase.split()), kind)
+
+    def match(self, text: Optional[str]) -> Optional[str]:
+        """The kind of interruption `text` is, None if it is none."""
+        if not text:
+            return None
+        whole = self._whole.get("".join(text.split()))
+        if whole is not None:
+            return whole
+        words = _words(text)
+        leading = 0
+        while leading < len(words) and words[leading] in self._fillers:
+            leading += 1
+        trailing = len(words)
+        while trailing > leading and words[trailing - 1] in self._fillers:
+            trailing -= 1
+        # A filler word may also belong to the phrase ("forget it"): every split is tried.
+        for start in range(leading + 1):
+            for end in range(len(words), trailing - 1, -1):
+                kind = self._phrases.get(" ".join(words[start:end]))
+                if kind is not None:
+                    return kind
+        return None
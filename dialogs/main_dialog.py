@@ -33,26 +33,51 @@ ou un message d'erreur à l'utilisateur en fonction de la réussite ou de l'éch
 de la réservation.
 """
 
+import json
+import os.path
+import time
+from typing import Callable, NamedTuple
+
 from botbuilder.dialogs import (
     ComponentDialog,
     WaterfallDialog,
     WaterfallStepContext,
     DialogTurnResult,
 )
-from botbuilder.dialogs.prompts import TextPrompt, PromptOptions
+from botbuilder.dialogs.prompts import ConfirmPrompt, TextPrompt, PromptOptions
 from botbuilder.core import (
     MessageFactory,
     TurnContext,
     BotTelemetryClient,
     NullTelemetryClient,
 )
-from botbuilder.schema import InputHints
+from botbuilder.schema import Activity, InputHints
 
 from booking_details import BookingDetails
+from booking_snapshot import BookingSnapshotStore
 from flight_booking_recognizer import FlightBookingRecognizer
 from helpers.luis_helper import LuisHelper, Intent
+from .custom_prompts import SharedModelConfirmPrompt
 from .flight_itinerary_card import FlightItineraryCard
 from .booking_dialog import BookingDialog
+from .message_catalog import MESSAGES, MessageCatalog, messages_for
+
+INTENT_ROUTES_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "resources", "intent_routes.json"
+)
+INTRO_MESSAGE = MESSAGES.text("main.intro")
+
+
+class IntentRoute(NamedTuple):
+    """How act_step answers one intent."""
+
+    handler: Callable
+    reply: Activity
+    trace_name: str
+    severity: str
+    requires_details: bool
+    # Catalog message replacing `reply` in the locales that define it
+    message_id: str = None
 
 
 class MainDialog(ComponentDialog):
@@ -61,6 +86,7 @@ class MainDialog(ComponentDialog):
             luis_recognizer: FlightBookingRecognizer,
             booking_dialog: BookingDialog,
             telemetry_client: BotTelemetryClient = NullTelemetryClient(),
+            snapshots: BookingSnapshotStore = None,
     ):
         super(MainDialog, self).__init__(MainDialog.__name__)
         self.telemetry_client = telemetry_client or NullTelemetryClient()
@@ -76,102 +102,172 @@ class MainDialog(ComponentDialog):
 
         self._luis_recognizer = luis_recognizer
         self._booking_dialog_id = booking_dialog.id
+        # Unfinished bookings offered for resumption, see booking_snapshot.py
+        self._snapshots = snapshots
 
         self.add_dialog(text_prompt)
+        self.add_dialog(SharedModelConfirmPrompt(ConfirmPrompt.__name__))
         self.add_dialog(booking_dialog)
         self.add_dialog(wf_dialog)
 
         self.initial_dialog_id = "WFDialog"
 
+        # Intent -> route table, built once. Intents with a canned answer are
+        # declared in resources/intent_routes.json; unknown intents fall back
+        # to the "didn't understand" route.
+        self._intent_routes = {}
+        self.register_intent(
+            Intent.BOOK_FLIGHT.value, handler=self._book_flight, requires_details=True
+        )
+        self._register_routes_from_file(INTENT_ROUTES_PATH)
+        self._fallback_route = IntentRoute(
+            MainDialog._reply_and_continue,
+            MESSAGES.activity("main.didnt_understand"),
+            "Fail",
+            "ERROR",
+            False,
+            "main.didnt_understand",
+        )
+
     async def intro_step(self, step_context: WaterfallStepContext) -> DialogTurnResult:
+        messages = messages_for(step_context.context)
+        if self._snapshots is not None and not step_context.options:
+            snapshot = await self._snapshots.get(step_context.context)
+            if snapshot is not None:
+                return await step_context.prompt(
+                    ConfirmPrompt.__name__,
+                    messages.prompt_options(
+                        "main.resume", trip=MainDialog._resume_trip(messages, snapshot["slots"])
+                    ),
+                )
+
         if not self._luis_recognizer.is_configured:
             await step_context.context.send_activity(
-                MessageFactory.text(
-                    "NOTE: LUIS is not configured. To enable all capabilities, add 'LuisAppId', 'LuisAPIKey' and "
-                    "'LuisAPIHostName' to the appsettings.json file.",
-                    input_hint=InputHints.ignoring_input,
-                )
+                messages.activity("main.luis_not_configured")
             )
 
             return await step_context.next(None)
         
-        message_text = (
-            str(step_context.options)
-            if step_context.options
-            else "What can I help you with today?"
-        )
-        prompt_message = MessageFactory.text(
-            message_text, message_text, InputHints.expecting_input
-        )
+        if step_context.options:
+            message_text = str(step_context.options)
+            prompt_message = MessageFactory.text(
+                message_text, message_text, InputHints.expecting_input
+            )
+            return await step_context.prompt(
+                TextPrompt.__name__, PromptOptions(prompt=prompt_message)
+            )
 
         return await step_context.prompt(
-            TextPrompt.__name__, PromptOptions(prompt=prompt_message)
+            TextPrompt.__name__, messages.prompt_options("main.intro")
         )
 
     async def act_step(self, step_context: WaterfallStepContext) -> DialogTurnResult:
+        if isinstance(step_context.result, bool):
+            # Answer to the offer to resume an unfinished booking
+            return await self._resume_booking(step_context)
+
         if not self._luis_recognizer.is_configured:
             # LUIS is not configured, we just run the BookingDialog path with an empty BookingDetailsInstance.
             return await step_context.begin_dialog(
                 self._booking_dialog_id, BookingDetails()
             )
 
+        started = time.perf_counter()
         # Call LUIS and gather any potential booking details. (Note the TurnContext has the response to the prompt.)
         intent, luis_result = await LuisHelper.execute_luis_query(
             self._luis_recognizer, step_context.context
         )
 
+        route = self._intent_routes.get(intent, self._fallback_route)
+        if route.requires_details and not luis_result:
+            route = self._fallback_route
+
         bot_log = {
-            "bot": "What can I help you with today?",
+            "bot": INTRO_MESSAGE,
             "user": step_context.result,
             "step": "act_step",
             "intent": intent
             }
+        self.telemetry_client.track_trace(route.trace_name, bot_log, route.severity)
 
-        if intent == Intent.BOOK_FLIGHT.value and luis_result:
-            # Show a warning for Origin and Destination if we can't resolve them.
-            await MainDialog._show_warning_for_unsupported_cities(
-                step_context.context, luis_result
-            )
-            self.telemetry_client.track_trace("Info", bot_log, "INFO")
-            # Run the BookingDialog giving it whatever details we have from the LUIS call.
-            return await step_context.begin_dialog(self._booking_dialog_id, luis_result)
-
-        elif intent == Intent.CANCEL.value:
-            cancel_text = "See you soon!"
-            cancel_message = MessageFactory.text(
-                cancel_text, cancel_text, InputHints.ignoring_input
-            )
-            self.telemetry_client.track_trace("Cancel", bot_log, "ERROR")
-            await step_context.context.send_activity(cancel_message)
+        result = await route.handler(step_context, route, luis_result)
+        self.telemetry_client.track_metric(
+            "IntentLatencyMs",
+            (time.perf_counter() - started) * 1000,
+            properties={"intent": str(intent)},
+        )
+        return result
 
-        elif intent == Intent.CONFIRM.value:
-            confirm_text = "Good!"
-            confirm_message = MessageFactory.text(
-                confirm_text, confirm_text, InputHints.ignoring_input
-            )
-            self.telemetry_client.track_trace("Confirm", bot_log, "INFO")
-            await step_context.context.send_activity(confirm_message)
-            
-        elif intent == Intent.NONE_INTENT.value:
-            none_text = """Sorry, I'm programmed to book flights. Please try to
-            express your intent clearly."""
-            none_message = MessageFactory.text(
-                none_text, none_text, InputHints.ignoring_input
-            )
-            self.telemetry_client.track_trace("None", bot_log, "WARNING")
-            await step_context.context.send_activity(none_message)
-                       
-        else:
-            didnt_understand_text = (
-                """Sorry, I didn't get that. Please try asking in a different way.
-                (Press a key to restart the bot)"""
-            )
-            didnt_understand_message = MessageFactory.text(
-                didnt_understand_text, didnt_understand_text, InputHints.ignoring_input
+    def register_intent(
+        self,
+        intent: str,
+        reply_text: str = None,
+        trace_name: str = "Info",
+        severity: str = "INFO",
+        handler: Callable = None,
+        requires_details: bool = False,
+    ) -> None:
+        """Route `intent` to `handler`, or to a canned `reply_text` when no handler is given.
+
+        Handlers are awaited with (step_context, route, luis_result) and return the step's DialogTurnResult.
+        """
+        reply = None
+        if reply_text is not None:
+            reply = MessageFactory.text(reply_text, reply_text, InputHints.ignoring_input)
+        self._intent_routes[intent] = IntentRoute(
+            handler or MainDialog._reply_and_continue,
+            reply,
+            trace_name,
+            severity,
+            requires_details,
+            f"intent.{intent}",
+        )
+
+    def _register_routes_from_file(self, path: str) -> None:
+        with open(path, encoding="utf-8") as routes_file:
+            routes = json.load(routes_file)
+        for intent, route in routes.items():
+            self.register_intent(
+                intent, route["reply"], route.get("trace", "Info"), route.get("severity", "INFO")
             )
-            self.telemetry_client.track_trace("Fail", bot_log, "ERROR")
-            await step_context.context.send_activity(didnt_understand_message)
 
+    async def _resume_booking(self, step_context: WaterfallStepContext) -> DialogTurnResult:
+        if step_context.result:
+            booking_details = await self._snapshots.resume(step_context.context)
+            return await step_context.begin_dialog(self._booking_dialog_id, booking_details)
+
+        await self._snapshots.discard(step_context.context)
+        return await step_context.replace_dialog(self.id)
+
+    @staticmethod
+    def _resume_trip(messages: MessageCatalog, slots: dict) -> str:
+        trip = messages.text("main.trip")
+        if slots.get("dst_city"):
+            trip += messages.text("main.trip_to", dst_city=slots["dst_city"])
+        if slots.get("or_city"):
+            trip += messages.text("main.trip_from", or_city=slots["or_city"])
+        return trip
+
+    async def _book_flight(
+        self, step_context: WaterfallStepContext, route: IntentRoute, luis_result: BookingDetails
+    ) -> DialogTurnResult:
+        # Show a warning for Origin and Destination if we can't resolve them.
+        await MainDialog._show_warning_for_unsupported_cities(
+            step_context.context, luis_result
+        )
+        # Run the BookingDialog giving it whatever details we have from the LUIS call.
+        return await step_context.begin_dialog(self._booking_dialog_id, luis_result)
+
+    @staticmethod
+    async def _reply_and_continue(
+        step_context: WaterfallStepContext, route: IntentRoute, luis_result: object
+    ) -> DialogTurnResult:
+        # send_activity copies the activity, so the pre-built reply is safe to share.
+        messages = messages_for(step_context.context)
+        reply = route.reply
+        if route.message_id in messages:
+            reply = messages.activity(route.message_id)
+        await step_context.context.send_activity(reply)
         return await step_context.next(None)
 
     async def final_step(self, step_context: WaterfallStepContext) -> DialogTurnResult:
@@ -185,15 +281,9 @@ class MainDialog(ComponentDialog):
             response = MessageFactory.attachment(card)
             await step_context.context.send_activity(response)
             
-            msg_txt = f"""Your flight is confirmed for {result.n_adults}
-            adult(s) and {result.n_children}, from {result.or_city} to
-            {result.dst_city}, on {result.str_date} and return on
-            {result.end_date}.
-            All of the booking details will be sent to you via email. Have a
-            good flight!
-            """
-            message = MessageFactory.text(msg_txt, msg_txt, InputHints.ignoring_input)
-            await step_context.context.send_activity(message)
+            await step_context.context.send_activity(
+                messages_for(step_context.context).activity("main.confirmed", **result.summary())
+            )
 
         # prompt_message = "Do you want something else?"
         # return await step_context.replace_dialog(self.id, prompt_message)
@@ -209,11 +299,7 @@ class MainDialog(ComponentDialog):
         will be empty if those entity values can't be mapped to a canonical item in the Airport.
         """
         if luis_result.unsupported_airports:
-            message_text = (
-                f"Sorry but the following airports are not supported:"
-                f" {', '.join(luis_result.unsupported_airports)}"
-            )
-            message = MessageFactory.text(
-                message_text, message_text, InputHints.ignoring_input
-            )
-            await context.send_activity(message)
+            await context.send_activity(messages_for(context).activity(
+                "main.unsupported_airports",
+                airports=", ".join(luis_result.unsupported_airports),
+            ))
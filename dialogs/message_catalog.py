@@ -0,0 +1,226 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Bot messages, compiled once per locale from resources/messages/<locale>.json.
+
+The catalog has two sections: "prompts" are sent while waiting for the
+user's answer (input hint expectingInput), "replies" are not. Messages
+without placeholders are built once into Activity objects that every turn
+shares: send_activity copies what it sends, and Prompt.begin_dialog only
+sets an input hint that is already there, so nothing modifies them. Static
+prompts are also registered with STATIC_PROMPTS so that persisted dialog
+state refers to them by id ("<locale>:<message id>" outside the default
+locale).
+
+Messages with {placeholders} are parsed when the catalog is loaded into
+literal segments and placeholder names; rendering joins the segments with
+the values read from a mapping, as str.format_map would without parsing
+the text again. Their activities are cloned from a prototype built at load time,
+which skips Activity.__init__ (msrest model initialization costs more than
+rendering the text).
+
+The "interruptions" section lists the phrases of each kind of interruption
+("help", "cancel"), and "interruption_fillers" the words that may surround
+them, for the catalog's InterruptionMatcher.
+
+Dialogs get the catalog of the turn's locale from messages_for(). Catalogs
+other than the default one are loaded on first use and evicted when unused,
+see locale_resources.py; an evicted catalog is reloaded if a persisted
+dialog state still refers to one of its prompts.
+"""
+
+import json
+import os.path
+from string import Formatter
+from typing import Callable, Dict, Mapping, Optional, Tuple
+
+from botbuilder.core import MessageFactory, TurnContext
+from botbuilder.dialogs.prompts import PromptOptions
+from botbuilder.schema import Activity, InputHints
+
+from compacting_storage import STATIC_PROMPTS, StaticPromptRegistry
+from config import DefaultConfig
+from locale_resources import LocaleCache, resolve_locale
+from .interruption_matcher import InterruptionMatcher
+
+MESSAGES_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "resources", "messages"
+)
+DEFAULT_LOCALE = "en-US"
+# Turn state key caching the catalog of the current turn
+CATALOG_KEY = "MessageCatalog"
+
+
+class MessageTemplate:
+    """One catalog entry."""
+
+    __slots__ = ("message_id", "text", "fields", "input_hint", "activity", "render", "_prototype")
+
+    def __init__(self, message_id: str, text: str, input_hint: str):
+        fields = []
+        # (literal text, placeholder after it or None)
+        segments = []
+        for literal, field, format_spec, conversion in Formatter().parse(text):
+            if field is not None:
+                if not field.isidentifier() or format_spec or conversion:
+                    raise ValueError(f"Message {message_id}: unsupported placeholder {{{field}}}")
+                if field not in fields:
+                    fields.append(field)
+            segments.append((literal, field))
+        self.message_id = message_id
+        self.text = text
+        self.fields: Tuple[str, ...] = tuple(fields)
+        self.input_hint = input_hint
+        # Shared by every turn; None for parameterized messages
+        self.activity: Activity = None if fields else MessageFactory.text(text, text, input_hint)
+        self._prototype = MessageFactory.text(text, text, input_hint)
+        # render(values: Mapping) -> str; a missing value raises KeyError
+        self.render: Callable[[Mapping], str] = MessageTemplate._compile(tuple(segments), text)
+
+    def new_activity(self, values: Mapping) -> Activity:
+        text = self.render(values)
+        activity = Activity.__new__(Activity)
+        activity.__dict__ = dict(self._prototype.__dict__)
+        activity.text = activity.speak = text
+        activity.additional_properties = {}
+        return activity
+
+    @staticmethod
+    def _compile(
+        segments: Tuple[Tuple[str, Optional[str]], ...], text: str
+    ) -> Callable[[Mapping], str]:
+        if all(field is None for _, field in segments):
+            return lambda values: text
+
+        def render(values: Mapping) -> str:
+            return "".join(
+                [
+                    literal if field is None else literal + format(values[field])
+                    for literal, field in segments
+                ]
+            )
+
+        return render
+
+
+class MessageCatalog:
+    def __init__(
+        self,
+        locale: str,
+        messages: Dict[str, MessageTemplate],
+        interruptions: InterruptionMatcher = None,
+    ):
+        self.locale = locale
+        self._messages = messages
+        self.interruptions = interruptions or InterruptionMatcher()
+
+    @staticmethod
+    def load(
+        locale: str = DEFAULT_LOCALE,
+        directory: str = MESSAGES_DIR,
+        registry: StaticPromptRegistry = STATIC_PROMPTS,
+    ) -> "MessageCatalog":
+        with open(os.path.join(directory, f"{locale}.json"), encoding="utf-8") as catalog_file:
+            sections = json.load(catalog_file)
+        messages = {}
+        for section, input_hint in (
+            ("prompts", InputHints.expecting_input),
+            ("replies", InputHints.ignoring_input),
+        ):
+            for message_id, text in sections.get(section, {}).items():
+                messages[message_id] = MessageTemplate(message_id, text, input_hint)
+        catalog = MessageCatalog(
+            locale,
+            messages,
+            InterruptionMatcher(
+                sections.get("interruptions", {}), sections.get("interruption_fillers", [])
+            ),
+        )
+        if registry is not None:
+            for prompt_id, activity in catalog.static_prompts().items():
+                registry.register(prompt_id, activity)
+        return catalog
+
+    @staticmethod
+    def prompt_id(locale: str, message_id: str) -> str:
+        return message_id if locale == DEFAULT_LOCALE else f"{locale}:{message_id}"
+
+    def static_prompts(self) -> Dict[str, Activity]:
+        """Registry id -> shared activity of the prompts without placeholders."""
+        return {
+            MessageCatalog.prompt_id(self.locale, message.message_id): message.activity
+            for message in self._messages.values()
+            if message.activity is not None and message.input_hint == InputHints.expecting_input
+        }
+
+    def __contains__(self, message_id: str) -> bool:
+        return message_id in self._messages
+
+    def template(self, message_id: str) -> MessageTemplate:
+        return self._messages[message_id]
+
+    def text(self, message_id: str, **values) -> str:
+        return self._messages[message_id].render(values)
+
+    def activity(self, message_id: str, **values) -> Activity:
+        """The shared activity of a static message, or a new one rendered from `values`.
+
+        Shared activities must not be modified; send_activity copies them.
+        """
+        return self._activity(self._messages[message_id], values)
+
+    def prompt_options(self, prompt_id: str, retry_id: str = None, **values) -> PromptOptions:
+        # PromptOptions is per prompt (it counts attempts), the activities are shared.
+        return PromptOptions(
+            prompt=self._activity(self._messages[prompt_id], values),
+            retry_prompt=self._messages[retry_id].activity if retry_id else None,
+        )
+
+    @staticmethod
+    def _activity(message: MessageTemplate, values: Mapping) -> Activity:
+        if message.activity is not None:
+            return message.activity
+        return message.new_activity(values)
+
+
+def _unregister_prompts(locale: str, catalog: MessageCatalog):
+    for prompt_id in catalog.static_prompts():
+        STATIC_PROMPTS.unregister(prompt_id)
+
+
+AVAILABLE_LOCALES = sorted(
+    name[:-len(".json")] for name in os.listdir(MESSAGES_DIR) if name.endswith(".json")
+)
+CATALOGS: LocaleCache = LocaleCache(
+    MessageCatalog.load,
+    DEFAULT_LOCALE,
+    max_resident=DefaultConfig.MAX_RESIDENT_LOCALES,
+    idle_seconds=DefaultConfig.LOCALE_IDLE_SECONDS,
+    on_evict=_unregister_prompts,
+    name="messages",
+)
+MESSAGES = CATALOGS.default
+
+
+def _evicted_prompt(prompt_id: str) -> Optional[Activity]:
+    locale, _, message_id = prompt_id.rpartition(":")
+    if locale not in AVAILABLE_LOCALES:
+        return None
+    message = CATALOGS.get(locale).template(message_id)
+    return message.activity
+
+
+STATIC_PROMPTS.fallback = _evicted_prompt
+
+
+def messages_for(turn_context: TurnContext) -> MessageCatalog:
+    """The catalog of the turn's locale.
+
+    Catalogs are small JSON files, loading one on the event loop is cheaper
+    than a hop to the executor.
+    """
+    catalog = turn_context.turn_state.get(CATALOG_KEY)
+    if catalog is None:
+        locale = resolve_locale(turn_context.activity.locale, AVAILABLE_LOCALES, DEFAULT_LOCALE)
+        catalog = CATALOGS.get(locale)
+        turn_context.turn_state[CATALOG_KEY] = catalog
+    return catalog
@@ -1,23 +1,79 @@
 # Copyright (c) Microsoft Corporation. All rights reserved.
 # Licensed under the MIT License.
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
+from azure.cognitiveservices.language.luis.runtime import LUISRuntimeClient
+from msrest.authentication import CognitiveServicesCredentials
 from botbuilder.ai.luis import LuisApplication, LuisRecognizer, LuisPredictionOptions
+from botbuilder.ai.luis.luis_util import LuisUtil
 from botbuilder.core import (
+    IntentScore,
     Recognizer,
     RecognizerResult,
     TurnContext,
     BotTelemetryClient,
     NullTelemetryClient,
 )
+from botbuilder.schema import ActivityTypes
 
 from config import DefaultConfig
+from recognizer_quota import RecognizerQuota
+
+# Latencies kept to compute the hedging percentile, and how many are needed first.
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+
+
+class LuisEndpoint:
+    """One LUIS v2 prediction endpoint with its own, reused, HTTP session.
+
+    `resolve` is blocking (msrest/requests); FlightBookingRecognizer runs it on
+    a thread pool so that the event loop keeps serving other conversations.
+    """
+
+    def __init__(self, application: LuisApplication, timeout_seconds: float):
+        self.application = application
+        self.host_name = application.endpoint
+        self._runtime = LUISRuntimeClient(
+            application.endpoint, CognitiveServicesCredentials(application.endpoint_key)
+        )
+        self._runtime.config.add_user_agent(LuisUtil.get_user_agent())
+        self._runtime.config.connection.timeout = timeout_seconds
+
+    def resolve(self, utterance: str, log: bool = True) -> RecognizerResult:
+        luis_result = self._runtime.prediction.resolve(
+            self.application.application_id, utterance, log=log
+        )
+        recognizer_result = RecognizerResult(
+            text=utterance,
+            altered_text=luis_result.altered_query,
+            intents=LuisUtil.get_intents(luis_result),
+            entities=LuisUtil.extract_entities_and_metadata(
+                luis_result.entities, luis_result.composite_entities, True
+            ),
+        )
+        LuisUtil.add_properties(luis_result, recognizer_result)
+        return recognizer_result
 
 
 class FlightBookingRecognizer(Recognizer):
+    # Turn state key holding the recognition deadline of the current turn.
+    DEADLINE_KEY = "FlightBookingRecognizer.deadline"
+
     def __init__(
-        self, configuration: DefaultConfig, telemetry_client: BotTelemetryClient = None
+        self,
+        configuration: DefaultConfig,
+        telemetry_client: BotTelemetryClient = None,
+        quota: RecognizerQuota = None,
     ):
         self._recognizer = None
+        # Global LUIS budget that hedges are charged to, see recognizer_quota.py
+        self.quota = quota
+        self._endpoints = []
+        self.telemetry_client = telemetry_client or NullTelemetryClient()
 
         luis_is_configured = (
             configuration.LUIS_APP_ID
@@ -34,16 +90,197 @@ class FlightBookingRecognizer(Recognizer):
             )
 
             options = LuisPredictionOptions()
-            options.telemetry_client = telemetry_client or NullTelemetryClient()
+            options.telemetry_client = self.telemetry_client
 
             self._recognizer = LuisRecognizer(
                 luis_application, prediction_options=options
             )
 
+            # No request outlives the turn's recognition budget by more than its own timeout.
+            timeout = (
+                configuration.CHANNEL_TIMEOUT_SECONDS
+                - configuration.RECOGNIZER_DEADLINE_MARGIN_SECONDS
+            )
+            self._endpoints.append(LuisEndpoint(luis_application, timeout))
+            if configuration.LUIS_API_HOST_NAME_SECONDARY:
+                # Same app published to a second region, only used for hedges.
+                self._endpoints.append(
+                    LuisEndpoint(
+                        LuisApplication(
+                            configuration.LUIS_APP_ID,
+                            configuration.LUIS_API_KEY,
+                            "https://" + configuration.LUIS_API_HOST_NAME_SECONDARY,
+                        ),
+                        timeout,
+                    )
+                )
+
+        self.turn_budget = (
+            configuration.CHANNEL_TIMEOUT_SECONDS - configuration.RECOGNIZER_DEADLINE_MARGIN_SECONDS
+        )
+        self.hedge_percentile = configuration.LUIS_HEDGE_PERCENTILE
+        self.hedge_initial_delay = configuration.LUIS_HEDGE_INITIAL_DELAY_MS / 1000
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        # Requests abandoned at the deadline keep their thread until their HTTP timeout;
+        # bounded, so that a slow endpoint cannot grow the pool without limit.
+        self.max_concurrent_calls = configuration.LUIS_MAX_CONCURRENT_CALLS
+        self._executor = self._new_executor()
+        # Recognitions using the executor; close() waits for them to finish
+        self._in_flight = 0
+        self._closed = False
+        self.stats = {
+            "calls": 0,
+            "hedged": 0,
+            "hedge_wins": 0,
+            "hedges_over_quota": 0,
+            "deadline_exceeded": 0,
+        }
+
     @property
     def is_configured(self) -> bool:
         # Returns true if luis is configured in the config.py and initialized.
         return self._recognizer is not None
 
-    async def recognize(self, turn_context: TurnContext) -> RecognizerResult:
-        return await self._recognizer.recognize(turn_context)
+    async def recognize(
+        self, turn_context: TurnContext, deadline: float = None
+    ) -> RecognizerResult:
+        """Recognize the turn's text before `deadline` (a time.monotonic() value).
+
+        Without an explicit deadline, the first recognition of a turn sets one
+        from the channel timeout and later recognitions of the same turn share it.
+        Raises asyncio.TimeoutError once the deadline passes.
+        """
+        activity = turn_context.activity
+        if activity.type != ActivityTypes.message:
+            return None
+        utterance = activity.text
+        if not utterance or utterance.isspace():
+            return RecognizerResult(
+                text=utterance, intents={"": IntentScore(score=1.0)}, entities={}
+            )
+
+        if deadline is None:
+            deadline = turn_context.turn_state.get(self.DEADLINE_KEY)
+            if deadline is None:
+                deadline = time.monotonic() + self.turn_budget
+                turn_context.turn_state[self.DEADLINE_KEY] = deadline
+
+        self._acquire_executor()
+        try:
+            recognizer_result = await self._recognize_hedged(utterance, deadline)
+        finally:
+            self._release_executor()
+        self._recognizer.on_recognizer_result(recognizer_result, turn_context)
+        return recognizer_result
+
+    async def warm_up(self):
+        """Open the HTTPS connection of every endpoint with an unlogged prediction."""
+        loop = asyncio.get_event_loop()
+        self._acquire_executor()
+        try:
+            await asyncio.gather(*(
+                loop.run_in_executor(self._executor, endpoint.resolve, "hello", False)
+                for endpoint in self._endpoints
+            ))
+        finally:
+            self._release_executor()
+
+    def close(self):
+        """Shut the LUIS threads down once the recognitions in flight have finished.
+
+        An evicted locale's recognizer is closed while turns may still be using it.
+        """
+        self._closed = True
+        self._shut_down_if_unused()
+
+    def _new_executor(self) -> ThreadPoolExecutor:
+        return ThreadPoolExecutor(max_workers=self.max_concurrent_calls, thread_name_prefix="luis")
+
+    def _acquire_executor(self):
+        self._in_flight += 1
+        if self._executor is None:
+            # A turn that got the recognizer before it was closed still recognizes;
+            # the threads are shut down again when it is done.
+            self._executor = self._new_executor()
+
+    def _release_executor(self):
+        self._in_flight -= 1
+        self._shut_down_if_unused()
+
+    def _shut_down_if_unused(self):
+        if self._closed and not self._in_flight and self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait for the first attempt before sending a hedge."""
+        if len(self._latencies) < MIN_LATENCY_SAMPLES:
+            return self.hedge_initial_delay
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100))
+        return ordered[index]
+
+    async def _recognize_hedged(self, utterance: str, deadline: float) -> RecognizerResult:
+        loop = asyncio.get_event_loop()
+        started = time.monotonic()
+        self.stats["calls"] += 1
+
+        primary = loop.run_in_executor(self._executor, self._endpoints[0].resolve, utterance)
+        attempts = [primary]
+        hedge = None
+        try:
+            # A hedge goes to the secondary endpoint, never again to the slow primary.
+            if self.hedge_percentile > 0 and len(self._endpoints) > 1:
+                delay = min(self.hedge_delay(), deadline - started)
+                done, _ = await asyncio.wait(attempts, timeout=max(delay, 0))
+                if not done and time.monotonic() < deadline and self._admit_hedge():
+                    endpoint = self._endpoints[-1]
+                    hedge = loop.run_in_executor(self._executor, endpoint.resolve, utterance)
+                    attempts.append(hedge)
+                    self.stats["hedged"] += 1
+
+            # First answer wins; a failed attempt only loses if another one is still pending.
+            pending = set(attempts)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=max(deadline - time.monotonic(), 0),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    self.stats["deadline_exceeded"] += 1
+                    self.telemetry_client.track_metric("RecognizerDeadlineExceeded", 1)
+                    raise asyncio.TimeoutError("recognition deadline exceeded")
+                for attempt in done:
+                    if attempt.exception() is not None:
+                        error = attempt.exception()
+                        continue
+                    self._report(started, hedge, winner=attempt)
+                    return attempt.result()
+            raise error
+        finally:
+            # The losing request still completes on its thread; its result is dropped.
+            for attempt in attempts:
+                attempt.cancel()
+
+    def _admit_hedge(self) -> bool:
+        if self.quota is None or self.quota.admit_hedge():
+            return True
+        self.stats["hedges_over_quota"] += 1
+        return False
+
+    def _report(self, started: float, hedge, winner):
+        latency = time.monotonic() - started
+        if winner is not hedge:
+            # Hedge answers are not representative of a single request latency.
+            self._latencies.append(latency)
+        self.telemetry_client.track_metric("RecognizerLatencyMs", latency * 1000)
+        if hedge is not None:
+            hedge_won = winner is hedge
+            if hedge_won:
+                self.stats["hedge_wins"] += 1
+            self.telemetry_client.track_metric("RecognizerHedgeWin", int(hedge_won))
+        self.telemetry_client.track_metric(
+            "RecognizerHedgeRate", self.stats["hedged"] / self.stats["calls"]
+        )
@@ -0,0 +1,206 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Fast JSON codec for inbound and outbound activities.
+
+msrest deserializes every key of the Activity schema reflectively, including
+the nested models the bot never reads. This codec uses the fastest JSON
+library available (orjson, then ujson, then the standard library) and a
+precompiled field table for what the adapter, the telemetry middleware and
+the dialogs actually read. The other fields of an inbound activity
+(timestamp, entities, attachments, relatesTo...) are decoded by msrest one
+by one, so the Activity is the one msrest builds; a body with a key outside
+of the schema is handed to msrest whole. Activities carrying anything
+outside the table on the way out fall back to msrest.
+"""
+
+import json
+from typing import Callable, Dict, Tuple
+
+from botbuilder import schema
+from botbuilder.schema import Activity, ChannelAccount, ConversationAccount
+from msrest.serialization import Deserializer
+
+try:
+    import orjson
+
+    JSON_LIBRARY = "orjson"
+
+    def loads(data):
+        return orjson.loads(data)
+
+    def dumps(obj) -> str:
+        return orjson.dumps(obj).decode("utf-8")
+
+except ImportError:
+    try:
+        import ujson
+
+        JSON_LIBRARY = "ujson"
+        loads = ujson.loads
+
+        def dumps(obj) -> str:
+            return ujson.dumps(obj, ensure_ascii=False)
+
+    except ImportError:
+        JSON_LIBRARY = "json"
+        loads = json.loads
+
+        def dumps(obj) -> str:
+            return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def _identity(value):
+    return value
+
+
+def _model_prototype(model_type) -> Dict[str, object]:
+    # Attribute dict of an empty model, copied for every new instance instead
+    # of running the generated __init__ with its ~40 keyword arguments.
+    return dict(model_type().__dict__)
+
+
+def _compile_model(model_type):
+    """Build a decoder and an encoder for a msrest model of scalar and object attributes.
+
+    Every attribute of the model's schema is copied as is; a body with a key
+    outside of it goes through msrest, which keeps it in additional_properties.
+    """
+    attribute_map = model_type._attribute_map  # pylint: disable=protected-access
+    prototype = _model_prototype(model_type)
+    new = model_type.__new__
+    keys = tuple((entry["key"], field) for field, entry in attribute_map.items())
+    known_keys = frozenset(key for key, _ in keys)
+
+    def decode(data: dict):
+        if data is None:
+            return None
+        if not known_keys.issuperset(data):
+            return model_type().deserialize(data)
+        instance = new(model_type)
+        state = dict(prototype)
+        for key, field in keys:
+            value = data.get(key)
+            if value is not None:
+                state[field] = value
+        instance.__dict__ = state
+        return instance
+
+    def encode(instance) -> dict:
+        state = instance.__dict__
+        data = {}
+        for key, field in keys:
+            value = state.get(field)
+            if value is not None:
+                data[key] = value
+        return data
+
+    return decode, encode
+
+
+_decode_account, _encode_account = _compile_model(ChannelAccount)
+_decode_conversation, _encode_conversation = _compile_model(ConversationAccount)
+
+
+def _decode_accounts(values):
+    if values is None:
+        return None
+    return [_decode_account(value) for value in values]
+
+
+def _encode_accounts(values):
+    return [_encode_account(value) for value in values]
+
+
+# (attribute, JSON key, decoder, encoder) for every Activity field the bot reads.
+# Scalars pass through untouched; channelData and value stay plain dicts as
+# msrest leaves them for "object" typed fields.
+ACTIVITY_FIELDS: Tuple[Tuple[str, str, Callable, Callable], ...] = (
+    ("type", "type", _identity, _identity),
+    ("id", "id", _identity, _identity),
+    ("service_url", "serviceUrl", _identity, _identity),
+    ("channel_id", "channelId", _identity, _identity),
+    ("from_property", "from", _decode_account, _encode_account),
+    ("conversation", "conversation", _decode_conversation, _encode_conversation),
+    ("recipient", "recipient", _decode_account, _encode_account),
+    ("text_format", "textFormat", _identity, _identity),
+    ("members_added", "membersAdded", _decode_accounts, _encode_accounts),
+    ("members_removed", "membersRemoved", _decode_accounts, _encode_accounts),
+    ("locale", "locale", _identity, _identity),
+    ("text", "text", _identity, _identity),
+    ("speak", "speak", _identity, _identity),
+    ("input_hint", "inputHint", _identity, _identity),
+    ("channel_data", "channelData", _identity, _identity),
+    ("action", "action", _identity, _identity),
+    ("reply_to_id", "replyToId", _identity, _identity),
+    ("label", "label", _identity, _identity),
+    ("value_type", "valueType", _identity, _identity),
+    ("value", "value", _identity, _identity),
+    ("name", "name", _identity, _identity),
+    ("delivery_mode", "deliveryMode", _identity, _identity),
+    ("caller_id", "callerId", _identity, _identity),
+)
+
+_ACTIVITY_PROTOTYPE = _model_prototype(Activity)
+_ENCODED_ATTRIBUTES = frozenset(field[0] for field in ACTIVITY_FIELDS) | {
+    "additional_properties"
+}
+_DECODED_KEYS = frozenset(field[1] for field in ACTIVITY_FIELDS)
+
+_MSREST = Deserializer(
+    {name: model for name, model in vars(schema).items() if isinstance(model, type)}
+)
+# JSON key -> (attribute, msrest type) of the Activity fields outside ACTIVITY_FIELDS
+_MSREST_FIELDS: Dict[str, Tuple[str, str]] = {
+    entry["key"]: (attribute, entry["type"])
+    for attribute, entry in Activity._attribute_map.items()  # pylint: disable=protected-access
+    if attribute not in _ENCODED_ATTRIBUTES
+}
+
+
+def deserialize_activity(body: dict) -> Activity:
+    """Build an Activity from a decoded JSON body, as msrest would."""
+    activity = Activity.__new__(Activity)
+    state = dict(_ACTIVITY_PROTOTYPE)
+    for field, key, decode, _ in ACTIVITY_FIELDS:
+        value = body.get(key)
+        if value is not None:
+            state[field] = decode(value)
+    for key, value in body.items():
+        if value is None or key in _DECODED_KEYS:
+            continue
+        other = _MSREST_FIELDS.get(key)
+        if other is None:
+            # Not in the schema: msrest keeps it in additional_properties.
+            return Activity().deserialize(body)
+        state[other[0]] = _MSREST.deserialize_data(value, other[1])
+    activity.__dict__ = state
+    return activity
+
+
+def serialize_activity(activity: Activity) -> dict:
+    """Serialize an Activity to a JSON-ready dict.
+
+    Outbound activities with attachments, entities, suggested actions or any
+    other field outside of ACTIVITY_FIELDS are handed to msrest unchanged.
+    """
+    state = activity.__dict__
+    for attribute, value in state.items():
+        if value and attribute not in _ENCODED_ATTRIBUTES:
+            return activity.serialize()
+
+    data = {}
+    for field, key, _, encode in ACTIVITY_FIELDS:
+        value = state.get(field)
+        if value is not None:
+            data[key] = encode(value)
+    return data
+
+
+def decode_activity(raw) -> Activity:
+    """Parse raw JSON text or bytes into an Activity."""
+    return deserialize_activity(loads(raw))
+
+
+def encode_activity(activity: Activity) -> str:
+    """Encode an Activity as JSON text."""
+    return dumps(serialize_activity(activity))
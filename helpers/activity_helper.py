@@ -32,7 +32,8 @@ def create_activity_reply(activity: Activity, text: str = None, locale: str = No
             name=activity.conversation.name,
         ),
         text=text or "",
-        locale=locale or "",
+        # Answer in the locale the user wrote in unless told otherwise
+        locale=locale or activity.locale or "",
         attachments=[],
         entities=[],
     )
@@ -6,6 +6,8 @@ from botbuilder.ai.luis import LuisRecognizer
 from botbuilder.core import IntentScore, TopIntent, TurnContext
 
 from booking_details import BookingDetails
+from money import budget_from_entities, default_rate_table
+from recognizer_quota import QuotaExceededError
 
 
 # class Intent(Enum):
@@ -78,10 +80,11 @@ class LuisHelper:
                     else:
                         result.unsupported_airports.append(from_entities[0]["text"].title())
 
-                budget_entities = recognizer_result.entities.get("budget", [])
-                if len(budget_entities) > 0:
-                    result.budget = budget_entities[0]
-                    print("found budget :", result.budget)
+                rates = default_rate_table()
+                money = budget_from_entities(recognizer_result.entities, rates.base_currency)
+                if money is not None:
+                    result.set_budget(money, rates)
+                    print("found budget :", money)
 
                 n_adults_entities = recognizer_result.entities.get("n_adults", [])
                 if len(n_adults_entities) > 0:
@@ -126,6 +129,9 @@ class LuisHelper:
                         print("found str_date:", result.str_date)
                         print("found end_date:", result.end_date)
                     
+        except QuotaExceededError:
+            # Rejected by a LUIS budget: the turn ends with the "quota.exceeded" reply.
+            raise
         except Exception as exception:
             print(exception)
             
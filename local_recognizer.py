@@ -0,0 +1,340 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""In-process recognizer trained from the exported LUIS model.
+
+It is deliberately simple: a multinomial naive Bayes intent classifier over
+hashed word unigrams and bigrams, a city gazetteer learned from the labelled
+`dst_city`/`or_city` spans, a few patterns for budget and passengers, and the
+Recognizers-Text date-time model for dates. It answers without a network call
+and returns a RecognizerResult shaped like the LUIS v2 one (top intent only,
+`$instance` metadata, `datetime` entities with timex values) so that
+LuisHelper and TextToLuisPrompt consume it unchanged.
+
+Concurrent turns can be recognized together, see recognition_batcher.py:
+predict_batch scores the intents of a whole batch at once (vectorized when
+NumPy is installed) and parses the dates of a repeated utterance once.
+"""
+
+import json
+import math
+import re
+import zlib
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+
+from recognizers_text import Culture
+from botbuilder.core import IntentScore, Recognizer, RecognizerResult, TurnContext
+
+from prompt_models import prompt_models
+from recognition_batcher import RecognitionBatcher
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+HASH_BUCKETS = 4096
+MAX_CITY_TOKENS = 3
+CITY_ENTITIES = ("dst_city", "or_city")
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+_MONEY = re.compile(
+    r"(?:[$€£]\s?\d[\d,.]*\d|\d(?:[\d,.]*\d)?\s?(?:[$€£]|(?:dollars?|euros?|pounds?|usd|eur|gbp|bucks)\b))",
+    re.IGNORECASE,
+)
+_NUMBER_WORDS = {
+    "no": 0, "zero": 0, "one": 1, "a": 1, "an": 1, "two": 2, "three": 3, "four": 4,
+    "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}
+_PASSENGERS = {
+    "n_adults": ("adult", "adults", "people", "persons", "passengers", "grown"),
+    "n_children": ("child", "children", "kid", "kids", "baby", "babies", "infant", "infants"),
+}
+
+
+def tokenize(text: str) -> List[Tuple[str, int, int]]:
+    """Lowercased word tokens with their [start, end) offsets in `text`."""
+    return [(match.group(), match.start(), match.end()) for match in _TOKEN.finditer(text.lower())]
+
+
+def hashed_features(tokens: List[str]) -> List[int]:
+    """Hashed unigram and bigram buckets. crc32 keeps them stable across processes."""
+    grams = tokens + [f"{left} {right}" for left, right in zip(tokens, tokens[1:])]
+    return [zlib.crc32(gram.encode("utf-8")) % HASH_BUCKETS for gram in grams]
+
+
+class LocalFlightBookingModel:
+    """Weights and vocabularies learned from a LUIS JSON export."""
+
+    def __init__(
+        self,
+        intents: List[str],
+        priors: List[float],
+        weights: List[List[float]],
+        cities: Dict[str, int],
+        city_cues: Dict[str, Dict[str, int]],
+        culture: str = Culture.English,
+    ):
+        self.intents = intents
+        self.priors = priors
+        # weights[intent][bucket] = log P(bucket | intent)
+        self.weights = weights
+        # Phrase (space separated lowercase tokens) -> labelled occurrences
+        self.cities = cities
+        # Word right before a city -> {entity: count}, e.g. "from" -> or_city
+        self.city_cues = city_cues
+        self.culture = culture
+        # All the weights as one intent-major buffer of doubles, when they are rows of
+        # a memory-mapped artifact (model_artifact.py): NumPy reads them in place.
+        self.weights_buffer = None
+        # Priors and weights (intents x buckets) as arrays, built on the first batch
+        # scored with NumPy
+        self._arrays = None
+        # Version of the compiled artifact it was loaded from, see model_artifact.py
+        self.version = None
+
+    @staticmethod
+    def normalize_intent(name: str) -> str:
+        # LUIS reports "Communication.Cancel" as "Communication_Cancel".
+        return name.replace(".", "_")
+
+    @classmethod
+    def from_luis_export(cls, path: str) -> "LocalFlightBookingModel":
+        with open(path, encoding="utf-8") as model_file:
+            export = json.load(model_file)
+
+        intents = [cls.normalize_intent(intent["name"]) for intent in export["intents"]]
+        index = {name: position for position, name in enumerate(intents)}
+        counts = [[1.0] * HASH_BUCKETS for _ in intents]
+        documents = [1.0] * len(intents)
+        labelled = Counter()
+        cues = defaultdict(Counter)
+
+        for utterance in export["utterances"]:
+            text = utterance["text"]
+            tokens = tokenize(text)
+            position = index[cls.normalize_intent(utterance["intent"])]
+            documents[position] += 1
+            for bucket in hashed_features([token for token, _, _ in tokens]):
+                counts[position][bucket] += 1
+
+            for entity in utterance.get("entities", []):
+                if entity["entity"] not in CITY_ENTITIES:
+                    continue
+                span = tokenize(text[entity["startPos"]:entity["endPos"] + 1])
+                if not span or len(span) > MAX_CITY_TOKENS:
+                    continue
+                labelled[" ".join(token for token, _, _ in span)] += 1
+                previous = [token for token, _, end in tokens if end <= entity["startPos"]]
+                if previous:
+                    cues[previous[-1]][entity["entity"]] += 1
+
+        # Keep phrases that are labelled as a city at least half of the time
+        # they appear, which drops words such as "there" or "home".
+        seen = Counter()
+        for utterance in export["utterances"]:
+            words = [token for token, _, _ in tokenize(utterance["text"])]
+            for size in range(1, MAX_CITY_TOKENS + 1):
+                for start in range(len(words) - size + 1):
+                    phrase = " ".join(words[start:start + size])
+                    if phrase in labelled:
+                        seen[phrase] += 1
+        cities = {
+            phrase: count for phrase, count in labelled.items() if count * 2 >= seen[phrase]
+        }
+
+        total = sum(documents)
+        priors = [math.log(count / total) for count in documents]
+        weights = []
+        for row in counts:
+            row_total = sum(row)
+            weights.append([math.log(count / row_total) for count in row])
+
+        return cls(
+            intents,
+            priors,
+            weights,
+            cities,
+            {cue: dict(entities) for cue, entities in cues.items()},
+            Culture.English if export.get("culture", "en-us").lower().startswith("en") else export["culture"],
+        )
+
+    @property
+    def datetime_model(self):
+        # Shared with the date-time prompts, see prompt_models.py
+        return prompt_models(self.culture).datetime
+
+    def warm_up(self):
+        """Build the date-time model (the slow part of the first predict) ahead of time."""
+        self.predict("Book a flight from Paris to London on May 5th for 2 adults")
+
+    def score_intents(self, tokens: List[str]) -> List[float]:
+        """Posterior probability of every intent."""
+        buckets = hashed_features(tokens)
+        logits = [
+            prior + sum(row[bucket] for bucket in buckets)
+            for prior, row in zip(self.priors, self.weights)
+        ]
+        top = max(logits)
+        exponentials = [math.exp(logit - top) for logit in logits]
+        total = sum(exponentials)
+        return [value / total for value in exponentials]
+
+    def score_intents_batch(self, token_lists: List[List[str]]) -> List[List[float]]:
+        """score_intents of every token list, vectorized over the batch with NumPy."""
+        if numpy is None or not token_lists:
+            return [self.score_intents(tokens) for tokens in token_lists]
+        if self._arrays is None:
+            if self.weights_buffer is not None:
+                # A view of the shared map, not a copy in every worker
+                weights = numpy.frombuffer(self.weights_buffer, dtype=numpy.float64).reshape(
+                    len(self.intents), HASH_BUCKETS
+                )
+            else:
+                weights = numpy.array(self.weights)
+            self._arrays = numpy.array(self.priors), weights
+        priors, weights = self._arrays
+        features = [hashed_features(tokens) for tokens in token_lists]
+        lengths = [len(buckets) for buckets in features]
+        buckets = numpy.fromiter(
+            (bucket for row in features for bucket in row), dtype=numpy.intp, count=sum(lengths)
+        )
+        rows = numpy.repeat(numpy.arange(len(features)), lengths)
+        # logits[row] = priors + the weights of every feature of utterance `row`
+        logits = numpy.tile(priors, (len(features), 1))
+        numpy.add.at(logits, rows, weights[:, buckets].T)
+        exponentials = numpy.exp(logits - logits.max(axis=1, keepdims=True))
+        return (exponentials / exponentials.sum(axis=1, keepdims=True)).tolist()
+
+    def predict(self, text: str) -> RecognizerResult:
+        return self.predict_batch([text])[0]
+
+    def predict_batch(self, texts: List[str]) -> List[RecognizerResult]:
+        texts = [text or "" for text in texts]
+        tokens = [tokenize(text) for text in texts]
+        scores = self.score_intents_batch([[token for token, _, _ in item] for item in tokens])
+        # Date parsing dominates; utterances repeated within the batch ("yes", a city) are parsed once.
+        dates = {text: self.datetime_model.parse(text) for text in set(texts)}
+        return [
+            self._result(text, item, row, dates[text]) for text, item, row in zip(texts, tokens, scores)
+        ]
+
+    def _result(self, text: str, tokens, scores: List[float], dates: list) -> RecognizerResult:
+        best = max(range(len(scores)), key=scores.__getitem__)
+
+        entities = {"$instance": {}}
+        self._add_cities(text, tokens, entities)
+        self._add_budget(text, entities)
+        self._add_passengers(text, tokens, entities)
+        self._add_dates(text, entities, dates)
+
+        return RecognizerResult(
+            text=text,
+            altered_text=None,
+            intents={self.intents[best]: IntentScore(scores[best])},
+            entities=entities,
+        )
+
+    @staticmethod
+    def _add_entity(entities: dict, name: str, value, text: str, start: int, end: int):
+        entities.setdefault(name, []).append(value)
+        entities["$instance"].setdefault(name, []).append(
+            {"startIndex": start, "endIndex": end, "text": text[start:end], "type": name, "score": 1.0}
+        )
+
+    def _add_cities(self, text: str, tokens, entities: dict):
+        position = 0
+        unassigned = list(CITY_ENTITIES)
+        while position < len(tokens):
+            for size in range(min(MAX_CITY_TOKENS, len(tokens) - position), 0, -1):
+                phrase = " ".join(token for token, _, _ in tokens[position:position + size])
+                if phrase in self.cities:
+                    break
+            else:
+                position += 1
+                continue
+
+            start, end = tokens[position][1], tokens[position + size - 1][2]
+            cue = self.city_cues.get(tokens[position - 1][0], {}) if position else {}
+            candidates = [name for name in unassigned if cue.get(name)]
+            role = max(candidates, key=cue.get) if candidates else (unassigned or [None])[0]
+            if role is not None:
+                unassigned.remove(role)
+                self._add_entity(entities, role, text[start:end], text, start, end)
+            self._add_entity(
+                entities, "geographyV2_city", {"value": text[start:end], "type": "city"}, text, start, end
+            )
+            position += size
+
+    def _add_budget(self, text: str, entities: dict):
+        match = _MONEY.search(text)
+        if match:
+            self._add_entity(entities, "budget", match.group(), text, match.start(), match.end())
+
+    def _add_passengers(self, text: str, tokens, entities: dict):
+        for index, (token, start, end) in enumerate(tokens):
+            if not (token.isdigit() or token in _NUMBER_WORDS):
+                continue
+            following = [word for word, _, _ in tokens[index + 1:index + 3]]
+            for name, nouns in _PASSENGERS.items():
+                if name not in entities and any(word in nouns for word in following):
+                    self._add_entity(entities, name, text[start:end], text, start, end)
+                    break
+
+    def _add_dates(self, text: str, entities: dict, dates: list):
+        # "1500$" also parses as a year range; amounts win over dates.
+        taken = [
+            (instance["startIndex"], instance["endIndex"])
+            for instance in entities["$instance"].get("budget", [])
+        ]
+        for result in dates:
+            values = (result.resolution or {}).get("values") or []
+            if not values or values[0].get("type") not in ("date", "daterange"):
+                continue
+            if any(start <= result.end and result.start < end for start, end in taken):
+                continue
+            value = {"type": values[0]["type"], "timex": [item["timex"] for item in values]}
+            self._add_entity(entities, "datetime", value, text, result.start, result.end + 1)
+
+
+class LocalFlightBookingRecognizer(Recognizer):
+    """Recognizer serving LocalFlightBookingModel predictions.
+
+    With a `batch_window_seconds`, the utterances of concurrent turns are
+    predicted together, see RecognitionBatcher.
+    """
+
+    def __init__(
+        self,
+        model: LocalFlightBookingModel,
+        batch_window_seconds: float = 0,
+        max_batch_size: int = 32,
+        executor_batch_size: int = 4,
+        telemetry_client=None,
+    ):
+        self.model = model
+        self.batcher = (
+            RecognitionBatcher(
+                # The model may be swapped meanwhile, see model_artifact.py.
+                lambda texts: self.model.predict_batch(texts),
+                window_seconds=batch_window_seconds,
+                max_batch_size=max_batch_size,
+                executor_batch_size=executor_batch_size,
+                telemetry_client=telemetry_client,
+            )
+            if batch_window_seconds
+            else None
+        )
+
+    @classmethod
+    def from_luis_export(cls, path: str, **kwargs) -> "LocalFlightBookingRecognizer":
+        return cls(LocalFlightBookingModel.from_luis_export(path), **kwargs)
+
+    @property
+    def is_configured(self) -> bool:
+        return True
+
+    async def recognize(self, turn_context: TurnContext) -> RecognizerResult:
+        if self.batcher is not None:
+            return await self.batcher.predict(turn_context.activity.text)
+        return self.model.predict(turn_context.activity.text)
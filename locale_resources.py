@@ -0,0 +1,173 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Per-locale resources: message catalogs and recognizers.
+
+The locale of a turn is `activity.locale`, matched against the locales that
+have resources: exactly (case-insensitively), then by language ("fr-CA" is
+served by "fr-FR"), else the default locale.
+
+LocaleCache loads the resource of a locale on first use and keeps at most
+`max_resident` of them, evicting the least recently used one and any that
+was not used for `idle_seconds`. The default locale is loaded up front and
+never evicted.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Generic, Iterable, List, TypeVar
+
+from botbuilder.core import (
+    BotTelemetryClient,
+    NullTelemetryClient,
+    Recognizer,
+    RecognizerResult,
+    TurnContext,
+)
+
+T = TypeVar("T")
+
+
+def resolve_locale(requested: str, available: Iterable[str], default: str) -> str:
+    """The available locale serving `requested`."""
+    if not requested:
+        return default
+    requested = requested.replace("_", "-").lower()
+    language = requested.split("-")[0]
+    by_language = None
+    for locale in available:
+        if locale.lower() == requested:
+            return locale
+        if by_language is None and locale.split("-")[0].lower() == language:
+            by_language = locale
+    return by_language or default
+
+
+class LocaleCache(Generic[T]):
+    def __init__(
+        self,
+        loader: Callable[[str], T],
+        default_locale: str,
+        max_resident: int = 4,
+        idle_seconds: float = 3600,
+        on_evict: Callable[[str, T], None] = None,
+        name: str = "",
+        telemetry_client: BotTelemetryClient = None,
+        clock=time.monotonic,
+    ):
+        self.loader = loader
+        self.default_locale = default_locale
+        self.max_resident = max_resident
+        self.idle_seconds = idle_seconds
+        self.on_evict = on_evict
+        self.name = name
+        self.telemetry_client = telemetry_client or NullTelemetryClient()
+        self._clock = clock
+        self.default = loader(default_locale)
+        # locale -> (resource, last use), least recently used first
+        self._resident: "OrderedDict[str, tuple]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Future] = {}
+
+    @property
+    def resident(self) -> List[str]:
+        return [self.default_locale] + list(self._resident)
+
+    def get(self, locale: str) -> T:
+        """The resource of `locale`, loaded on this thread if it is not resident."""
+        if locale == self.default_locale:
+            return self.default
+        resource = self._touch(locale)
+        if resource is None:
+            resource = self._add(locale, self.loader(locale))
+        return resource
+
+    async def get_async(self, locale: str) -> T:
+        """Like get(), but loads on the default executor. Concurrent loads of
+        the same locale share one load."""
+        if locale == self.default_locale:
+            return self.default
+        resource = self._touch(locale)
+        if resource is not None:
+            return resource
+        loading = self._loading.get(locale)
+        if loading is None:
+            loading = asyncio.ensure_future(self._load(locale))
+            self._loading[locale] = loading
+        return await asyncio.shield(loading)
+
+    async def _load(self, locale: str) -> T:
+        try:
+            resource = await asyncio.get_event_loop().run_in_executor(None, self.loader, locale)
+            return self._add(locale, resource)
+        finally:
+            del self._loading[locale]
+
+    def _touch(self, locale: str):
+        self.expire()
+        entry = self._resident.get(locale)
+        if entry is None:
+            return None
+        self._resident[locale] = (entry[0], self._clock())
+        self._resident.move_to_end(locale)
+        return entry[0]
+
+    def _add(self, locale: str, resource: T) -> T:
+        self._resident[locale] = (resource, self._clock())
+        self._resident.move_to_end(locale)
+        while len(self._resident) > max(self.max_resident - 1, 0):
+            self.evict(next(iter(self._resident)), "capacity")
+        self.telemetry_client.track_metric(
+            "ResidentLocales", len(self._resident) + 1, properties={"resource": self.name}
+        )
+        return resource
+
+    def expire(self):
+        """Evict the locales not used for `idle_seconds`."""
+        if not self.idle_seconds:
+            return
+        limit = self._clock() - self.idle_seconds
+        while self._resident:
+            locale, (_, last_used) = next(iter(self._resident.items()))
+            if last_used > limit:
+                break
+            self.evict(locale, "idle")
+
+    def evict(self, locale: str, reason: str = "explicit"):
+        entry = self._resident.pop(locale, None)
+        if entry is None:
+            return
+        self.telemetry_client.track_event(
+            "LocaleEvicted", properties={"resource": self.name, "locale": locale, "reason": reason}
+        )
+        if self.on_evict is not None:
+            self.on_evict(locale, entry[0])
+
+    def close(self):
+        """Evict every locale but the default one, whose owner closes it."""
+        for locale in list(self._resident):
+            self.evict(locale, "close")
+
+
+class LocaleRecognizer(Recognizer):
+    """Sends each turn to the recognizer of its locale."""
+
+    def __init__(self, recognizers: LocaleCache, locales: Iterable[str]):
+        self.recognizers = recognizers
+        # Locales with a recognizer of their own; the others use the default one.
+        self.locales = list(locales)
+
+    @property
+    def is_configured(self) -> bool:
+        return self.recognizers.default.is_configured
+
+    def locale_of(self, turn_context: TurnContext) -> str:
+        return resolve_locale(
+            turn_context.activity.locale, self.locales, self.recognizers.default_locale
+        )
+
+    async def recognize(self, turn_context: TurnContext) -> RecognizerResult:
+        recognizer = await self.recognizers.get_async(self.locale_of(turn_context))
+        return await recognizer.recognize(turn_context)
+
+    def close(self):
+        self.recognizers.close()
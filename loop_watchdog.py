@@ -0,0 +1,195 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Event loop lag and stall reports.
+
+Every conversation shares the aiohttp event loop, so synchronous work in a
+turn (reading a file, parsing JSON, printing, msrest deserialization)
+delays all the others. LoopWatchdog measures that delay in two ways:
+
+- Lag: a task sleeps `interval_seconds` over and over, and how late it wakes
+  up is the loop's lag. Lags are counted in a histogram (LAG_BUCKETS_MS)
+  served by /api/loop, and their p50, p99 and max are sent to telemetry
+  every `report_seconds` (EventLoopLagMs).
+- Stalls: a watcher thread checks when that task last woke up. When it is
+  more than `stall_seconds` late, one callback has held the loop thread for
+  that long, and the watcher captures the loop thread's stack. The stall is
+  attributed to the innermost frame of the bot's own code (a dialog step,
+  e.g. "dialogs/booking_dialog.py:confirm_step") and to the outermost one
+  (the handler, e.g. "app.py:messages"), then reported (EventLoopStall) and
+  kept for /api/loop. Its duration there is a lower bound: the lag sample
+  taken when the loop resumes has the full one.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from bisect import bisect_left
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+from aiohttp.web import Request, Response, json_response
+from botbuilder.core import BotTelemetryClient, NullTelemetryClient
+
+LAG_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+class LagHistogram:
+    def __init__(self, bounds: Tuple[float, ...] = LAG_BUCKETS_MS):
+        self.bounds = bounds
+        # counts[i]: samples <= bounds[i]; the last one counts the samples above every bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0
+        self.max_ms = 0.0
+
+    def add(self, lag_ms: float):
+        self.counts[bisect_left(self.bounds, lag_ms)] += 1
+        self.total += 1
+        self.max_ms = max(self.max_ms, lag_ms)
+
+    def percentile(self, percentile: float) -> float:
+        """Upper bound of the bucket holding the percentile (the max above the last bound)."""
+        if not self.total:
+            return 0.0
+        rank = percentile / 100 * self.total
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def to_dict(self) -> dict:
+        labels = [f"<={bound}" for bound in self.bounds] + [f">{self.bounds[-1]}"]
+        return {
+            "buckets_ms": dict(zip(labels, self.counts)),
+            "count": self.total,
+            "p50_ms": self.percentile(50),
+            "p99_ms": self.percentile(99),
+            "max_ms": self.max_ms,
+        }
+
+
+def attribute(stack: traceback.StackSummary, root: str = ROOT) -> Tuple[str, str]:
+    """(innermost, outermost) frame of the bot's own code in `stack`."""
+    own = [
+        f"{os.path.relpath(frame.filename, root)}:{frame.name}"
+        for frame in stack
+        if frame.filename.startswith(root) and "site-packages" not in frame.filename
+    ]
+    if not own:
+        return "", ""
+    return own[-1], own[0]
+
+
+class LoopWatchdog:
+    def __init__(
+        self,
+        interval_seconds: float = 0.1,
+        stall_seconds: float = 0.2,
+        report_seconds: float = 60,
+        telemetry_client: BotTelemetryClient = None,
+        max_stalls: int = 20,
+        root: str = ROOT,
+    ):
+        self.interval_seconds = interval_seconds
+        self.stall_seconds = stall_seconds
+        self.report_seconds = report_seconds
+        self.telemetry_client = telemetry_client or NullTelemetryClient()
+        self.root = root
+        # Lags since start, and since the last telemetry report
+        self.histogram = LagHistogram()
+        self._window = LagHistogram()
+        # Most recent stalls, newest last
+        self.stalls: Deque[dict] = deque(maxlen=max_stalls)
+        self._heartbeat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watcher: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    async def start(self):
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopping.clear()
+        self._task = asyncio.ensure_future(self._measure())
+        if self.stall_seconds:
+            self._watcher = threading.Thread(
+                target=self._watch, name="loop-watchdog", daemon=True
+            )
+            self._watcher.start()
+
+    async def stop(self):
+        self._stopping.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._watcher is not None:
+            self._watcher.join()
+        self.report()
+
+    async def _measure(self):
+        last_report = time.monotonic()
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval_seconds)
+            now = self._heartbeat = time.monotonic()
+            lag_ms = max(now - started - self.interval_seconds, 0.0) * 1000
+            self.histogram.add(lag_ms)
+            self._window.add(lag_ms)
+            if now - last_report >= self.report_seconds:
+                self.report()
+                last_report = now
+
+    def report(self):
+        """Send the lags since the last report to telemetry."""
+        window, self._window = self._window, LagHistogram()
+        if not window.total:
+            return
+        for statistic, value in (
+            ("p50", window.percentile(50)),
+            ("p99", window.percentile(99)),
+            ("max", window.max_ms),
+        ):
+            self.telemetry_client.track_metric(
+                "EventLoopLagMs", value, properties={"statistic": statistic}
+            )
+
+    def _watch(self):
+        reported = None
+        while not self._stopping.wait(self.stall_seconds / 2):
+            heartbeat = self._heartbeat
+            blocked = time.monotonic() - heartbeat - self.interval_seconds
+            if blocked < self.stall_seconds or heartbeat == reported:
+                continue
+            # One report per stall: the heartbeat only moves once the loop is free.
+            reported = heartbeat
+            frame = sys._current_frames().get(self._loop_thread)  # pylint: disable=protected-access
+            if frame is not None:
+                self._report_stall(traceback.extract_stack(frame), blocked)
+
+    def _report_stall(self, stack: traceback.StackSummary, blocked_seconds: float):
+        location, handler = attribute(stack, self.root)
+        stall = {
+            "blocked_ms": round(blocked_seconds * 1000, 1),
+            "location": location,
+            "handler": handler,
+            "stack": "".join(stack.format()),
+            "time": time.time(),
+        }
+        self.stalls.append(stall)
+        self.telemetry_client.track_event(
+            "EventLoopStall",
+            properties={key: str(value) for key, value in stall.items()},
+            measurements={"blocked_ms": stall["blocked_ms"]},
+        )
+
+    async def lag_handler(self, req: Request) -> Response:
+        stalls: List[dict] = [
+            {key: value for key, value in stall.items() if key != "stack"}
+            for stall in self.stalls
+        ]
+        return json_response({"lag": self.histogram.to_dict(), "stalls": stalls})
@@ -0,0 +1,266 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Compiled local model artifacts, memory-mapped and swapped without restart.
+
+    python -m model_artifact compile "cognitiveModels/Flight Booking Chatbot.json" artifacts/
+
+Training LocalFlightBookingModel from the LUIS export at startup takes
+about a third of a second per model, and every worker process would hold
+its own copy of the weights.
+`compile` trains it once and writes a binary artifact,
+`<name>.<version>.lfbm`, where the version is a hash of the content. Then it
+points `<name>.current` at that artifact. Both files are written to a
+temporary name and renamed, so readers never see a partial file.
+
+An artifact is a fixed header (_HEADER), the intent priors and the weight
+matrix as little-endian doubles, 8-byte aligned, and the vocabularies
+(intents, cities, city cues, culture) as JSON. load_artifact() maps the
+file read-only and serves the weight rows as memoryviews of the map. The
+workers of a machine then share one physical copy through the page cache,
+and loading only parses the small vocabularies. It checks the content
+against its version hash first: a truncated or damaged artifact raises
+ArtifactError, as does any artifact on a big-endian machine.
+
+ArtifactReloader loads the recognizers' artifacts, polls their
+`<name>.current` and, when one names a new version, loads it and swaps the
+recognizer's model. Turns in flight finish with the model they started
+with; the old map is released with its last reference. A version that
+fails to load is reported as LocalModelSwapFailed and the model in use is
+kept.
+"""
+
+import argparse
+import asyncio
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import weakref
+from hashlib import blake2b
+from typing import Optional
+
+from botbuilder.core import BotTelemetryClient, NullTelemetryClient
+
+from local_recognizer import HASH_BUCKETS, LocalFlightBookingModel, LocalFlightBookingRecognizer
+
+MAGIC = b"LFBM"
+FORMAT_VERSION = 1
+EXTENSION = ".lfbm"
+# magic, format, intents, buckets, vocabularies offset, vocabularies length, version
+_HEADER = struct.Struct("<4sIIIQQ16s")
+
+
+class ArtifactError(ValueError):
+    pass
+
+
+def _atomic_write(path: str, data: bytes):
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temporary = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(descriptor, "wb") as output:
+            output.write(data)
+            output.flush()
+            os.fsync(output.fileno())
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+def serialize(model: LocalFlightBookingModel) -> bytes:
+    vocabularies = json.dumps(
+        {
+            "intents": model.intents,
+            "cities": model.cities,
+            "city_cues": model.city_cues,
+            "culture": model.culture,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    ).encode("utf-8")
+    numbers = struct.pack(
+        f"<{len(model.priors) + len(model.intents) * HASH_BUCKETS}d",
+        *model.priors,
+        *(weight for row in model.weights for weight in row),
+    )
+    version = blake2b(numbers + vocabularies, digest_size=8).hexdigest().encode("ascii")
+    vocabularies_offset = _HEADER.size + len(numbers)
+    header = _HEADER.pack(
+        MAGIC,
+        FORMAT_VERSION,
+        len(model.intents),
+        HASH_BUCKETS,
+        vocabularies_offset,
+        len(vocabularies),
+        version,
+    )
+    return header + numbers + vocabularies
+
+
+def compile_artifact(model_path: str, directory: str, name: str = None) -> str:
+    """Train the model of a LUIS export into `directory` and make it current; returns its path."""
+    name = name or os.path.splitext(os.path.basename(model_path))[0]
+    return write_artifact(LocalFlightBookingModel.from_luis_export(model_path), directory, name)
+
+
+def write_artifact(model: LocalFlightBookingModel, directory: str, name: str) -> str:
+    """Write `model` as the current `name` artifact of `directory`; returns its path."""
+    data = serialize(model)
+    version = _HEADER.unpack_from(data)[6].decode("ascii")
+    os.makedirs(directory, exist_ok=True)
+    file_name = f"{name}.{version}{EXTENSION}"
+    path = os.path.join(directory, file_name)
+    if not os.path.exists(path):
+        _atomic_write(path, data)
+    _atomic_write(os.path.join(directory, f"{name}.current"), file_name.encode("utf-8"))
+    return path
+
+
+def current_artifact(directory: str, name: str) -> Optional[str]:
+    """Path of the artifact `<name>.current` points at, None if there is none."""
+    try:
+        with open(os.path.join(directory, f"{name}.current"), encoding="utf-8") as pointer:
+            return os.path.join(directory, pointer.read().strip())
+    except FileNotFoundError:
+        return None
+
+
+def load_artifact(path: str) -> LocalFlightBookingModel:
+    """Map the artifact at `path`; raises ArtifactError unless it is a complete, valid artifact."""
+    if sys.byteorder != "little":
+        # The weights are served as native doubles straight from the map.
+        raise ArtifactError(f"{path}: artifacts are little-endian, this machine is not")
+    with open(path, "rb") as artifact:
+        try:
+            mapped = mmap.mmap(artifact.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError as error:
+            raise ArtifactError(f"{path}: {error}") from error
+    if len(mapped) < _HEADER.size:
+        raise ArtifactError(f"{path}: truncated")
+    magic, format_version, intents, buckets, offset, length, version = _HEADER.unpack_from(mapped)
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        raise ArtifactError(f"{path}: not a format {FORMAT_VERSION} model artifact")
+    if buckets != HASH_BUCKETS:
+        raise ArtifactError(f"{path}: {buckets} buckets, expected {HASH_BUCKETS}")
+    numbers_size = (intents + intents * buckets) * 8
+    if offset != _HEADER.size + numbers_size or len(mapped) != offset + length:
+        raise ArtifactError(f"{path}: truncated, or sections of the wrong size")
+    # The version is the hash of the content: a file damaged in place does not match it.
+    content = memoryview(mapped)[_HEADER.size:]
+    if blake2b(content, digest_size=8).hexdigest().encode("ascii") != version:
+        raise ArtifactError(f"{path}: content does not match version {version!r}")
+
+    numbers = content[:offset - _HEADER.size].cast("d")
+    rows = [numbers[intents + row * buckets:intents + (row + 1) * buckets] for row in range(intents)]
+    try:
+        vocabularies = json.loads(bytes(mapped[offset:offset + length]))
+        for key, kind in (
+            ("intents", list), ("cities", dict), ("city_cues", dict), ("culture", str)
+        ):
+            if not isinstance(vocabularies[key], kind):
+                raise TypeError(f"{key} is not a {kind.__name__}")
+        if len(vocabularies["intents"]) != intents:
+            raise ValueError(f"{len(vocabularies['intents'])} intents, {intents} weight rows")
+        model = LocalFlightBookingModel(
+            vocabularies["intents"],
+            list(numbers[:intents]),
+            rows,
+            vocabularies["cities"],
+            vocabularies["city_cues"],
+            vocabularies["culture"],
+        )
+    except (KeyError, TypeError, ValueError) as error:
+        # JSONDecodeError and UnicodeDecodeError are ValueErrors.
+        raise ArtifactError(f"{path}: invalid vocabularies: {error!r}") from error
+    model.weights_buffer = numbers[intents:]
+    model.version = version.decode("ascii")
+    return model
+
+
+class ArtifactReloader:
+    """Swaps the model of each added recognizer when its `<name>.current` names a new artifact."""
+
+    def __init__(
+        self,
+        directory: str,
+        interval_seconds: float = 30,
+        telemetry_client: BotTelemetryClient = None,
+    ):
+        self.directory = directory
+        self.interval_seconds = interval_seconds
+        self.telemetry_client = telemetry_client or NullTelemetryClient()
+        # Recognizer -> [artifact name, path of its model]; evicted recognizers drop out.
+        self._watched = weakref.WeakKeyDictionary()
+        self._task = None
+
+    def load(self, model_path: str, **kwargs) -> LocalFlightBookingRecognizer:
+        """A recognizer of the current artifact of `model_path`, compiled first if there is none.
+
+        `kwargs` are passed to LocalFlightBookingRecognizer.
+        """
+        name = os.path.splitext(os.path.basename(model_path))[0]
+        path = current_artifact(self.directory, name) or compile_artifact(
+            model_path, self.directory, name
+        )
+        recognizer = LocalFlightBookingRecognizer(load_artifact(path), **kwargs)
+        self.add(recognizer, name, path)
+        return recognizer
+
+    def add(self, recognizer: LocalFlightBookingRecognizer, name: str, path: str = None):
+        self._watched[recognizer] = [name, path]
+
+    def check(self) -> int:
+        """Load the artifacts that changed; returns how many models were swapped."""
+        swapped = 0
+        for recognizer, watched in list(self._watched.items()):
+            name, loaded = watched
+            path = current_artifact(self.directory, name)
+            if path is None or path == loaded:
+                continue
+            model = load_artifact(path)
+            # One attribute assignment: a prediction uses either model, never a mix.
+            recognizer.model = model
+            watched[1] = path
+            swapped += 1
+            self.telemetry_client.track_event(
+                "LocalModelSwapped", properties={"name": name, "version": model.version}
+            )
+        return swapped
+
+    async def start(self):
+        self._task = asyncio.ensure_future(self._poll())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                self.check()
+            except Exception as error:  # pylint: disable=broad-except
+                # Keep the models in use and polling; the next poll tries again.
+                self.telemetry_client.track_event(
+                    "LocalModelSwapFailed", properties={"error": repr(error)}
+                )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    compile_parser = commands.add_parser("compile", help="train a LUIS export into an artifact")
+    compile_parser.add_argument("model", help="LUIS JSON export")
+    compile_parser.add_argument("directory")
+    compile_parser.add_argument("--name", help="artifact name, the export's file name by default")
+    args = parser.parse_args(argv)
+    print(compile_artifact(args.model, args.directory, args.name))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
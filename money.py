@@ -0,0 +1,269 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Budget amounts: parsing, currency normalization and conversion.
+
+parse_money() reads amounts such as "800$", "800 dollars", "€1,500",
+"1.500,50 EUR" or "2k usd" with a single compiled regular expression; it
+does not call the Recognizers-Text number-with-unit model, which is two to
+three orders of magnitude slower. from_luis_money() reads LUIS' prebuilt
+`money` entity ({"number": 800, "units": "Dollar"}) instead when the
+recognizer returned one.
+
+RateTable converts amounts to the base currency. Its rates are read from a
+local JSON file ({"base": "EUR", "updated": <epoch seconds>, "rates":
+{"USD": 1.08, ...}}, 1 base = rate units); when a rates URL is configured
+they are refreshed from it once they are older than `max_age_seconds`, and
+the refreshed table is written to the cache file for the next start.
+RateRefresher checks the table every `interval_seconds` and refreshes it on
+the default executor when it is stale, so a long-running worker does not
+keep converting with old rates.
+"""
+
+import asyncio
+import json
+import os
+import re
+import time
+import urllib.request
+from functools import lru_cache
+from typing import Dict, NamedTuple, Optional
+
+from botbuilder.core import BotTelemetryClient, NullTelemetryClient
+
+from config import DefaultConfig
+
+_SYMBOLS = {"$": "USD", "€": "EUR", "£": "GBP", "¥": "JPY"}
+_WORDS = {
+    "usd": "USD", "dollar": "USD", "dollars": "USD", "buck": "USD", "bucks": "USD",
+    "eur": "EUR", "euro": "EUR", "euros": "EUR",
+    "gbp": "GBP", "pound": "GBP", "pounds": "GBP", "quid": "GBP",
+    "jpy": "JPY", "yen": "JPY",
+    "chf": "CHF", "franc": "CHF", "francs": "CHF",
+    "cad": "CAD", "aud": "AUD",
+}
+# LUIS `money` entity units
+_LUIS_UNITS = {
+    "dollar": "USD", "united states dollar": "USD", "euro": "EUR", "pound": "GBP",
+    "british pound": "GBP", "pound sterling": "GBP", "japanese yen": "JPY", "yen": "JPY",
+    "swiss franc": "CHF", "canadian dollar": "CAD", "australian dollar": "AUD",
+}
+_MULTIPLIERS = {"k": 1000, "thousand": 1000, "grand": 1000}
+
+_NUMBER = r"\d{1,3}(?:[,. ]\d{3})+(?:[.,]\d{1,2})?|\d+(?:[.,]\d{1,2})?"
+_SYMBOL = "|".join(re.escape(symbol) for symbol in _SYMBOLS)
+_WORD = "|".join(sorted(_WORDS, key=len, reverse=True))
+_MULTIPLIER = r"(?:\s?(?P<{}>k|thousand|grand)\b)?"
+MONEY_PATTERN = re.compile(
+    rf"(?:(?P<prefix_symbol>{_SYMBOL})\s?|\b(?P<prefix_word>usd|eur|gbp|chf|cad|aud|jpy)\s?)"
+    rf"(?P<prefixed>{_NUMBER}){_MULTIPLIER.format('prefixed_multiplier')}"
+    rf"|(?<![\d.,])(?P<number>{_NUMBER}){_MULTIPLIER.format('multiplier')}"
+    rf"(?:\s?(?P<symbol>{_SYMBOL})|\s?(?P<word>{_WORD})\b)?",
+    re.IGNORECASE,
+)
+
+
+class Money(NamedTuple):
+    amount: float
+    currency: str
+
+    def __str__(self) -> str:
+        return f"{self.amount:,.2f}".rstrip("0").rstrip(".") + f" {self.currency}"
+
+
+def parse_number(text: str) -> float:
+    """'1,500' -> 1500, '1.500,50' -> 1500.5, '12.5' -> 12.5, '1 500' -> 1500."""
+    text = text.replace(" ", "")
+    if "," in text and "." in text:
+        decimal = "," if text.rfind(",") > text.rfind(".") else "."
+        grouping = "." if decimal == "," else ","
+    elif "," in text or "." in text:
+        separator = "," if "," in text else "."
+        # A single separator followed by exactly three digits groups thousands.
+        if len(text) - text.rfind(separator) - 1 == 3:
+            decimal, grouping = None, separator
+        else:
+            decimal, grouping = separator, None
+    else:
+        return float(text)
+    if grouping:
+        text = text.replace(grouping, "")
+    return float(text.replace(decimal, ".") if decimal else text)
+
+
+def parse_money(text: str, default_currency: str = None) -> Optional[Money]:
+    """The first amount in `text` with a currency, else the first bare amount
+    in `default_currency` (None when that is not given)."""
+    bare = None
+    for match in MONEY_PATTERN.finditer(text or ""):
+        groups = match.groupdict()
+        if groups["prefixed"] is not None:
+            number, multiplier = groups["prefixed"], groups["prefixed_multiplier"]
+            currency = (
+                _SYMBOLS[groups["prefix_symbol"]]
+                if groups["prefix_symbol"]
+                else _WORDS[groups["prefix_word"].lower()]
+            )
+        else:
+            number, multiplier = groups["number"], groups["multiplier"]
+            currency = None
+            if groups["symbol"]:
+                currency = _SYMBOLS[groups["symbol"]]
+            elif groups["word"]:
+                currency = _WORDS[groups["word"].lower()]
+        amount = parse_number(number) * _MULTIPLIERS.get((multiplier or "").lower(), 1)
+        if currency is not None:
+            return Money(amount, currency)
+        if bare is None:
+            bare = amount
+    if bare is not None and default_currency:
+        return Money(bare, default_currency)
+    return None
+
+
+def from_luis_money(entity: dict) -> Optional[Money]:
+    """Money from LUIS' prebuilt `money` entity value."""
+    if not isinstance(entity, dict) or entity.get("number") is None:
+        return None
+    currency = _LUIS_UNITS.get(str(entity.get("units", "")).lower())
+    return Money(float(entity["number"]), currency) if currency else None
+
+
+class RateTable:
+    def __init__(
+        self,
+        base_currency: str,
+        rates: Dict[str, float],
+        updated: float = 0.0,
+        cache_path: str = None,
+        url: str = "",
+        max_age_seconds: float = 86400,
+        clock=time.time,
+    ):
+        self.base_currency = base_currency
+        self.rates = dict(rates)
+        self.rates[base_currency] = 1.0
+        self.updated = updated
+        self.cache_path = cache_path
+        self.url = url
+        self.max_age_seconds = max_age_seconds
+        self._clock = clock
+
+    @classmethod
+    def load(cls, path: str, cache_path: str = None, **kwargs) -> "RateTable":
+        """The newer of the bundled table at `path` and the refreshed one at `cache_path`."""
+        tables = []
+        for candidate in (path, cache_path):
+            if candidate and os.path.exists(candidate):
+                with open(candidate, encoding="utf-8") as rates_file:
+                    tables.append(json.load(rates_file))
+        table = max(tables, key=lambda item: item.get("updated", 0))
+        return cls(
+            table["base"], table["rates"], table.get("updated", 0), cache_path, **kwargs
+        )
+
+    @property
+    def is_stale(self) -> bool:
+        return bool(self.url) and self._clock() - self.updated > self.max_age_seconds
+
+    def to_base(self, money: Money) -> Optional[float]:
+        """`money` in the base currency, None for a currency without a rate."""
+        rate = self.rates.get(money.currency)
+        return round(money.amount / rate, 2) if rate else None
+
+    def refresh(self):
+        """Blocking: fetch the rates from `url` and cache them to `cache_path`."""
+        with urllib.request.urlopen(self.url, timeout=10) as response:
+            table = json.load(response)
+        base = table.get("base", self.base_currency)
+        rates = {code: float(rate) for code, rate in table["rates"].items()}
+        rates.setdefault(base, 1.0)
+        if base != self.base_currency:
+            # Rebase: 1 base = rates[code] / rates[own base] units.
+            rates = {code: rate / rates[self.base_currency] for code, rate in rates.items()}
+        self.rates = {**rates, self.base_currency: 1.0}
+        self.updated = self._clock()
+        if self.cache_path:
+            temporary = self.cache_path + ".tmp"
+            with open(temporary, "w", encoding="utf-8") as cache_file:
+                json.dump(
+                    {"base": self.base_currency, "updated": self.updated, "rates": self.rates},
+                    cache_file,
+                )
+            os.replace(temporary, self.cache_path)
+
+
+class RateRefresher:
+    """Refreshes a RateTable in the background once it is stale."""
+
+    def __init__(
+        self,
+        rates: RateTable,
+        interval_seconds: float = 3600,
+        telemetry_client: BotTelemetryClient = None,
+    ):
+        self.rates = rates
+        self.interval_seconds = interval_seconds
+        self.telemetry_client = telemetry_client or NullTelemetryClient()
+        self._task = None
+
+    async def check(self) -> bool:
+        """Refresh the rates if they are stale; returns whether they were refreshed."""
+        if not self.rates.is_stale:
+            return False
+        await asyncio.get_event_loop().run_in_executor(None, self.rates.refresh)
+        self.telemetry_client.track_event(
+            "CurrencyRatesRefreshed", properties={"base": self.rates.base_currency}
+        )
+        return True
+
+    async def start(self):
+        self._task = asyncio.ensure_future(self._poll())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.check()
+            except Exception as error:  # pylint: disable=broad-except
+                # Keep converting with the current rates; the next check tries again.
+                self.telemetry_client.track_event(
+                    "CurrencyRatesRefreshFailed", properties={"error": repr(error)}
+                )
+
+
+def budget_from_entities(entities: dict, default_currency: str) -> Optional[Money]:
+    """The budget in a RecognizerResult's entities.
+
+    LUIS' `money` entity wins when it overlaps the `budget` span (or when
+    there is no span); otherwise the span's text is parsed, a bare amount
+    being in `default_currency`.
+    """
+    instances = entities.get("$instance", {})
+    budget_spans = instances.get("budget", [])
+    span = budget_spans[0] if budget_spans else None
+    for value, instance in zip(entities.get("money", []), instances.get("money", [])):
+        if span is None or (
+            instance["startIndex"] < span["endIndex"] and span["startIndex"] < instance["endIndex"]
+        ):
+            money = from_luis_money(value)
+            if money is not None:
+                return money
+    if span is not None:
+        return parse_money(span["text"], default_currency)
+    return None
+
+
+@lru_cache(maxsize=None)
+def default_rate_table() -> RateTable:
+    # Loaded on first use; the app refreshes it in the background, see app.py.
+    return RateTable.load(
+        DefaultConfig.CURRENCY_RATES_PATH,
+        DefaultConfig.CURRENCY_RATES_CACHE_PATH,
+        url=DefaultConfig.CURRENCY_RATES_URL,
+        max_age_seconds=DefaultConfig.CURRENCY_RATES_MAX_AGE_SECONDS,
+    )
@@ -0,0 +1,125 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Micro-batching of in-process recognition across concurrent turns.
+
+Every turn that recognizes an utterance locally (MainDialog.act_step,
+TextToLuisPrompt.on_recognize) would score it on its own. RecognitionBatcher
+collects the utterances submitted within `window_seconds` of the first one,
+or until `max_batch_size` are waiting, predicts them with one call of
+`predict_batch` and hands every caller its own result.
+
+Batching amortizes the per-call work (intent scoring vectorized over the
+batch, dates of repeated utterances parsed once, see
+LocalFlightBookingModel.predict_batch), at the cost of up to one window of
+added latency. A small batch runs on the event loop like a single
+prediction would; one of `executor_batch_size` utterances or more runs in
+the loop's default executor, so that the other turns are not stalled
+while it is predicted (date parsing takes milliseconds per utterance).
+Each batch is reported as LocalRecognitionBatchSize and
+LocalRecognitionThroughput (utterances per second of prediction).
+"""
+
+import asyncio
+import time
+from collections import Counter
+from typing import Callable, List, Optional, Set, Tuple, Union
+
+from botbuilder.core import BotTelemetryClient, NullTelemetryClient, RecognizerResult
+
+
+class RecognitionBatcher:
+    def __init__(
+        self,
+        predict_batch: Callable[[List[str]], List[RecognizerResult]],
+        window_seconds: float = 0.002,
+        max_batch_size: int = 32,
+        executor_batch_size: int = 4,
+        telemetry_client: BotTelemetryClient = None,
+    ):
+        if window_seconds <= 0 or max_batch_size < 1:
+            raise ValueError("The window must be > 0 and the batch size >= 1")
+        self.predict_batch = predict_batch
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self.executor_batch_size = executor_batch_size
+        self.telemetry_client = telemetry_client or NullTelemetryClient()
+        # Batch size -> batches of that size
+        self.sizes: Counter = Counter()
+        self.predicted = 0
+        self.predict_seconds = 0.0
+        self._waiting: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Batches being predicted in the executor
+        self._running: Set[asyncio.Task] = set()
+
+    @property
+    def throughput(self) -> float:
+        """Utterances predicted per second spent predicting."""
+        return self.predicted / self.predict_seconds if self.predict_seconds else 0.0
+
+    async def predict(self, text: str) -> RecognizerResult:
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        self._waiting.append((text, future))
+        if len(self._waiting) >= self.max_batch_size:
+            self._run_batch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_seconds, self._run_batch)
+        return await future
+
+    def _run_batch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._waiting = self._waiting, []
+        if not batch:
+            return
+        if len(batch) >= self.executor_batch_size:
+            task = asyncio.ensure_future(self._run_in_executor(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+            return
+        try:
+            outcome = self._timed_predict(batch)
+        except Exception as error:  # pylint: disable=broad-except
+            outcome = error
+        self._complete(batch, outcome)
+
+    async def _run_in_executor(self, batch: List[Tuple[str, asyncio.Future]]):
+        try:
+            outcome = await asyncio.get_event_loop().run_in_executor(
+                None, self._timed_predict, batch
+            )
+        except Exception as error:  # pylint: disable=broad-except
+            outcome = error
+        self._complete(batch, outcome)
+
+    def _timed_predict(
+        self, batch: List[Tuple[str, asyncio.Future]]
+    ) -> Tuple[List[RecognizerResult], float]:
+        started = time.perf_counter()
+        results = self.predict_batch([text for text, _ in batch])
+        return results, time.perf_counter() - started
+
+    def _complete(
+        self,
+        batch: List[Tuple[str, asyncio.Future]],
+        outcome: Union[Tuple[List[RecognizerResult], float], Exception],
+    ):
+        if isinstance(outcome, Exception):
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(outcome)
+            return
+        results, elapsed = outcome
+        for (_, future), result in zip(batch, results):
+            # A caller cancelled meanwhile (its turn timed out) no longer waits.
+            if not future.done():
+                future.set_result(result)
+
+        self.sizes[len(batch)] += 1
+        self.predicted += len(batch)
+        self.predict_seconds += elapsed
+        self.telemetry_client.track_metric("LocalRecognitionBatchSize", len(batch))
+        if elapsed:
+            self.telemetry_client.track_metric("LocalRecognitionThroughput", len(batch) / elapsed)
@@ -0,0 +1,332 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Reuse of LUIS results for near-duplicate utterances.
+
+Much of the traffic repeats earlier utterances with small variations: case,
+punctuation, emoji (":disappointed: ok one last try how about milan"), a
+typo. NearDuplicateRecognizer keeps the most recent `capacity` results of
+the recognizer it wraps. An utterance whose embedding is close enough
+(cosine >= `threshold`) to a cached one gets a copy of that result instead
+of a LUIS call, provided its entities can be re-projected onto the new text:
+
+- an utterance is normalized (casefolded, emoji shortcodes and punctuation
+  dropped, whitespace collapsed) then embedded as its hashed character
+  trigrams, a sparse unit vector;
+- the index is a SimHash (random hyperplanes over the hashed features) cut
+  into SIGNATURE_BANDS bands: the cached utterances sharing the most bands
+  with the new one are its candidates, ranked by exact cosine;
+- the result is reused only if the new text has the cached text's words in
+  the same order, except for typos: a word one edit away from the cached
+  word at its place, without digits. Any other new word could be a new
+  entity (a date, an amount, a number of passengers) that the cached result
+  misses, and words in another order could give a span another role
+  ("from Paris to London" is not "from London to Paris"). Every entity span
+  of the cached text must also occur in the new text as often as in the
+  cached text. The copy gets the new text and its entity spans moved to
+  their place in it.
+
+Results with `datetime` entities are not cached: LUIS resolves relative
+dates ("tomorrow", "next friday") against the day of the call, so a cached
+"book a flight for tomorrow" would be a day off after midnight.
+
+Hits, near hits, misses and rejected candidates are counted in `stats` and
+reported as RecognizerCacheHit (1 or 0 per recognition).
+"""
+
+import copy
+import re
+import zlib
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from hashlib import blake2b
+from typing import Dict, List, Optional, Tuple
+
+from botbuilder.core import (
+    BotTelemetryClient,
+    NullTelemetryClient,
+    Recognizer,
+    RecognizerResult,
+    TurnContext,
+)
+from botbuilder.schema import ActivityTypes
+
+EMBEDDING_BUCKETS = 1 << 16
+SIGNATURE_BANDS = 8
+BAND_BITS = 64 // SIGNATURE_BANDS
+MAX_CANDIDATES = 32
+# Wide enough for the sum of the integer weights of an utterance's features
+LANE_BITS = 32
+
+_SHORTCODE = re.compile(r":[a-z0-9_+-]+:")
+_WORD = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    text = _SHORTCODE.sub(" ", (text or "").casefold())
+    return " ".join(_WORD.findall(text))
+
+
+def embed(normalized: str) -> Dict[int, float]:
+    """Hashed character trigrams of `normalized`, as a sparse unit vector."""
+    padded = f" {normalized} "
+    grams = [padded[index:index + 3] for index in range(len(padded) - 2)]
+    vector: Dict[int, float] = {}
+    for gram in grams:
+        bucket = zlib.crc32(gram.encode("utf-8")) % EMBEDDING_BUCKETS
+        vector[bucket] = vector.get(bucket, 0.0) + 1.0
+    norm = sum(value * value for value in vector.values()) ** 0.5
+    return {bucket: value / norm for bucket, value in vector.items()} if norm else {}
+
+
+def cosine(left: Dict[int, float], right: Dict[int, float]) -> float:
+    if len(left) > len(right):
+        left, right = right, left
+    return sum(value * right.get(bucket, 0.0) for bucket, value in left.items())
+
+
+@lru_cache(maxsize=8192)
+def _hyperplanes(bucket: int) -> int:
+    """The bucket's side of 64 random hyperplanes: lane i (LANE_BITS wide) is 1 on the positive side."""
+    bits = int.from_bytes(blake2b(bucket.to_bytes(4, "little"), digest_size=8).digest(), "little")
+    return sum(1 << (bit * LANE_BITS) for bit in range(64) if bits >> bit & 1)
+
+
+def signature(vector: Dict[int, float]) -> int:
+    """SimHash of `vector`: bit i is the sign of its projection on hyperplane i."""
+    # The 64 projections are summed at once, one per lane of a big integer.
+    positive = total = 0
+    for bucket, value in vector.items():
+        weight = round(value * 1024)
+        positive += weight * _hyperplanes(bucket)
+        total += weight
+    mask = (1 << LANE_BITS) - 1
+    return sum(1 << bit for bit in range(64) if 2 * (positive >> (bit * LANE_BITS) & mask) > total)
+
+
+def bands(sig: int) -> List[Tuple[int, int]]:
+    mask = (1 << BAND_BITS) - 1
+    return [(band, sig >> (band * BAND_BITS) & mask) for band in range(SIGNATURE_BANDS)]
+
+
+def _occurrences(text: str, span: str) -> List[int]:
+    """Starts of `span` in `text`, case-insensitive and on word boundaries."""
+    pattern = re.compile(r"(?<!\w)" + re.escape(span) + r"(?!\w)", re.IGNORECASE)
+    return [match.start() for match in pattern.finditer(text)]
+
+
+def one_edit_apart(left: str, right: str) -> bool:
+    """Whether a substitution, insertion, deletion or transposition turns `left` into `right`."""
+    if len(left) > len(right):
+        left, right = right, left
+    if len(right) - len(left) > 1:
+        return False
+    for index, (first, second) in enumerate(zip(left, right)):
+        if first == second:
+            continue
+        if len(left) < len(right):
+            return left[index:] == right[index + 1:]
+        swapped = left[index + 1:index + 2] + left[index] + left[index + 2:]
+        return left[index + 1:] == right[index + 1:] or swapped == right[index:]
+    return True
+
+
+def reproject(result: RecognizerResult, text: str) -> Optional[RecognizerResult]:
+    """A copy of `result` for `text`, None if an entity span cannot be placed in it."""
+    source = result.text or ""
+
+    def move(instances: dict) -> bool:
+        for spans in instances.values():
+            for span in spans:
+                if "startIndex" not in span:
+                    continue
+                start, end = span["startIndex"], span["endIndex"]
+                old = _occurrences(source, source[start:end])
+                new = _occurrences(text, source[start:end])
+                if len(old) != len(new) or start not in old:
+                    return False
+                span["startIndex"] = new[old.index(start)]
+                span["endIndex"] = span["startIndex"] + end - start
+                span["text"] = text[span["startIndex"]:span["endIndex"]]
+        return True
+
+    def walk(node) -> bool:
+        # Composite entities hold their own "$instance" metadata.
+        if isinstance(node, list):
+            return all(walk(item) for item in node)
+        if not isinstance(node, dict):
+            return True
+        return all(
+            move(value) if key == "$instance" else walk(value) for key, value in node.items()
+        )
+
+    entities = copy.deepcopy(result.entities or {})
+    if not walk(entities):
+        return None
+    return RecognizerResult(
+        text=text,
+        altered_text=None,
+        intents=copy.deepcopy(result.intents),
+        entities=entities,
+        properties=copy.deepcopy(result.properties),
+    )
+
+
+class _Entry:
+    __slots__ = ("normalized", "vector", "signature", "result")
+
+    def __init__(self, normalized: str, vector: Dict[int, float], result: RecognizerResult):
+        self.normalized = normalized
+        self.vector = vector
+        self.signature = signature(vector)
+        self.result = result
+
+    @classmethod
+    def of(cls, normalized: str) -> "_Entry":
+        """An entry to look up, without result yet."""
+        return cls(normalized, embed(normalized), None)
+
+
+class NearDuplicateIndex:
+    """The `capacity` most recently used results, by normalized text and by SimHash band."""
+
+    def __init__(self, capacity: int = 4096):
+        self.capacity = capacity
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        # (band, band value) -> normalized texts
+        self._bands: Dict[Tuple[int, int], set] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, normalized: str) -> Optional[_Entry]:
+        entry = self._entries.get(normalized)
+        if entry is not None:
+            self._entries.move_to_end(normalized)
+        return entry
+
+    def nearest(self, probe: _Entry) -> List[Tuple[float, _Entry]]:
+        """(similarity, entry) of the cached utterances most likely near `probe`, most similar first.
+
+        Only the MAX_CANDIDATES utterances sharing the most bands with it are compared.
+        """
+        shared = Counter()
+        for band in bands(probe.signature):
+            shared.update(self._bands.get(band, ()))
+        ranked = sorted(
+            (
+                (cosine(probe.vector, self._entries[key].vector), key)
+                for key, _ in shared.most_common(MAX_CANDIDATES)
+            ),
+            reverse=True,
+        )
+        return [(similarity, self._entries[key]) for similarity, key in ranked]
+
+    def put(self, entry: _Entry):
+        self._remove(entry.normalized)
+        self._entries[entry.normalized] = entry
+        for band in bands(entry.signature):
+            self._bands.setdefault(band, set()).add(entry.normalized)
+        while len(self._entries) > self.capacity:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, normalized: str):
+        entry = self._entries.pop(normalized, None)
+        if entry is None:
+            return
+        for band in bands(entry.signature):
+            keys = self._bands[band]
+            keys.discard(normalized)
+            if not keys:
+                del self._bands[band]
+
+
+class NearDuplicateRecognizer(Recognizer):
+    def __init__(
+        self,
+        recognizer: Recognizer,
+        capacity: int = 4096,
+        threshold: float = 0.85,
+        telemetry_client: BotTelemetryClient = None,
+    ):
+        self._recognizer = recognizer
+        self.threshold = threshold
+        self.index = NearDuplicateIndex(capacity)
+        self.telemetry_client = telemetry_client or NullTelemetryClient()
+        self.stats = {
+            "calls": 0,
+            "hits": 0,
+            "near_hits": 0,
+            "misses": 0,
+            "rejected": 0,
+            "uncacheable": 0,
+        }
+
+    @property
+    def is_configured(self) -> bool:
+        return self._recognizer.is_configured
+
+    @property
+    def hit_rate(self) -> float:
+        return self.stats["hits"] / self.stats["calls"] if self.stats["calls"] else 0.0
+
+    def close(self):
+        if hasattr(self._recognizer, "close"):
+            self._recognizer.close()
+
+    async def recognize(self, turn_context: TurnContext) -> RecognizerResult:
+        activity = turn_context.activity
+        text = activity.text or ""
+        normalized = normalize(text)
+        if activity.type != ActivityTypes.message or not normalized:
+            return await self._recognizer.recognize(turn_context)
+
+        self.stats["calls"] += 1
+        # Embedded only when the normalized text is not cached as is
+        probe = None
+        exact = self.index.get(normalized)
+        if exact is not None:
+            candidates = [(1.0, exact)]
+        else:
+            probe = _Entry.of(normalized)
+            candidates = self.index.nearest(probe)
+        result = self._reuse(text, candidates)
+        self.telemetry_client.track_metric("RecognizerCacheHit", int(result is not None))
+        if result is not None:
+            return result
+
+        self.stats["misses"] += 1
+        result = await self._recognizer.recognize(turn_context)
+        if result is not None and (result.entities or {}).get("datetime"):
+            # Resolved against today, see the module docstring.
+            self.stats["uncacheable"] += 1
+        elif result is not None:
+            probe = probe or _Entry.of(normalized)
+            probe.result = result
+            self.index.put(probe)
+        return result
+
+    def _reuse(self, text: str, candidates: List[Tuple[float, _Entry]]) -> Optional[RecognizerResult]:
+        for similarity, entry in candidates:
+            if similarity < self.threshold:
+                break
+            result = (
+                reproject(entry.result, text) if self._safe(entry.normalized, normalize(text)) else None
+            )
+            if result is None:
+                self.stats["rejected"] += 1
+                continue
+            self.stats["hits"] += 1
+            if similarity < 1.0:
+                self.stats["near_hits"] += 1
+                self.index.get(entry.normalized)
+            return result
+        return None
+
+    @staticmethod
+    def _safe(cached: str, normalized: str) -> bool:
+        cached_words, words = cached.split(), normalized.split()
+        return len(cached_words) == len(words) and all(
+            word == other
+            or (not any(char.isdigit() for char in word) and one_edit_apart(word, other))
+            for word, other in zip(words, cached_words)
+        )
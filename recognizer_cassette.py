@@ -0,0 +1,247 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Record and replay recognizer results.
+
+CassetteRecognizer wraps the LUIS recognizer in one of three modes:
+
+- record: every recognized text and its RecognizerResult are appended to
+  the cassette;
+- replay: results are served from the cassette and LUIS is never called;
+- passthrough: calls go to LUIS and are only timed.
+
+A cassette is two files. `<path>` is an append-only log of zlib-compressed
+JSON records, each prefixed with its length. `<path>.idx` is an open
+addressing hash table (linear probing, load factor <= 1/2) of 16 byte slots,
+(blake2b-64 of the text, offset of the record in the log). Replay maps both
+files, so a lookup costs one or two slot reads plus one record read however
+many entries the cassette holds, and only the touched pages are loaded.
+"""
+
+import mmap
+import os
+import struct
+import time
+import zlib
+from hashlib import blake2b
+from typing import Optional
+
+from botbuilder.core import (
+    BotTelemetryClient,
+    IntentScore,
+    NullTelemetryClient,
+    Recognizer,
+    RecognizerResult,
+    TurnContext,
+)
+from botbuilder.schema import ActivityTypes
+
+from helpers.activity_codec import dumps, loads
+
+MODES = ("record", "replay", "passthrough")
+
+_INDEX_MAGIC = b"RCX1"
+# magic, capacity (slots, a power of two), entries
+_HEADER = struct.Struct("<4sQQ")
+# text hash (0 marks an empty slot), record offset
+_SLOT = struct.Struct("<QQ")
+_RECORD_LENGTH = struct.Struct("<I")
+_INITIAL_CAPACITY = 1024
+
+
+class CassetteMiss(KeyError):
+    pass
+
+
+def result_to_json(result: RecognizerResult) -> dict:
+    return {
+        "text": result.text,
+        "altered_text": result.altered_text,
+        "intents": {name: score.score for name, score in (result.intents or {}).items()},
+        "entities": result.entities,
+    }
+
+
+def result_from_json(recorded: dict) -> RecognizerResult:
+    return RecognizerResult(
+        text=recorded["text"],
+        altered_text=recorded.get("altered_text"),
+        intents={name: IntentScore(score) for name, score in recorded["intents"].items()},
+        entities=recorded["entities"],
+    )
+
+
+def text_key(text: str) -> int:
+    key = int.from_bytes(blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+    return key or 1
+
+
+class CassetteIndex:
+    """Memory-mapped hash table from text_key() to record offset."""
+
+    def __init__(self, path: str, writable: bool):
+        self.path = path
+        self.writable = writable
+        if not os.path.exists(path):
+            if not writable:
+                raise FileNotFoundError(path)
+            CassetteIndex._create(path, _INITIAL_CAPACITY)
+        self._open()
+
+    def _open(self):
+        self._file = open(self.path, "r+b" if self.writable else "rb")
+        self._map = mmap.mmap(
+            self._file.fileno(),
+            0,
+            access=mmap.ACCESS_WRITE if self.writable else mmap.ACCESS_READ,
+        )
+        magic, self.capacity, self.count = _HEADER.unpack_from(self._map, 0)
+        if magic != _INDEX_MAGIC:
+            raise ValueError(f"{self.path} is not a recognizer cassette index")
+
+    @staticmethod
+    def _create(path: str, capacity: int):
+        with open(path, "wb") as index_file:
+            index_file.write(_HEADER.pack(_INDEX_MAGIC, capacity, 0))
+            index_file.truncate(_HEADER.size + capacity * _SLOT.size)
+
+    def _probe(self, key: int):
+        """Yield (slot position, stored key, offset) from the key's home slot on."""
+        mask = self.capacity - 1
+        slot = key & mask
+        while True:
+            position = _HEADER.size + slot * _SLOT.size
+            stored, offset = _SLOT.unpack_from(self._map, position)
+            yield position, stored, offset
+            slot = (slot + 1) & mask
+
+    def get(self, key: int) -> Optional[int]:
+        for _, stored, offset in self._probe(key):
+            if stored == key:
+                return offset
+            if stored == 0:
+                return None
+
+    def put(self, key: int, offset: int):
+        if (self.count + 1) * 2 > self.capacity:
+            self._grow()
+        for position, stored, _ in self._probe(key):
+            if stored in (0, key):
+                _SLOT.pack_into(self._map, position, key, offset)
+                if stored == 0:
+                    self.count += 1
+                    _HEADER.pack_into(self._map, 0, _INDEX_MAGIC, self.capacity, self.count)
+                return
+
+    def _grow(self):
+        entries = []
+        for slot in range(self.capacity):
+            key, offset = _SLOT.unpack_from(self._map, _HEADER.size + slot * _SLOT.size)
+            if key:
+                entries.append((key, offset))
+        temporary = self.path + ".tmp"
+        CassetteIndex._create(temporary, self.capacity * 2)
+        self.close()
+        os.replace(temporary, self.path)
+        self._open()
+        for key, offset in entries:
+            self.put(key, offset)
+
+    def flush(self):
+        if self.writable:
+            self._map.flush()
+
+    def close(self):
+        self.flush()
+        self._map.close()
+        self._file.close()
+
+
+class Cassette:
+    """The record log and its index."""
+
+    def __init__(self, path: str, writable: bool = False):
+        self.path = path
+        self.writable = writable
+        if writable:
+            self._log = open(path, "ab")
+            self._map = None
+        else:
+            self._log = open(path, "rb")
+            size = os.fstat(self._log.fileno()).st_size
+            self._map = mmap.mmap(self._log.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self.index = CassetteIndex(path + ".idx", writable)
+
+    def __len__(self) -> int:
+        return self.index.count
+
+    def get(self, text: str) -> Optional[dict]:
+        offset = self.index.get(text_key(text))
+        if offset is None or self._map is None:
+            return None
+        (length,) = _RECORD_LENGTH.unpack_from(self._map, offset)
+        start = offset + _RECORD_LENGTH.size
+        record = loads(zlib.decompress(self._map[start:start + length]))
+        # Two texts may share a 64 bit hash; the record keeps the text to tell.
+        return record["result"] if record["text"] == text else None
+
+    def put(self, text: str, result: dict):
+        payload = zlib.compress(dumps({"text": text, "result": result}).encode("utf-8"))
+        offset = self._log.tell()
+        self._log.write(_RECORD_LENGTH.pack(len(payload)) + payload)
+        self._log.flush()
+        self.index.put(text_key(text), offset)
+
+    def close(self):
+        self.index.close()
+        if self._map is not None:
+            self._map.close()
+        self._log.close()
+
+
+class CassetteRecognizer(Recognizer):
+    def __init__(
+        self,
+        recognizer: Recognizer,
+        path: str,
+        mode: str = "passthrough",
+        telemetry_client: BotTelemetryClient = None,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode {mode}, expected one of {MODES}")
+        self._recognizer = recognizer
+        self.mode = mode
+        self.telemetry_client = telemetry_client or NullTelemetryClient()
+        self.cassette = Cassette(path, writable=mode == "record") if mode != "passthrough" else None
+        self.stats = {"calls": 0, "misses": 0, "total_ms": 0.0}
+
+    @property
+    def is_configured(self) -> bool:
+        # A replayed cassette needs no LUIS configuration.
+        return self.mode == "replay" or self._recognizer.is_configured
+
+    async def recognize(self, turn_context: TurnContext) -> RecognizerResult:
+        activity = turn_context.activity
+        self.stats["calls"] += 1
+        if self.mode == "replay":
+            if activity.type != ActivityTypes.message:
+                return None
+            recorded = self.cassette.get(activity.text or "")
+            if recorded is None:
+                self.stats["misses"] += 1
+                raise CassetteMiss(activity.text)
+            return result_from_json(recorded)
+
+        started = time.perf_counter()
+        result = await self._recognizer.recognize(turn_context)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.stats["total_ms"] += elapsed_ms
+        self.telemetry_client.track_metric(
+            "RecognizerCallMs", elapsed_ms, properties={"cassette": self.mode}
+        )
+        if self.mode == "record" and result is not None:
+            self.cassette.put(activity.text or "", result_to_json(result))
+        return result
+
+    def close(self):
+        if self.cassette is not None:
+            self.cassette.close()
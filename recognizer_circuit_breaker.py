@@ -0,0 +1,168 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Circuit breaker between the dialogs and the remote recognizer.
+
+The breaker watches a rolling window of recognizer calls. When too many of
+them fail, or take longer than `slow_call_ms`, it opens: for `open_seconds`
+every call is answered by the local fallback recognizer instead of waiting on
+LUIS. It then lets a few probe calls through (half-open); if they are fast
+and succeed the breaker closes again, otherwise it re-opens.
+
+A call over a LUIS budget (QuotaExceededError, see recognizer_quota.py) is
+answered by the fallback too, without counting as a failure; one the budget
+rejects is re-raised. So is a CassetteMiss (see recognizer_cassette.py): in
+replay mode an utterance missing from the cassette must fail the run, not be
+answered by the local model and counted against LUIS.
+"""
+
+import asyncio
+import time
+from collections import deque
+from enum import Enum
+
+from botbuilder.core import (
+    BotTelemetryClient,
+    NullTelemetryClient,
+    Recognizer,
+    RecognizerResult,
+    TurnContext,
+)
+
+from recognizer_cassette import CassetteMiss
+from recognizer_quota import QuotaExceededError
+
+
+class BreakerState(Enum):
+    CLOSED = 0
+    HALF_OPEN = 1
+    OPEN = 2
+
+
+class CircuitBreakerRecognizer(Recognizer):
+    def __init__(
+        self,
+        recognizer: Recognizer,
+        fallback: Recognizer,
+        window_size: int = 20,
+        minimum_calls: int = 5,
+        error_rate_threshold: float = 0.5,
+        slow_call_ms: float = 3000,
+        slow_call_rate_threshold: float = 0.5,
+        open_seconds: float = 30,
+        half_open_probes: int = 1,
+        telemetry_client: BotTelemetryClient = None,
+        clock=time.monotonic,
+    ):
+        self._recognizer = recognizer
+        self._fallback = fallback
+        self.minimum_calls = minimum_calls
+        self.error_rate_threshold = error_rate_threshold
+        self.slow_call_ms = slow_call_ms
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.telemetry_client = telemetry_client or NullTelemetryClient()
+        self._clock = clock
+
+        # (failed, slow) for the most recent calls
+        self._window = deque(maxlen=window_size)
+        self.state = BreakerState.CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+
+    @property
+    def is_configured(self) -> bool:
+        return self._recognizer.is_configured
+
+    def close(self):
+        for recognizer in (self._recognizer, self._fallback):
+            if hasattr(recognizer, "close"):
+                recognizer.close()
+
+    async def recognize(self, turn_context: TurnContext) -> RecognizerResult:
+        probing = self._admit()
+        if probing is None:
+            self.telemetry_client.track_metric("RecognizerFallbackCalls", 1)
+            return await self._fallback.recognize(turn_context)
+
+        started = self._clock()
+        try:
+            result = await self._recognizer.recognize(turn_context)
+        except (asyncio.CancelledError, CassetteMiss):
+            # The turn gave up (timeout, shutdown) or LUIS was replayed: no verdict on LUIS,
+            # the probe is free again.
+            if probing:
+                self._probes_in_flight -= 1
+            raise
+        except QuotaExceededError as error:
+            # LUIS was not called: nothing to record, a probe is free for another call.
+            if probing:
+                self._probes_in_flight -= 1
+            if error.reject:
+                raise
+            self.telemetry_client.track_metric("RecognizerFallbackCalls", 1)
+            return await self._fallback.recognize(turn_context)
+        except Exception as error:  # pylint: disable=broad-except
+            self._record(probing, failed=True, slow=False, reason=f"error: {error}")
+            self.telemetry_client.track_metric("RecognizerFallbackCalls", 1)
+            return await self._fallback.recognize(turn_context)
+
+        elapsed_ms = (self._clock() - started) * 1000
+        self._record(probing, failed=False, slow=elapsed_ms > self.slow_call_ms, reason="slow calls")
+        return result
+
+    def _admit(self):
+        """Return None to use the fallback, else whether this call is a half-open probe."""
+        if self.state == BreakerState.OPEN:
+            if self._clock() - self._opened_at < self.open_seconds:
+                return None
+            self._transition(BreakerState.HALF_OPEN, "open timeout elapsed")
+
+        if self.state == BreakerState.HALF_OPEN:
+            if self._probes_in_flight >= self.half_open_probes:
+                return None
+            self._probes_in_flight += 1
+            return True
+
+        return False
+
+    def _record(self, probing: bool, failed: bool, slow: bool, reason: str):
+        if probing:
+            self._probes_in_flight -= 1
+            if self.state != BreakerState.HALF_OPEN:
+                return
+            if failed or slow:
+                self._open(f"probe failed ({reason})")
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_probes:
+                self._window.clear()
+                self._transition(BreakerState.CLOSED, "probes succeeded")
+            return
+
+        if self.state != BreakerState.CLOSED:
+            return
+        self._window.append((failed, slow))
+        if len(self._window) < self.minimum_calls:
+            return
+        calls = len(self._window)
+        error_rate = sum(1 for item in self._window if item[0]) / calls
+        slow_rate = sum(1 for item in self._window if item[1]) / calls
+        if error_rate >= self.error_rate_threshold:
+            self._open(f"error rate {error_rate:.0%}")
+        elif slow_rate >= self.slow_call_rate_threshold:
+            self._open(f"slow call rate {slow_rate:.0%}")
+
+    def _open(self, reason: str):
+        self._opened_at = self._clock()
+        self._probe_successes = 0
+        self._transition(BreakerState.OPEN, reason)
+
+    def _transition(self, state: BreakerState, reason: str):
+        previous, self.state = self.state, state
+        self.telemetry_client.track_event(
+            "RecognizerBreakerTransition",
+            properties={"from": previous.name, "to": state.name, "reason": reason},
+        )
+        self.telemetry_client.track_metric("RecognizerBreakerState", state.value)
@@ -0,0 +1,239 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Budgets for LUIS calls: per user, per conversation and per second.
+
+A turn can call LUIS several times (MainDialog.act_step, then every retry
+of a TextToLuisPrompt). Every call is paid for, and the endpoint rejects
+calls beyond its transactions per second. RecognizerQuota spends a token of
+three token buckets for each call:
+
+- the user's (`activity.from_property.id`) and the conversation's buckets,
+  refilled at `calls_per_minute`. A call beyond them is not made: it raises
+  QuotaExceededError, which CircuitBreakerRecognizer answers with the local
+  model, or, with `reject_over_quota`, which ends the turn with the
+  "quota.exceeded" reply (AdapterWithErrorHandler);
+- the global bucket, refilled at `tps`. Calls beyond it are scheduled: a
+  call reserves the next token and waits for it, at most `max_wait_seconds`;
+  when the wait would be longer it is answered by the local model instead.
+
+Tokens are spent by the calls that reach LUIS only, cached results do not
+count (QuotaRecognizer wraps LUIS inside NearDuplicateRecognizer), and a
+call that does not get a global token gives back its user and conversation
+tokens. A hedge (FlightBookingRecognizer) is a second LUIS transaction: it
+spends a global token too, and is not sent when none is available. The
+budgets are per process: with sharded workers, `tps` is a worker's share of
+the endpoint's limit. Every budget is off unless its rate is set.
+
+Every call is reported as RecognizerQuotaUsed (1 when it went to LUIS, 0
+otherwise) and RecognizerQuotaRemaining (global tokens left); calls over
+budget as RecognizerQuotaExceeded with their scope, waits as
+RecognizerQuotaWaitMs.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from botbuilder.core import (
+    BotTelemetryClient,
+    NullTelemetryClient,
+    Recognizer,
+    RecognizerResult,
+    TurnContext,
+)
+from botbuilder.schema import Activity
+
+
+class QuotaExceededError(Exception):
+    def __init__(self, scope: str, reject: bool = False):
+        super().__init__(f"LUIS call budget of the {scope} exceeded")
+        self.scope = scope
+        self.reject = reject
+
+
+class TokenBucket:
+    """`rate` tokens per second, `burst` at most; reservations may run the bucket into debt."""
+
+    def __init__(self, rate: float, burst: float, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = burst
+        self._updated = clock()
+
+    @property
+    def tokens(self) -> float:
+        self._refill()
+        return self._tokens
+
+    def take(self) -> bool:
+        self._refill()
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def reserve(self, max_wait_seconds: float) -> Optional[float]:
+        """Take the next token; returns the seconds until it is due, None if that is over `max_wait_seconds`."""
+        self._refill()
+        wait = max(0.0, (1 - self._tokens) / self.rate)
+        if wait > max_wait_seconds:
+            return None
+        self._tokens -= 1
+        return wait
+
+    def give_back(self):
+        self._tokens = min(self.burst, self._tokens + 1)
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class _Buckets:
+    """A bucket per key, for the `capacity` most recently seen keys."""
+
+    def __init__(self, calls_per_minute: float, burst: float, capacity: int, clock):
+        self.rate = calls_per_minute / 60
+        self.burst = burst
+        self.capacity = capacity
+        self._clock = clock
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def get(self, key: str) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst, self._clock)
+            # An evicted key starts again with a full bucket, as after `burst / rate` idle seconds.
+            while len(self._buckets) > self.capacity:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+
+class RecognizerQuota:
+    """The budgets shared by the LUIS recognizers of a process.
+
+    A rate of 0, the default, disables its budget.
+    """
+
+    def __init__(
+        self,
+        tps: float = 0,
+        tps_burst: float = None,
+        max_wait_seconds: float = 0.25,
+        user_calls_per_minute: float = 0,
+        user_burst: float = 10,
+        conversation_calls_per_minute: float = 0,
+        conversation_burst: float = 10,
+        reject_over_quota: bool = False,
+        max_tracked: int = 10000,
+        telemetry_client: BotTelemetryClient = None,
+        clock=time.monotonic,
+    ):
+        self.max_wait_seconds = max_wait_seconds
+        self.reject_over_quota = reject_over_quota
+        self.telemetry_client = telemetry_client or NullTelemetryClient()
+        self.global_bucket = TokenBucket(tps, tps_burst or tps, clock) if tps else None
+        self._scopes = [
+            (scope, _Buckets(rate, burst, max_tracked, clock), key)
+            for scope, rate, burst, key in (
+                ("user", user_calls_per_minute, user_burst, _user_of),
+                ("conversation", conversation_calls_per_minute, conversation_burst, _conversation_of),
+            )
+            if rate
+        ]
+        self.stats = {
+            "calls": 0,
+            "admitted": 0,
+            "queued": 0,
+            "user": 0,
+            "conversation": 0,
+            "global": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._scopes) or self.global_bucket is not None
+
+    def admit_hedge(self) -> bool:
+        """Spend a global token for a hedge of an admitted call, only if one is available now."""
+        if self.global_bucket is None:
+            return True
+        if self.global_bucket.take():
+            self.telemetry_client.track_metric("RecognizerQuotaUsed", 1)
+            return True
+        self._exceeded("global")
+        return False
+
+    async def admit(self, activity: Activity):
+        """Spend the budgets of a LUIS call for `activity`; raises QuotaExceededError when over one."""
+        self.stats["calls"] += 1
+        taken = []
+        for scope, buckets, key_of in self._scopes:
+            key = key_of(activity)
+            if not key:
+                continue
+            bucket = buckets.get(key)
+            if not bucket.take():
+                self._give_back(taken)
+                self._exceeded(scope)
+                raise QuotaExceededError(scope, self.reject_over_quota)
+            taken.append(bucket)
+
+        if self.global_bucket is not None:
+            wait = self.global_bucket.reserve(self.max_wait_seconds)
+            if wait is None:
+                self._give_back(taken)
+                self._exceeded("global")
+                # The endpoint is busy, not the user: the local model answers.
+                raise QuotaExceededError("global")
+            if wait:
+                self.stats["queued"] += 1
+                self.telemetry_client.track_metric("RecognizerQuotaWaitMs", wait * 1000)
+                await asyncio.sleep(wait)
+            self.telemetry_client.track_metric("RecognizerQuotaRemaining", self.global_bucket.tokens)
+
+        self.stats["admitted"] += 1
+        self.telemetry_client.track_metric("RecognizerQuotaUsed", 1)
+
+    @staticmethod
+    def _give_back(taken):
+        for bucket in taken:
+            bucket.give_back()
+
+    def _exceeded(self, scope: str):
+        self.stats[scope] += 1
+        self.telemetry_client.track_metric("RecognizerQuotaUsed", 0)
+        self.telemetry_client.track_metric("RecognizerQuotaExceeded", 1, properties={"scope": scope})
+
+
+def _user_of(activity: Activity) -> str:
+    return activity.from_property.id if activity.from_property else ""
+
+
+def _conversation_of(activity: Activity) -> str:
+    return activity.conversation.id if activity.conversation else ""
+
+
+class QuotaRecognizer(Recognizer):
+    """`recognizer`, called within the budgets of `quota`."""
+
+    def __init__(self, recognizer: Recognizer, quota: RecognizerQuota):
+        self._recognizer = recognizer
+        self.quota = quota
+
+    @property
+    def is_configured(self) -> bool:
+        return self._recognizer.is_configured
+
+    def close(self):
+        if hasattr(self._recognizer, "close"):
+            self._recognizer.close()
+
+    async def recognize(self, turn_context: TurnContext) -> RecognizerResult:
+        await self.quota.admit(turn_context.activity)
+        return await self._recognizer.recognize(turn_context)
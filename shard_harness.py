@@ -0,0 +1,214 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Run sharded bot workers locally and check conversation affinity.
+
+    python -m shard_harness --workers 2 --scale-to 3 --conversations 60
+
+Starts `--workers` worker processes (app.py with ShardSelf, ShardWorkers,
+ShardSecret and a shared DurableStatePath in a temporary directory; LUIS
+and channel authentication unconfigured, so turns use the local model) and a
+ShardRouter in front of them. Every conversation sends the same script of
+utterances through the router with deliveryMode expectReplies, so that the
+replies come back in the response. Halfway through the script the harness
+starts `--scale-to - --workers` more workers and rebalances the router onto
+all of them.
+
+Checks that within each half every turn of a conversation was served by
+the worker the ring assigns it, and that every conversation got the same
+replies, whether it moved to another worker or not: a moved conversation
+must continue from the state its old worker flushed. Reports the
+conversations moved, the turns per worker and the turn latencies, and
+exits with 1 when a check fails.
+"""
+
+import argparse
+import asyncio
+import os
+import secrets
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List
+
+import aiohttp
+from aiohttp import web
+
+from helpers.activity_codec import dumps
+from shard_router import WORKER_HEADER, ShardRouter
+
+# Shared by the harness's router and workers for /api/shard
+SECRET = secrets.token_hex(16)
+
+SCRIPT = [
+    ["book a flight", "Berlin"],
+    ["Paris", "tomorrow", "in two weeks"],
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_worker(url: str, workers: List[str], durable_path: str) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.setdefault("AppInsightsInstrumentationKey", "00000000-0000-0000-0000-000000000000")
+    # No network calls from the harness: LUIS and channel auth stay unconfigured.
+    for name in ("LuisAppId", "LuisAPIKey", "MicrosoftAppId", "MicrosoftAppPassword"):
+        env.pop(name, None)
+    env.update(
+        ShardSelf=url,
+        ShardWorkers=",".join(workers),
+        ShardSecret=SECRET,
+        DurableStatePath=durable_path,
+    )
+    port = url.rsplit(":", 1)[1]
+    return subprocess.Popen(
+        [sys.executable, "-m", "aiohttp.web", "-H", "127.0.0.1", "-P", port, "app:init_func"],
+        env=env,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_ready(session: aiohttp.ClientSession, url: str, timeout_seconds: float = 60):
+    deadline = time.monotonic() + timeout_seconds
+    while True:
+        try:
+            async with session.get(f"{url}/api/ready") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{url} is not ready")
+        await asyncio.sleep(0.2)
+
+
+def activity(conversation_id: str, text: str) -> dict:
+    return {
+        "type": "message",
+        "id": f"{conversation_id}-{time.monotonic_ns()}",
+        "channelId": "harness",
+        "serviceUrl": "http://127.0.0.1",
+        "deliveryMode": "expectReplies",
+        "locale": "en-US",
+        "from": {"id": f"user-{conversation_id}"},
+        "recipient": {"id": "bot"},
+        "conversation": {"id": conversation_id},
+        "text": text,
+    }
+
+
+class Conversation:
+    def __init__(self, conversation_id: str):
+        self.id = conversation_id
+        self.replies: List[str] = []
+        # Worker that served each turn, per half of the script
+        self.workers: List[List[str]] = [[], []]
+        self.latencies_ms: List[float] = []
+
+    async def send(self, session: aiohttp.ClientSession, router_url: str, phase: int, text: str):
+        started = time.perf_counter()
+        async with session.post(
+            f"{router_url}/api/messages",
+            data=dumps(activity(self.id, text)),
+            headers={"Content-Type": "application/json"},
+        ) as response:
+            body = await response.json() if response.status == 200 else {}
+            self.latencies_ms.append((time.perf_counter() - started) * 1000)
+            self.workers[phase].append(response.headers.get(WORKER_HEADER, ""))
+            replies = [item.get("text") or "" for item in (body or {}).get("activities", [])]
+            self.replies.append(f"{response.status}:" + " | ".join(replies))
+
+    async def run_phase(self, session, router_url: str, phase: int):
+        for text in SCRIPT[phase]:
+            await self.send(session, router_url, phase, text)
+
+
+def check(conversations: List[Conversation], rings: List) -> List[str]:
+    failures = []
+    expected = Counter(tuple(conversation.replies) for conversation in conversations).most_common(1)[0][0]
+    for conversation in conversations:
+        for phase, ring in enumerate(rings):
+            owner = ring.node_for(conversation.id)
+            if set(conversation.workers[phase]) != {owner}:
+                failures.append(f"{conversation.id}: served by {conversation.workers[phase]}, owner {owner}")
+        if tuple(conversation.replies) != expected:
+            failures.append(f"{conversation.id}: replies {conversation.replies}, expected {list(expected)}")
+    return failures
+
+
+async def run(workers: int, scale_to: int, count: int) -> int:
+    urls = [f"http://127.0.0.1:{free_port()}" for _ in range(max(workers, scale_to))]
+    initial, scaled = urls[:workers], urls[:scale_to]
+    processes: Dict[str, subprocess.Popen] = {}
+    router = ShardRouter(initial, secret=SECRET)
+    runner = web.AppRunner(router.create_app())
+    with tempfile.TemporaryDirectory() as directory:
+        durable_path = os.path.join(directory, "state.sqlite3")
+        try:
+            async with aiohttp.ClientSession() as session:
+                for url in initial:
+                    processes[url] = start_worker(url, initial, durable_path)
+                await asyncio.gather(*(wait_ready(session, url) for url in initial))
+                await runner.setup()
+                router_port = free_port()
+                await web.TCPSite(runner, "127.0.0.1", router_port).start()
+                router_url = f"http://127.0.0.1:{router_port}"
+
+                conversations = [Conversation(f"conversation-{index}") for index in range(count)]
+                rings = [router.ring]
+                await asyncio.gather(*(item.run_phase(session, router_url, 0) for item in conversations))
+                for url in scaled:
+                    if url not in processes:
+                        processes[url] = start_worker(url, scaled, durable_path)
+                await asyncio.gather(*(wait_ready(session, url) for url in scaled))
+                started = time.perf_counter()
+                async with session.post(f"{router_url}/api/shards", json={"workers": scaled}) as response:
+                    response.raise_for_status()
+                rebalance_ms = (time.perf_counter() - started) * 1000
+                rings.append(router.ring)
+                await asyncio.gather(*(item.run_phase(session, router_url, 1) for item in conversations))
+        finally:
+            await runner.cleanup()
+            for process in processes.values():
+                process.terminate()
+            for process in processes.values():
+                process.wait()
+
+    moved = sum(rings[0].node_for(item.id) != rings[1].node_for(item.id) for item in conversations)
+    turns = Counter(worker for item in conversations for phase in item.workers for worker in phase)
+    latencies = sorted(latency for item in conversations for latency in item.latencies_ms)
+    print(f"{count} conversations, {workers} -> {scale_to} workers, rebalanced in {rebalance_ms:.0f} ms")
+    print(f"moved: {moved} ({moved / count:.0%}, ideal {abs(scale_to - workers) / max(workers, scale_to):.0%})")
+    for url in scaled:
+        print(f"{url:<28}{turns[url]:>6} turns")
+    print(
+        f"turn latency: p50 {statistics.median(latencies):.1f} ms, "
+        f"p95 {latencies[int(len(latencies) * 0.95) - 1]:.1f} ms"
+    )
+    failures = check(conversations, rings)
+    for failure in failures[:20]:
+        print(f"FAIL {failure}")
+    print("ok" if not failures else f"{len(failures)} failures")
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--scale-to", type=int, default=3)
+    parser.add_argument("--conversations", type=int, default=60)
+    args = parser.parse_args(argv)
+    sys.exit(asyncio.run(run(args.workers, args.scale_to, args.conversations)))
+
+
+if __name__ == "__main__":
+    main()
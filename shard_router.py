@@ -0,0 +1,310 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Conversation-affinity sharding across bot workers.
+
+    python -m shard_router --port 3978 --worker http://127.0.0.1:3979 --worker ...
+
+With several workers behind a plain load balancer, any worker may get any
+conversation. Every turn then reads and writes the shared store, and two
+workers may run turns of the same conversation at the same time.
+ShardRouter is the front: it consistent-hashes `activity.conversation.id`
+onto the workers (HashRing) and forwards /api/messages to the owner, so a
+conversation stays on one worker. Its state can then live in that worker's
+memory, see write_behind_storage.py.
+
+Scaling (POST /api/shards {"workers": [...]}) moves only the conversations
+whose owner changes, about 1/n of them:
+
+1. every worker, old and new, gets the new ring (POST /api/shard, handled by
+   ShardMembership). A worker answers 421 Misdirected Request to turns of
+   conversations it no longer owns. It waits for the turns of those
+   conversations that are in flight, flushes its pending state writes and
+   drops them from its cache;
+2. the router then routes with the new ring. A turn answered 421 meanwhile
+   is sent again once the rebalance is over, to the new owner, which reads
+   the flushed state from the durable store.
+
+When a worker does not accept the new ring, the workers that did are given
+the old one back and the router keeps routing with it: no worker rejects
+conversations the router still sends it.
+
+Turns queued for background processing (AsyncTurnProcessing) are not
+waited for; sharded workers should process turns on the request.
+
+The router and the workers share a secret (ShardSecret, --secret): a
+worker's /api/shard only accepts a ring sent with it, as
+`Authorization: Bearer <secret>`, and is not served without one. The
+router's own /api/shards is internal and should only be reachable from the
+deployment's network.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import os
+from bisect import bisect_right
+from collections import Counter
+from contextlib import asynccontextmanager
+from http import HTTPStatus
+from typing import Iterable, List, Optional
+
+import aiohttp
+from aiohttp import web
+from aiohttp.web import Request, Response, json_response
+from botbuilder.core import BotTelemetryClient, NullTelemetryClient
+
+from helpers.activity_codec import loads
+from write_behind_storage import WriteBehindStorage, conversation_of, is_conversation_key
+
+# Forwarded from the channel to the worker, and back
+REQUEST_HEADERS = ("Authorization", "Content-Type")
+RESPONSE_HEADERS = ("Content-Type", "Retry-After")
+WORKER_HEADER = "X-Shard-Worker"
+
+
+def _hash(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hashing with `replicas` virtual nodes per node."""
+
+    def __init__(self, nodes: Iterable[str], replicas: int = 64):
+        self.nodes = sorted(set(nodes))
+        points = sorted(
+            (_hash(f"{node}#{replica}"), node) for node in self.nodes for replica in range(replicas)
+        )
+        self._hashes = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def node_for(self, key: str) -> Optional[str]:
+        if not self._hashes:
+            return None
+        return self._owners[bisect_right(self._hashes, _hash(key)) % len(self._hashes)]
+
+
+def _bearer(secret: str) -> dict:
+    return {"Authorization": f"Bearer {secret}"}
+
+
+def conversation_id_of(body: bytes) -> str:
+    conversation = loads(body).get("conversation") or {}
+    return conversation.get("id") or ""
+
+
+class ShardMembership:
+    """A worker's side of the sharding: which conversations it owns."""
+
+    def __init__(
+        self,
+        node: str,
+        workers: Iterable[str],
+        storage: WriteBehindStorage = None,
+        secret: str = "",
+        telemetry_client: BotTelemetryClient = None,
+    ):
+        self.node = node
+        self.ring = HashRing(workers)
+        self.storage = storage
+        # Expected from the router on /api/shard; without one no ring is accepted.
+        self.secret = secret
+        self.telemetry_client = telemetry_client or NullTelemetryClient()
+        # Conversation id -> turns in flight
+        self._in_flight: Counter = Counter()
+        self._turn_ended = asyncio.Event()
+
+    def owns(self, conversation_id: str) -> bool:
+        return self.ring.node_for(conversation_id) == self.node
+
+    @asynccontextmanager
+    async def turn(self, conversation_id: str):
+        self._in_flight[conversation_id] += 1
+        try:
+            yield
+        finally:
+            self._in_flight[conversation_id] -= 1
+            if not self._in_flight[conversation_id]:
+                del self._in_flight[conversation_id]
+            self._turn_ended.set()
+
+    async def rebalance(self, workers: List[str]) -> dict:
+        self.ring = HashRing(workers)
+        # The turns of moved conversations that already started finish here.
+        while any(not self.owns(conversation) for conversation in self._in_flight):
+            self._turn_ended.clear()
+            await self._turn_ended.wait()
+        evicted = 0
+        if self.storage is not None:
+            evicted = await self.storage.evict(
+                lambda key: not is_conversation_key(key) or self.owns(conversation_of(key))
+            )
+        self.telemetry_client.track_event(
+            "ShardRebalanced",
+            properties={"node": self.node, "workers": ",".join(self.ring.nodes)},
+            measurements={"evicted": evicted},
+        )
+        return {"workers": self.ring.nodes, "evicted": evicted}
+
+    async def shard_handler(self, req: Request) -> Response:
+        expected = _bearer(self.secret)["Authorization"]
+        received = req.headers.get("Authorization", "")
+        if not self.secret or not hmac.compare_digest(received.encode(), expected.encode()):
+            self.telemetry_client.track_event("ShardRingRejected", properties={"node": self.node})
+            return Response(status=HTTPStatus.UNAUTHORIZED)
+        body = await req.json()
+        return json_response(await self.rebalance(body["workers"]))
+
+
+class ShardRouter:
+    def __init__(
+        self,
+        workers: Iterable[str],
+        timeout_seconds: float = 30,
+        secret: str = "",
+        telemetry_client: BotTelemetryClient = None,
+    ):
+        self.ring = HashRing(workers)
+        self.timeout_seconds = timeout_seconds
+        self.secret = secret
+        self.telemetry_client = telemetry_client or NullTelemetryClient()
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Cleared while a rebalance is in progress
+        self._settled = asyncio.Event()
+        self._settled.set()
+        self._rebalancing = asyncio.Lock()
+
+    async def start(self):
+        self._session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=self.timeout_seconds)
+        )
+
+    async def stop(self):
+        if self._session is not None:
+            await self._session.close()
+
+    async def messages(self, req: Request) -> Response:
+        body = await req.read()
+        try:
+            conversation_id = conversation_id_of(body)
+        except ValueError:
+            return Response(status=HTTPStatus.BAD_REQUEST)
+        headers = {name: req.headers[name] for name in REQUEST_HEADERS if name in req.headers}
+        return await self.route(conversation_id, body, headers)
+
+    async def route(self, conversation_id: str, body: bytes, headers: dict) -> Response:
+        response = None
+        for _ in range(2):
+            worker = self.ring.node_for(conversation_id)
+            if worker is None:
+                return Response(status=HTTPStatus.SERVICE_UNAVAILABLE)
+            response = await self._forward(worker, body, headers)
+            if response.status != HTTPStatus.MISDIRECTED_REQUEST:
+                break
+            # The conversation is moving: retry with the ring the rebalance ends with.
+            await self._settled.wait()
+        return response
+
+    async def _forward(self, worker: str, body: bytes, headers: dict) -> Response:
+        try:
+            async with self._session.post(f"{worker}/api/messages", data=body, headers=headers) as response:
+                payload = await response.read()
+                forwarded = {
+                    name: response.headers[name] for name in RESPONSE_HEADERS if name in response.headers
+                }
+                status = response.status
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.telemetry_client.track_metric("ShardForwardFailed", 1, properties={"worker": worker})
+            return Response(status=HTTPStatus.BAD_GATEWAY, headers={WORKER_HEADER: worker})
+        forwarded[WORKER_HEADER] = worker
+        return Response(status=status, body=payload, headers=forwarded)
+
+    async def rebalance(self, workers: List[str]):
+        """Announce the new ring to every worker, then route with it.
+
+        Raises the first worker's error if any of them did not accept it; the
+        workers that did are given the current ring back, which the router keeps.
+        """
+        async with self._rebalancing:
+            self._settled.clear()
+            try:
+                members = sorted(set(self.ring.nodes) | set(workers))
+                results = await asyncio.gather(
+                    *(self._announce(member, workers) for member in members),
+                    return_exceptions=True,
+                )
+                errors = [result for result in results if isinstance(result, BaseException)]
+                if errors:
+                    await self._roll_back(
+                        [member for member, result in zip(members, results) if result is None],
+                        workers,
+                        errors,
+                    )
+                    raise errors[0]
+                self.ring = HashRing(workers)
+            finally:
+                self._settled.set()
+        self.telemetry_client.track_event(
+            "ShardRouterRebalanced", properties={"workers": ",".join(self.ring.nodes)}
+        )
+
+    async def _roll_back(self, accepted: List[str], workers: List[str], errors: list):
+        results = await asyncio.gather(
+            *(self._announce(member, self.ring.nodes) for member in accepted),
+            return_exceptions=True,
+        )
+        self.telemetry_client.track_event(
+            "ShardRouterRebalanceFailed",
+            properties={
+                "workers": ",".join(workers),
+                "error": repr(errors[0]),
+                # Workers left with the new ring: they reject turns the router still sends them.
+                "stranded": ",".join(
+                    member for member, result in zip(accepted, results) if result is not None
+                ),
+            },
+        )
+
+    async def _announce(self, worker: str, workers: List[str]):
+        async with self._session.post(
+            f"{worker}/api/shard", json={"workers": workers}, headers=_bearer(self.secret)
+        ) as response:
+            response.raise_for_status()
+
+    async def shards_handler(self, req: Request) -> Response:
+        if req.method == "POST":
+            try:
+                await self.rebalance((await req.json())["workers"])
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                return json_response(
+                    {"workers": self.ring.nodes, "error": repr(error)},
+                    status=HTTPStatus.BAD_GATEWAY,
+                )
+        return json_response({"workers": self.ring.nodes})
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/api/messages", self.messages)
+        app.router.add_get("/api/shards", self.shards_handler)
+        app.router.add_post("/api/shards", self.shards_handler)
+        app.on_startup.append(lambda _: self.start())
+        app.on_cleanup.append(lambda _: self.stop())
+        return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=3978)
+    parser.add_argument("--worker", action="append", required=True, help="worker base URL")
+    parser.add_argument(
+        "--secret", default=os.environ.get("ShardSecret", ""), help="the workers' ShardSecret"
+    )
+    args = parser.parse_args(argv)
+    web.run_app(
+        ShardRouter(args.worker, secret=args.secret).create_app(), host=args.host, port=args.port
+    )
+
+
+if __name__ == "__main__":
+    main()
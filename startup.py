@@ -0,0 +1,103 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Startup phases, warm-up and readiness.
+
+Building the objects in app.py is not enough for the first request to be
+fast: the Recognizers-Text models of the prompts and of the local model,
+the LUIS HTTPS connection, the channel's OpenID signing keys, the bot's
+access token and the card templates are all loaded lazily by the first turn
+that needs them.
+StartupMonitor runs those loads as warm-up tasks once the server is up and
+only then reports ready, and records how long each startup phase took.
+"""
+
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict
+
+from aiohttp.web import Request, Response, json_response
+from botbuilder.core import BotTelemetryClient, NullTelemetryClient
+from botframework.connector.auth import (
+    AuthenticationConstants,
+    ChannelValidation,
+    JwtTokenExtractor,
+)
+
+
+class StartupMonitor:
+    def __init__(self, telemetry_client: BotTelemetryClient = None):
+        self.telemetry_client = telemetry_client or NullTelemetryClient()
+        self.ready = False
+        # Phase name -> duration in milliseconds
+        self.phases: Dict[str, float] = {}
+        self.failures: Dict[str, str] = {}
+        self._warm_up_task = None
+
+    def record(self, phase: str, started: float):
+        """Record a phase that began at `started` (a time.perf_counter() value)."""
+        self.phases[phase] = (time.perf_counter() - started) * 1000
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, started)
+
+    async def warm_up(self, tasks: Dict[str, Callable[[], Awaitable]]):
+        """Run the warm-up tasks concurrently, then flip readiness.
+
+        A failing task is reported but does not keep the bot unready: the
+        request that needs it pays for the lazy load, as without warm-up.
+        """
+
+        async def run(name: str, task: Callable[[], Awaitable]):
+            started = time.perf_counter()
+            try:
+                await task()
+            except Exception as error:  # pylint: disable=broad-except
+                self.failures[name] = repr(error)
+                self.telemetry_client.track_event(
+                    "StartupWarmUpFailed", properties={"task": name, "error": repr(error)}
+                )
+            self.record(f"warm_up.{name}", started)
+
+        with self.phase("warm_up"):
+            await asyncio.gather(*(run(name, task) for name, task in tasks.items()))
+        self.ready = True
+        for name, duration in self.phases.items():
+            self.telemetry_client.track_metric(
+                "StartupPhaseMs", duration, properties={"phase": name}
+            )
+
+    def start_warm_up(self, tasks: Dict[str, Callable[[], Awaitable]]):
+        """Warm up in the background so that /api/ready answers meanwhile."""
+        self._warm_up_task = asyncio.ensure_future(self.warm_up(tasks))
+
+    async def stop(self):
+        if self._warm_up_task is not None and not self._warm_up_task.done():
+            self._warm_up_task.cancel()
+
+    async def ready_handler(self, req: Request) -> Response:
+        body = {"ready": self.ready, "phases_ms": self.phases, "failures": self.failures}
+        return json_response(body, status=200 if self.ready else 503)
+
+
+async def warm_open_id_metadata():
+    """Fetch the signing keys used to authenticate channel and emulator requests.
+
+    _OpenIdMetadata refreshes with blocking `requests` calls inside a
+    coroutine; run it on a thread so the event loop keeps serving.
+    """
+    urls = (
+        ChannelValidation.open_id_metadata_endpoint
+        or AuthenticationConstants.TO_BOT_FROM_CHANNEL_OPENID_METADATA_URL,
+        AuthenticationConstants.TO_BOT_FROM_EMULATOR_OPENID_METADATA_URL,
+    )
+    loop = asyncio.get_event_loop()
+    for url in urls:
+        metadata = JwtTokenExtractor.get_open_id_metadata(url)
+        # pylint: disable=protected-access
+        await loop.run_in_executor(None, asyncio.run, metadata._refresh())
@@ -0,0 +1,181 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""WebSocket transport for turns, alongside /api/messages.
+
+Over HTTP every turn is a POST to /api/messages, and every reply is another
+POST, from the bot to the channel's serviceUrl. A client of /api/stream
+opens one WebSocket instead, and its turns and the bot's replies share it,
+as JSON text frames:
+
+- client to bot: {"requestId": "1", "activity": {...}}. The Authorization
+  header of the upgrade request authenticates every activity. A frame may
+  carry an "authorization" of its own, which replaces it (a renewed token);
+- bot to client: {"activity": {...}} for each reply, as soon as the turn
+  sends it, then {"requestId": "1", "status": 200} once the turn is over,
+  with the invoke response or the expected replies as "body". A turn that
+  was not run gets the status /api/messages would answer (400, 401, 421,
+  429, 503), and "retryAfter" when it was shed.
+
+The turns of a connection run concurrently, in order within a conversation
+(TurnScheduler), through the same ADAPTER and BOT.on_turn as HTTP turns.
+The activity's serviceUrl is authenticated as sent, then replaced by
+`urn:stream:<connection>`: AdapterWithErrorHandler sends the activities of
+such turns, typing indicators included, to StreamingEndpoint.send instead
+of the channel. Replies sent after the client left are dropped and counted.
+Turns are reported as StreamingTurnMs, open connections as
+StreamingConnections.
+
+This is a simple protocol of its own, for local clients and tests. It is
+not the binary protocol of the Direct Line App Service extension
+(botframework-streaming). Streams are not routed by ShardRouter: a sharded
+worker answers 421 to the conversations it does not own.
+"""
+
+import asyncio
+import time
+import uuid
+from http import HTTPStatus
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from aiohttp import WSMsgType, web
+from aiohttp.web import Request
+from botbuilder.core import (
+    BotFrameworkAdapter,
+    BotTelemetryClient,
+    InvokeResponse,
+    NullTelemetryClient,
+    TurnContext,
+)
+from botbuilder.schema import Activity, ActivityTypes, ResourceResponse
+from botframework.connector.auth import ClaimsIdentity
+
+from helpers.activity_codec import dumps, loads
+from turn_scheduler import TurnRejected
+
+SERVICE_URL_PREFIX = "urn:stream:"
+
+
+class _Connection:
+    def __init__(self, socket: web.WebSocketResponse, auth_header: str):
+        self.socket = socket
+        self.auth_header = auth_header
+        self.turns: Set[asyncio.Task] = set()
+        self._writing = asyncio.Lock()
+
+    async def write(self, message: dict) -> bool:
+        """Send `message`; returns False when the client is gone."""
+        async with self._writing:
+            if self.socket.closed:
+                return False
+            try:
+                await self.socket.send_str(dumps(message))
+            except ConnectionError:
+                return False
+        return True
+
+
+class StreamingEndpoint:
+    def __init__(
+        self,
+        authenticate: Callable[[Activity, str], Awaitable[ClaimsIdentity]],
+        process: Callable[[Activity, ClaimsIdentity], Awaitable[Optional[InvokeResponse]]],
+        heartbeat_seconds: float = 30,
+        max_message_bytes: int = 4 * 1024 * 1024,
+        telemetry_client: BotTelemetryClient = None,
+    ):
+        """`authenticate` raises PermissionError for unauthorized activities; `process` runs a turn."""
+        self._authenticate = authenticate
+        self._process = process
+        self.heartbeat_seconds = heartbeat_seconds
+        self.max_message_bytes = max_message_bytes
+        self.telemetry_client = telemetry_client or NullTelemetryClient()
+        self._connections: Dict[str, _Connection] = {}
+        self.stats = {"connections": 0, "turns": 0, "replies": 0, "dropped": 0}
+
+    @staticmethod
+    def owns(service_url: Optional[str]) -> bool:
+        return bool(service_url) and service_url.startswith(SERVICE_URL_PREFIX)
+
+    async def handler(self, req: Request) -> web.WebSocketResponse:
+        socket = web.WebSocketResponse(
+            heartbeat=self.heartbeat_seconds, max_msg_size=self.max_message_bytes
+        )
+        await socket.prepare(req)
+        connection_id = uuid.uuid4().hex
+        connection = _Connection(socket, req.headers.get("Authorization", ""))
+        self._connections[connection_id] = connection
+        self.stats["connections"] += 1
+        self.telemetry_client.track_metric("StreamingConnections", len(self._connections))
+        try:
+            async for message in socket:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                task = asyncio.ensure_future(self._turn(connection_id, connection, message.data))
+                connection.turns.add(task)
+                task.add_done_callback(connection.turns.discard)
+        finally:
+            # The turns already received finish, like HTTP turns whose client hung up.
+            await asyncio.gather(*connection.turns, return_exceptions=True)
+            del self._connections[connection_id]
+            self.telemetry_client.track_metric("StreamingConnections", len(self._connections))
+        return socket
+
+    async def _turn(self, connection_id: str, connection: _Connection, data: str):
+        started = time.perf_counter()
+        request_id = None
+        try:
+            frame = loads(data)
+            request_id = frame.get("requestId")
+            activity = Activity().deserialize(frame["activity"])
+        except (ValueError, KeyError, TypeError, AttributeError):
+            await connection.write({"requestId": request_id, "status": HTTPStatus.BAD_REQUEST})
+            return
+        if "authorization" in frame:
+            connection.auth_header = frame["authorization"] or ""
+
+        try:
+            identity = await self._authenticate(activity, connection.auth_header)
+        except PermissionError:
+            await connection.write({"requestId": request_id, "status": HTTPStatus.UNAUTHORIZED})
+            return
+        activity.service_url = SERVICE_URL_PREFIX + connection_id
+
+        done = {"requestId": request_id, "status": HTTPStatus.OK}
+        try:
+            response = await self._process(activity, identity)
+        except TurnRejected as rejection:
+            done.update(status=rejection.status, retryAfter=rejection.retry_after)
+        except Exception:  # pylint: disable=broad-except
+            # What /api/messages answers through aiohttp_error_middleware
+            done["status"] = HTTPStatus.INTERNAL_SERVER_ERROR
+        else:
+            if response is not None:
+                done["status"] = response.status
+                if response.body is not None:
+                    done["body"] = response.body
+        self.stats["turns"] += 1
+        await connection.write(done)
+        self.telemetry_client.track_metric(
+            "StreamingTurnMs", (time.perf_counter() - started) * 1000
+        )
+
+    async def send(self, context: TurnContext, activities: List[Activity]) -> List[ResourceResponse]:
+        """BotFrameworkAdapter.send_activities, over the turn's connection."""
+        connection = self._connections.get(context.activity.service_url[len(SERVICE_URL_PREFIX):])
+        responses = []
+        for activity in activities:
+            if activity.type == "delay":
+                await asyncio.sleep(float(activity.value) / 1000)
+            elif activity.type == ActivityTypes.invoke_response:
+                # pylint: disable=protected-access
+                context.turn_state[BotFrameworkAdapter._INVOKE_RESPONSE_KEY] = activity
+            elif activity.type == ActivityTypes.trace and activity.channel_id != "emulator":
+                pass
+            else:
+                activity.id = activity.id or uuid.uuid4().hex
+                if connection is not None and await connection.write({"activity": activity.serialize()}):
+                    self.stats["replies"] += 1
+                else:
+                    self.stats["dropped"] += 1
+            responses.append(ResourceResponse(id=activity.id or ""))
+        return responses
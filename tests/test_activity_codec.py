@@ -0,0 +1,77 @@
+import json
+import os
+import unittest
+
+from botbuilder.schema import Activity, Attachment
+
+from helpers import activity_codec
+
+PAYLOADS_DIR = os.path.join(os.path.dirname(__file__), "..", "benchmarks", "payloads")
+
+
+class ActivityCodecTest(unittest.TestCase):
+    def load_payload(self, name):
+        with open(os.path.join(PAYLOADS_DIR, name), "rb") as payload_file:
+            return payload_file.read()
+
+    def test_decode_matches_msrest(self):
+        for name in ("teams_message.json", "directline_message.json"):
+            raw = self.load_payload(name)
+            expected = Activity().deserialize(json.loads(raw))
+            activity = activity_codec.decode_activity(raw)
+
+            self.assertEqual(activity.serialize(), expected.serialize())
+            self.assertEqual(activity.timestamp, expected.timestamp)
+            self.assertEqual(activity.local_timestamp, expected.local_timestamp)
+            self.assertEqual(len(activity.entities), len(expected.entities))
+
+    def test_decode_keeps_fields_outside_the_table(self):
+        activity = activity_codec.deserialize_activity(
+            {
+                "type": "message",
+                "timestamp": "2019-01-01T10:00:00.000Z",
+                "relatesTo": {"activityId": "1", "conversation": {"id": "conv"}},
+                "attachments": [{"contentType": "text/plain", "content": "hi"}],
+            }
+        )
+        self.assertEqual(activity.timestamp.year, 2019)
+        self.assertEqual(activity.relates_to.activity_id, "1")
+        self.assertEqual(activity.relates_to.conversation.id, "conv")
+        self.assertEqual(activity.attachments[0].content, "hi")
+
+    def test_accounts_keep_every_field(self):
+        body = {
+            "type": "message",
+            "from": {"id": "u", "aadObjectId": "a", "properties": {"upn": "u@contoso.com"}},
+            "conversation": {"id": "c", "tenantID": "t", "properties": {"k": 1}},
+            "recipient": {"id": "b", "custom": "x"},
+        }
+        activity = activity_codec.deserialize_activity(body)
+        self.assertEqual(activity.from_property.properties, {"upn": "u@contoso.com"})
+        self.assertEqual(activity.conversation.properties, {"k": 1})
+        self.assertEqual(activity.recipient.additional_properties, {"custom": "x"})
+        self.assertEqual(activity_codec.serialize_activity(activity), activity.serialize())
+        self.assertEqual(activity.serialize()["from"], body["from"])
+
+    def test_decode_falls_back_to_msrest_for_keys_outside_the_schema(self):
+        activity = activity_codec.deserialize_activity({"type": "message", "custom": 1})
+        self.assertEqual(activity.type, "message")
+        self.assertEqual(activity.additional_properties, {"custom": 1})
+
+    def test_encode_round_trip(self):
+        raw = self.load_payload("directline_message.json")
+        activity = activity_codec.decode_activity(raw)
+        encoded = json.loads(activity_codec.encode_activity(activity))
+
+        self.assertEqual(encoded["text"], "I only have a budget of 800$, I hope it's enough")
+        self.assertEqual(encoded["from"]["id"], "dl_16776660945060.7b1t2ek5q1o")
+        self.assertEqual(
+            encoded, Activity().deserialize(encoded).serialize()
+        )
+
+    def test_encode_falls_back_to_msrest_for_unknown_fields(self):
+        activity = Activity(
+            type="message",
+            attachments=[Attachment(content_type="text/plain", content="hi")],
+        )
+        self.assertEqual(activity_codec.serialize_activity(activity), activity.serialize())
@@ -0,0 +1,135 @@
+import asyncio
+import os
+import tempfile
+from http import HTTPStatus
+
+import aiounittest
+from botbuilder.schema import Activity, ChannelAccount, ConversationAccount
+from botframework.connector.auth import ClaimsIdentity
+
+from background_turn_processor import BackgroundTurnProcessor, DurableTurnQueue
+from turn_scheduler import TurnRejected, TurnScheduler
+
+
+class RecordingAdapter:
+    def __init__(self):
+        self.texts = []
+        self.processed = asyncio.Event()
+
+    async def process_activity_with_identity(self, activity, identity, logic):
+        self.texts.append(activity.text)
+        await logic(activity)
+        self.processed.set()
+
+
+def make_activity(text, conversation_id="conv"):
+    return Activity(
+        type="message",
+        text=text,
+        service_url="https://directline.botframework.com/",
+        channel_id="directline",
+        from_property=ChannelAccount(id="user"),
+        recipient=ChannelAccount(id="bot"),
+        conversation=ConversationAccount(id=conversation_id),
+    )
+
+
+async def noop_logic(_):
+    pass
+
+
+class SheddingScheduler(TurnScheduler):
+    """Sheds the first turn it is given once, after it has waited in the queue."""
+
+    def __init__(self):
+        super().__init__(retry_after=0.05)
+        self.shed = False
+
+    async def run(self, conversation_id, turn):
+        if not self.shed:
+            self.shed = True
+            # As a queue-wait timeout would, while later turns may be arriving
+            await asyncio.sleep(0.02)
+            raise TurnRejected(HTTPStatus.SERVICE_UNAVAILABLE, self.retry_after, "test")
+        return await super().run(conversation_id, turn)
+
+
+class FailingRemoveQueue(DurableTurnQueue):
+    async def remove(self, row_id):
+        raise OSError("disk full")
+
+
+class BackgroundTurnProcessorTest(aiounittest.AsyncTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "turns.sqlite3")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def make_processor(self, adapter, workers=2, scheduler=None, journal=None):
+        return BackgroundTurnProcessor(
+            adapter, noop_logic, journal or DurableTurnQueue(self.path),
+            scheduler or TurnScheduler(), workers=workers,
+        )
+
+    async def test_submitted_turns_run_in_order(self):
+        adapter = RecordingAdapter()
+        processor = self.make_processor(adapter)
+        await processor.start()
+        identity = ClaimsIdentity({"aud": "bot"}, True)
+        for text in ("one", "two", "three"):
+            await processor.submit(make_activity(text), identity)
+
+        while len(adapter.texts) < 3:
+            await asyncio.sleep(0.01)
+        await processor.stop()
+
+        self.assertEqual(adapter.texts, ["one", "two", "three"])
+
+    async def test_shed_turns_are_retried_in_order(self):
+        adapter = RecordingAdapter()
+        processor = self.make_processor(adapter, scheduler=SheddingScheduler())
+        await processor.start()
+        identity = ClaimsIdentity({"aud": "bot"}, True)
+        for text in ("one", "two", "three"):
+            await processor.submit(make_activity(text), identity)
+
+        while len(adapter.texts) < 3:
+            await asyncio.sleep(0.01)
+        await processor.stop()
+
+        self.assertEqual(adapter.texts, ["one", "two", "three"])
+
+    async def test_journal_failures_do_not_stop_the_workers(self):
+        adapter = RecordingAdapter()
+        processor = self.make_processor(adapter, workers=1, journal=FailingRemoveQueue(self.path))
+        await processor.start()
+        identity = ClaimsIdentity({"aud": "bot"}, True)
+        for text in ("one", "two"):
+            await processor.submit(make_activity(text), identity)
+
+        while len(adapter.texts) < 2:
+            await asyncio.sleep(0.01)
+        await processor.stop()
+
+        self.assertEqual(adapter.texts, ["one", "two"])
+
+    async def test_journaled_turns_survive_a_restart(self):
+        processor = self.make_processor(RecordingAdapter(), workers=0)
+        await processor.start()
+        await processor.submit(make_activity("hello"), ClaimsIdentity({}, True))
+        await processor.stop()
+
+        adapter = RecordingAdapter()
+        restarted = self.make_processor(adapter)
+        await restarted.start()
+        await asyncio.wait_for(adapter.processed.wait(), 5)
+        await asyncio.sleep(0.05)
+        await restarted.stop()
+
+        self.assertEqual(adapter.texts, ["hello"])
+        journal = DurableTurnQueue(self.path)
+        await journal.open()
+        self.assertEqual(await journal.pending(), [])
+        await journal.close()
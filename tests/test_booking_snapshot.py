@@ -0,0 +1,124 @@
+import os
+import tempfile
+
+import aiounittest
+from botbuilder.core import ConversationState, MemoryStorage, NullTelemetryClient, UserState
+from botbuilder.core.adapters import TestAdapter
+
+from bots import DialogAndWelcomeBot
+from booking_snapshot import BookingSnapshotStore
+from dialogs import MainDialog, BookingDialog
+from local_recognizer import LocalFlightBookingRecognizer
+from write_behind_storage import SqliteStorage
+
+
+class RecordingTelemetryClient(NullTelemetryClient):
+    def __init__(self):
+        super().__init__()
+        self.metrics = []
+
+    def track_metric(self, name, value, tel_type=None, count=None, min_val=None,
+                     max_val=None, std_dev=None, properties=None):
+        self.metrics.append((name, value, properties))
+
+
+class BookingSnapshotTest(aiounittest.AsyncTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.recognizer = LocalFlightBookingRecognizer.from_luis_export(
+            "cognitiveModels/Flight Booking Chatbot.json"
+        )
+
+    def setUp(self):
+        self.storage = MemoryStorage()
+        self.telemetry = RecordingTelemetryClient()
+        self.adapter = self.make_adapter(self.storage, self.storage)
+
+    def make_adapter(self, conversation_storage, user_storage) -> TestAdapter:
+        user_state = UserState(user_storage)
+        snapshots = BookingSnapshotStore(user_state, self.telemetry)
+        dialog = MainDialog(
+            self.recognizer,
+            BookingDialog(luis_recognizer=self.recognizer, snapshots=snapshots),
+            snapshots=snapshots,
+        )
+        bot = DialogAndWelcomeBot(ConversationState(conversation_storage), user_state, dialog, None)
+        return TestAdapter(bot.on_turn)
+
+    def drop_conversation(self):
+        for key in [key for key in self.storage.memory if "/conversations/" in key]:
+            del self.storage.memory[key]
+
+    async def test_snapshots_in_the_user_store_survive_a_restart(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "users.sqlite3")
+            users = SqliteStorage(path)
+            step = await self.make_adapter(MemoryStorage(), users).test(
+                "Hey", "What can I help you with today?"
+            )
+            await step.test(
+                "I want to fly from Paris to London", "On what date would you like to travel?"
+            )
+            await users.close()
+
+            # A new process: the conversation state is gone, the user store is not.
+            restarted = SqliteStorage(path)
+            await self.make_adapter(MemoryStorage(), restarted).test(
+                "Hi again",
+                lambda activity, description: self.assertTrue(activity.text.startswith(
+                    "Welcome back! You did not finish booking a flight to London from Paris."
+                )),
+            )
+            await restarted.close()
+
+    async def test_resume_skips_filled_slots(self):
+        step = await self.adapter.test("Hey", "What can I help you with today?")
+        step = await step.test(
+            "I want to fly from Paris to London", "On what date would you like to travel?"
+        )
+        self.drop_conversation()
+
+        step = await step.test(
+            "Hi again",
+            lambda activity, description: self.assertTrue(activity.text.startswith(
+                "Welcome back! You did not finish booking a flight to London from Paris."
+            )),
+        )
+        step = await step.test("yes", "On what date would you like to travel?")
+        step = await step.send("cancel")
+        await step.assert_reply("Cancelling")
+        self.drop_conversation()
+
+        # Nothing left to resume once cancelled
+        await self.adapter.test("Hello", "What can I help you with today?")
+
+    async def test_declined_resume_starts_over(self):
+        step = await self.adapter.test("Hey", "What can I help you with today?")
+        step = await step.test("Book a flight to Berlin", "From what city will you be travelling?")
+        self.drop_conversation()
+
+        step = await step.test(
+            "Hi", lambda activity, description: self.assertIn("Berlin", activity.text)
+        )
+        await step.test("no", "What can I help you with today?")
+
+    async def test_turns_per_booking(self):
+        step = await self.adapter.test("Hey", "What can I help you with today?")
+        step = await step.test(
+            "I want to fly from Paris to London", "On what date would you like to travel?"
+        )
+        step = await step.test("June 12 2025", "On what date would you like to come back?")
+        self.drop_conversation()
+
+        step = await step.test("Hi", lambda activity, description: None)
+        step = await step.test("yes", "On what date would you like to come back?")
+        step = await step.test("June 20 2025", "What is your budget?")
+        step = await step.test("500 dollars", "For how many adult(s)?")
+        step = await step.test("2", "And how many child(ren)?")
+        step = await step.test("1", lambda activity, description: None)
+        await step.send("yes")
+
+        self.assertEqual(
+            [metric for metric in self.telemetry.metrics if metric[0] == "BookingTurns"],
+            [("BookingTurns", 6, {"resumed": "true", "completed": "true"})],
+        )
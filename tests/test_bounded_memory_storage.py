@@ -0,0 +1,70 @@
+import os
+import tempfile
+
+import aiounittest
+
+from bounded_memory_storage import BoundedMemoryStorage, SpillStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class BoundedMemoryStorageTest(aiounittest.AsyncTestCase):
+    async def test_idle_items_expire(self):
+        clock = FakeClock()
+        storage = BoundedMemoryStorage(ttl_seconds=60, clock=clock)
+        await storage.write({"idle": {"n": 1}, "active": {"n": 2}})
+
+        clock.now += 40
+        self.assertEqual(await storage.read(["active"]), {"active": {"n": 2}})
+        clock.now += 40
+        self.assertEqual(await storage.read(["idle", "active"]), {"active": {"n": 2}})
+        self.assertEqual(len(storage), 1)
+
+    async def test_least_recently_used_items_are_evicted(self):
+        storage = BoundedMemoryStorage(max_bytes=1)
+        await storage.write({"a": {"n": 1}})
+        await storage.write({"b": {"n": 2}})
+        self.assertEqual(await storage.read(["a", "b"]), {"b": {"n": 2}})
+
+        budget = storage.resident_bytes * 2
+        storage = BoundedMemoryStorage(max_bytes=budget)
+        await storage.write({"a": {"n": 1}, "b": {"n": 2}})
+        await storage.read(["a"])
+        await storage.write({"c": {"n": 3}})
+        self.assertEqual(set(await storage.read(["a", "b", "c"])), {"a", "c"})
+        self.assertLessEqual(storage.resident_bytes, budget)
+
+    async def test_evicted_items_are_read_back_from_spill(self):
+        with tempfile.TemporaryDirectory() as directory:
+            spill = SpillStore(os.path.join(directory, "spill.sqlite3"))
+            storage = BoundedMemoryStorage(max_bytes=1, spill=spill)
+            await storage.write({"a": {"n": 1}})
+            await storage.write({"b": {"n": 2}})
+            self.assertEqual(len(storage), 1)
+
+            self.assertEqual(await storage.read(["a"]), {"a": {"n": 1}})
+            self.assertEqual(await storage.read(["b"]), {"b": {"n": 2}})
+            await storage.delete(["a", "b"])
+            self.assertEqual(await storage.read(["a", "b"]), {})
+            await spill.close()
+
+    async def test_reads_return_copies(self):
+        storage = BoundedMemoryStorage()
+        await storage.write({"a": {"items": [1]}})
+        (await storage.read(["a"]))["a"]["items"].append(2)
+        self.assertEqual(await storage.read(["a"]), {"a": {"items": [1]}})
+
+    async def test_e_tag_conflict(self):
+        storage = BoundedMemoryStorage()
+        await storage.write({"a": {"n": 1, "e_tag": "*"}})
+        await storage.write({"a": {"n": 2, "e_tag": "*"}})
+        current = (await storage.read(["a"]))["a"]
+        with self.assertRaises(KeyError):
+            await storage.write({"a": {"n": 3, "e_tag": "stale"}})
+        await storage.write({"a": {"n": 3, "e_tag": current["e_tag"]}})
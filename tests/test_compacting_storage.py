@@ -0,0 +1,107 @@
+import aiounittest
+from botbuilder.core import ConversationState, MemoryStorage, MessageFactory, NullTelemetryClient
+from botbuilder.core.adapters import TestAdapter
+from botbuilder.dialogs import DialogSet, DialogState, DialogTurnStatus
+from botbuilder.dialogs.prompts import PromptOptions, TextPrompt
+
+from compacting_storage import CompactingStorage, StaticPromptRegistry
+
+
+class RecordingTelemetryClient(NullTelemetryClient):
+    def __init__(self):
+        super().__init__()
+        self.events = []
+        self.traces = []
+        self.metrics = []
+
+    def track_event(self, name, properties=None, measurements=None):
+        self.events.append(name)
+
+    def track_trace(self, name, properties=None, severity=None):
+        self.traces.append((name, properties, severity))
+
+    def track_metric(self, name, value, *args, **kwargs):
+        self.metrics.append(name)
+
+
+class CompactingStorageTest(aiounittest.AsyncTestCase):
+    def setUp(self):
+        self.registry = StaticPromptRegistry()
+        self.prompt = self.registry.register("name", MessageFactory.text("What is your name?"))
+        self.retry = self.registry.register("name_retry", MessageFactory.text("Your name, please?"))
+
+    def make_adapter(self, storage):
+        conversation_state = ConversationState(storage)
+        dialogs = DialogSet(conversation_state.create_property("dialog_state"))
+        dialogs.add(TextPrompt("text", lambda prompt_context: _is_long(prompt_context)))
+
+        async def logic(turn_context):
+            dialog_context = await dialogs.create_context(turn_context)
+            result = await dialog_context.continue_dialog()
+            if result.status == DialogTurnStatus.Empty:
+                await dialog_context.prompt(
+                    "text", PromptOptions(prompt=self.prompt, retry_prompt=self.retry)
+                )
+            elif result.status == DialogTurnStatus.Complete:
+                await turn_context.send_activity(f"Hello {result.result}")
+            await conversation_state.save_changes(turn_context)
+
+        return TestAdapter(logic)
+
+    def test_compact_round_trip(self):
+        storage = CompactingStorage(MemoryStorage(), self.registry)
+        unregistered = MessageFactory.text("Not static")
+        options = PromptOptions(prompt=self.prompt, retry_prompt=unregistered)
+
+        compacted = storage.compact({"options": options, "other": "kept"})
+        self.assertLess(CompactingStorage.size_of(compacted), CompactingStorage.size_of(options))
+        self.assertIs(options.prompt, self.prompt)
+
+        expanded = storage.expand(compacted)
+        self.assertEqual(expanded["other"], "kept")
+        self.assertIs(expanded["options"].prompt, self.prompt)
+        self.assertEqual(expanded["options"].retry_prompt.text, "Not static")
+        self.assertEqual(expanded["options"].number_of_attempts, 0)
+        self.assertIsNone(expanded["options"].choices)
+
+    async def test_prompt_survives_compaction(self):
+        memory = MemoryStorage()
+        adapter = self.make_adapter(CompactingStorage(memory, self.registry))
+
+        step = await adapter.test("hi", "What is your name?")
+        stored = next(iter(memory.memory.values()))["dialog_state"]
+        self.assertNotIn("Activity", repr(stored.dialog_stack[0].state))
+
+        step = await step.test("Al", "Your name, please?")
+        await step.test("Alice", "Hello Alice")
+
+    async def test_state_over_budget_drops_dialog_stack(self):
+        memory = MemoryStorage()
+        telemetry = RecordingTelemetryClient()
+        adapter = self.make_adapter(
+            CompactingStorage(memory, self.registry, max_state_bytes=1, telemetry_client=telemetry)
+        )
+
+        step = await adapter.test("hi", "What is your name?")
+        self.assertNotIn("dialog_state", next(iter(memory.memory.values())))
+        self.assertEqual(telemetry.events, ["StateBudgetExceeded"])
+        (name, properties, severity), = telemetry.traces
+        self.assertEqual(
+            (name, properties["dialogs"], severity), ("DialogStackDiscarded", "text", "WARNING")
+        )
+        # The conversation starts over
+        await step.test("Alice", "What is your name?")
+
+    async def test_savings_are_only_measured_on_sampled_writes(self):
+        telemetry = RecordingTelemetryClient()
+        storage = CompactingStorage(
+            MemoryStorage(), self.registry, telemetry_client=telemetry, savings_sample_every=3
+        )
+        for _ in range(6):
+            await storage.write({"key": {"value": 1}})
+        self.assertEqual(telemetry.metrics.count("StateBytes"), 6)
+        self.assertEqual(telemetry.metrics.count("StateBytesSaved"), 2)
+
+
+async def _is_long(prompt_context) -> bool:
+    return prompt_context.recognized.succeeded and len(prompt_context.recognized.value) > 2
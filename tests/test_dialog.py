@@ -82,7 +82,7 @@ class BotTest(aiounittest.AsyncTestCase):
         await disc8.assert_reply(
             "Just confirming, you are traveling from London to Sydney "
             "from 2023-03-01 to 2023-03-15 with 2 adult(s) "
-            "and 0 child(ren), and a budget of 800 $. Does this sound correct? (1) Yes or (2) No"
+            "and 0 child(ren), and a budget of 800 USD. Does this sound correct? (1) Yes or (2) No"
             ) # Bot
 
     async def test_flight_booking_missing_informations(self):
@@ -105,7 +105,7 @@ class BotTest(aiounittest.AsyncTestCase):
         await disc3.assert_reply(
             "Just confirming, you are traveling from Paris to Tijuana "
             "from 2023-08-10 to 2023-08-15 with 2 adult(s) "
-            "and 1 child(ren), and a budget of 1500 $. Does this sound correct? (1) Yes or (2) No"
+            "and 1 child(ren), and a budget of 1,500 USD. Does this sound correct? (1) Yes or (2) No"
             ) # Bot
         
     async def test_bot_help(self):
@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+import aiounittest
+from botbuilder.core import IntentScore, RecognizerResult
+from botbuilder.schema import Activity, ChannelAccount
+
+from config import DefaultConfig
+from flight_booking_recognizer import FlightBookingRecognizer
+from recognizer_quota import RecognizerQuota
+
+
+class LuisConfig(DefaultConfig):
+    LUIS_APP_ID = "00000000-0000-0000-0000-000000000000"
+    LUIS_API_KEY = "00000000000000000000000000000000"
+    LUIS_API_HOST_NAME = "westeurope.api.cognitive.microsoft.com"
+    LUIS_HEDGE_INITIAL_DELAY_MS = 50
+
+
+class FakeEndpoint:
+    def __init__(self, name, latency):
+        self.name = name
+        self.latency = latency
+
+    def resolve(self, utterance):
+        time.sleep(self.latency)
+        return RecognizerResult(
+            text=utterance, intents={self.name: IntentScore(1.0)}, entities={}
+        )
+
+
+class FakeContext:
+    def __init__(self, text):
+        self.activity = Activity(
+            type="message", text=text, from_property=ChannelAccount(id="user")
+        )
+        self.turn_state = {}
+
+
+class FlightBookingRecognizerTest(aiounittest.AsyncTestCase):
+    def make_recognizer(self, primary_latency, secondary_latency):
+        recognizer = FlightBookingRecognizer(LuisConfig)
+        recognizer._endpoints = [
+            FakeEndpoint("primary", primary_latency),
+            FakeEndpoint("secondary", secondary_latency),
+        ]
+        return recognizer
+
+    async def test_fast_primary_is_not_hedged(self):
+        recognizer = self.make_recognizer(0.0, 0.0)
+        result = await recognizer.recognize(FakeContext("to Paris"))
+        self.assertIn("primary", result.intents)
+        self.assertEqual(recognizer.stats["hedged"], 0)
+
+    async def test_slow_primary_is_hedged_and_hedge_wins(self):
+        recognizer = self.make_recognizer(0.5, 0.0)
+        result = await recognizer.recognize(FakeContext("to Paris"))
+        self.assertIn("secondary", result.intents)
+        self.assertEqual(recognizer.stats["hedged"], 1)
+        self.assertEqual(recognizer.stats["hedge_wins"], 1)
+
+    async def test_no_hedge_without_a_secondary_endpoint(self):
+        recognizer = self.make_recognizer(0.2, 0.0)
+        recognizer._endpoints = recognizer._endpoints[:1]
+        result = await recognizer.recognize(FakeContext("to Paris"))
+        self.assertIn("primary", result.intents)
+        self.assertEqual(recognizer.stats["hedged"], 0)
+
+    async def test_hedges_are_charged_to_the_global_budget(self):
+        recognizer = self.make_recognizer(0.2, 0.0)
+        recognizer.quota = RecognizerQuota(tps=0.001, tps_burst=1)
+        recognizer.quota.global_bucket.take()
+        result = await recognizer.recognize(FakeContext("to Paris"))
+        self.assertIn("primary", result.intents)
+        self.assertEqual(recognizer.stats["hedged"], 0)
+        self.assertEqual(recognizer.stats["hedges_over_quota"], 1)
+
+    async def test_deadline_is_enforced(self):
+        recognizer = self.make_recognizer(0.5, 0.5)
+        with self.assertRaises(asyncio.TimeoutError):
+            await recognizer.recognize(
+                FakeContext("to Paris"), deadline=time.monotonic() + 0.1
+            )
+        self.assertEqual(recognizer.stats["deadline_exceeded"], 1)
+
+    async def test_close_waits_for_recognitions_in_flight(self):
+        recognizer = self.make_recognizer(0.2, 0.0)
+        recognizer._endpoints = recognizer._endpoints[:1]
+        turn = asyncio.ensure_future(recognizer.recognize(FakeContext("to Paris")))
+        await asyncio.sleep(0.05)
+        recognizer.close()
+        # A turn that got the recognizer before it was closed still recognizes.
+        late = await recognizer.recognize(FakeContext("to Berlin"))
+        self.assertIn("primary", (await turn).intents)
+        self.assertIn("primary", late.intents)
+        self.assertIsNone(recognizer._executor)
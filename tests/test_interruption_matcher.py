@@ -0,0 +1,63 @@
+import unittest
+
+from botbuilder.core import TurnContext
+from botbuilder.core.adapters import TestAdapter
+from botbuilder.schema import Activity, ActivityTypes
+
+from dialogs.cancel_and_help_dialog import interruption_of
+from dialogs.interruption_matcher import InterruptionMatcher
+from dialogs.message_catalog import CATALOG_KEY, MESSAGES
+
+
+class InterruptionMatcherTest(unittest.TestCase):
+    def test_phrases_match_the_whole_utterance(self):
+        matcher = MESSAGES.interruptions
+        self.assertEqual(matcher.match("HELP"), "help")
+        self.assertEqual(matcher.match("can you help me?"), "help")
+        self.assertEqual(matcher.match("Ok, never   mind!"), "cancel")
+        self.assertEqual(matcher.match("forget it please"), "cancel")
+        self.assertIsNone(matcher.match("that was helpful"))
+        self.assertIsNone(matcher.match("I want to fly to Quito"))
+        self.assertIsNone(matcher.match(None))
+
+    def test_phrases_inside_a_request_do_not_match(self):
+        matcher = MESSAGES.interruptions
+        for text in (
+            "I want to quit my job and fly to Paris",
+            "Cancel my Paris trip and book London instead",
+            "help me book a flight to Paris on June 5",
+            "Never mind, I'll book later",
+        ):
+            self.assertIsNone(matcher.match(text), text)
+
+    def test_symbols_only_match_the_whole_utterance(self):
+        self.assertEqual(MESSAGES.interruptions.match(" ? "), "help")
+        self.assertIsNone(MESSAGES.interruptions.match("June 5?"))
+
+
+class CountingMatcher(InterruptionMatcher):
+    def __init__(self):
+        super().__init__({"cancel": ["cancel"]}, ["please"])
+        self.calls = 0
+
+    def match(self, text):
+        self.calls += 1
+        return super().match(text)
+
+
+class InterruptionOfTest(unittest.TestCase):
+    def test_matched_once_per_turn(self):
+        matcher = CountingMatcher()
+        catalog = type("Catalog", (), {"interruptions": matcher})()
+        context = TurnContext(
+            TestAdapter(), Activity(type=ActivityTypes.message, text="cancel please")
+        )
+        context.turn_state[CATALOG_KEY] = catalog
+
+        self.assertEqual(interruption_of(context), "cancel")
+        self.assertEqual(interruption_of(context), "cancel")
+        self.assertEqual(matcher.calls, 1)
+
+    def test_activity_without_text(self):
+        context = TurnContext(TestAdapter(), Activity(type=ActivityTypes.message, text=None))
+        self.assertIsNone(interruption_of(context))
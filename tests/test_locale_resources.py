@@ -0,0 +1,130 @@
+import asyncio
+
+import aiounittest
+from botbuilder.core import ConversationState, IntentScore, MemoryStorage, RecognizerResult, TurnContext
+from botbuilder.core.adapters import TestAdapter
+from botbuilder.dialogs import DialogSet, DialogTurnStatus
+from botbuilder.schema import Activity, ChannelAccount, ConversationAccount
+
+from compacting_storage import STATIC_PROMPTS
+from dialogs import MainDialog, BookingDialog
+from dialogs.message_catalog import CATALOGS
+from locale_resources import LocaleCache, LocaleRecognizer, resolve_locale
+
+
+class StubRecognizer:
+    def __init__(self, intent):
+        self.intent = intent
+        self.is_configured = True
+        self.calls = 0
+
+    async def recognize(self, turn_context: TurnContext) -> RecognizerResult:
+        self.calls += 1
+        return RecognizerResult(
+            text=turn_context.activity.text,
+            intents={self.intent: IntentScore(0.9)},
+            entities={"$instance": {}},
+        )
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class LocaleCacheTest(aiounittest.AsyncTestCase):
+    def test_resolve_locale(self):
+        available = ["en-US", "fr-FR"]
+        self.assertEqual(resolve_locale("fr-fr", available, "en-US"), "fr-FR")
+        self.assertEqual(resolve_locale("fr_CA", available, "en-US"), "fr-FR")
+        self.assertEqual(resolve_locale("de-DE", available, "en-US"), "en-US")
+        self.assertEqual(resolve_locale(None, available, "en-US"), "en-US")
+
+    async def test_lru_and_idle_eviction(self):
+        clock = FakeClock()
+        loads, evicted = [], []
+        cache = LocaleCache(
+            lambda locale: loads.append(locale) or locale.upper(),
+            "en-US",
+            max_resident=3,
+            idle_seconds=60,
+            on_evict=lambda locale, resource: evicted.append(resource),
+            clock=clock,
+        )
+
+        self.assertEqual(cache.get("fr-FR"), "FR-FR")
+        self.assertEqual(await cache.get_async("de-DE"), "DE-DE")
+        cache.get("fr-FR")
+        cache.get("es-ES")
+        self.assertEqual(evicted, ["DE-DE"])
+        self.assertEqual(cache.resident, ["en-US", "fr-FR", "es-ES"])
+
+        clock.now = 61
+        self.assertEqual(cache.get("en-US"), "EN-US")
+        cache.get("it-IT")
+        self.assertEqual(evicted, ["DE-DE", "FR-FR", "ES-ES"])
+        self.assertEqual(loads, ["en-US", "fr-FR", "de-DE", "es-ES", "it-IT"])
+
+    async def test_concurrent_loads_are_shared(self):
+        loads = []
+        cache = LocaleCache(lambda locale: loads.append(locale) or object(), "en-US")
+        first, second = await asyncio.gather(cache.get_async("fr-FR"), cache.get_async("fr-FR"))
+        self.assertIs(first, second)
+        self.assertEqual(loads, ["en-US", "fr-FR"])
+
+    def test_evicted_catalog_prompts_still_resolve(self):
+        prompt = CATALOGS.get("fr-FR").activity("booking.budget")
+        self.assertIs(STATIC_PROMPTS.get("fr-FR:booking.budget"), prompt)
+
+        CATALOGS.evict("fr-FR")
+        self.assertEqual(STATIC_PROMPTS.get("fr-FR:booking.budget").text, "Quel est votre budget ?")
+        self.assertEqual(STATIC_PROMPTS.get("booking.budget").text, "What is your budget?")
+
+
+class LocaleRoutingTest(aiounittest.AsyncTestCase):
+    def make_adapter(self, main_dialog, locale):
+        conversation_state = ConversationState(MemoryStorage())
+        dialogs = DialogSet(conversation_state.create_property("dialog_state"))
+        dialogs.add(main_dialog)
+
+        async def logic(turn_context):
+            dialog_context = await dialogs.create_context(turn_context)
+            result = await dialog_context.continue_dialog()
+            if result.status == DialogTurnStatus.Empty:
+                await dialog_context.begin_dialog(main_dialog.id)
+            await conversation_state.save_changes(turn_context)
+
+        return TestAdapter(logic, Activity(
+            channel_id="test",
+            locale=locale,
+            from_property=ChannelAccount(id="user"),
+            recipient=ChannelAccount(id="bot"),
+            conversation=ConversationAccount(id=f"conversation-{locale}"),
+        ))
+
+    async def test_turns_use_their_locale(self):
+        english, french = StubRecognizer("None"), StubRecognizer("None")
+        recognizer = LocaleRecognizer(
+            LocaleCache({"en-US": english, "fr-FR": french}.get, "en-US"), ["en-US", "fr-FR"]
+        )
+        main_dialog = MainDialog(recognizer, BookingDialog(luis_recognizer=recognizer))
+
+        step = await self.make_adapter(main_dialog, "fr-CA").test(
+            "Salut", "Que puis-je faire pour vous aujourd'hui ?"
+        )
+        await step.test(
+            "quel temps fait-il ?",
+            "Désolé, je suis programmé pour réserver des vols. "
+            "Veuillez exprimer clairement votre demande.",
+        )
+        step = await self.make_adapter(main_dialog, "de-DE").test(
+            "Hallo", "What can I help you with today?"
+        )
+        await step.test(
+            "wie ist das Wetter?",
+            "Sorry, I'm programmed to book flights. Please try to express your intent clearly.",
+        )
+        self.assertEqual((english.calls, french.calls), (1, 1))
@@ -0,0 +1,47 @@
+import asyncio
+import json
+import time
+import traceback
+
+import aiounittest
+
+from loop_watchdog import LagHistogram, LoopWatchdog
+
+
+def parse_large_card():
+    # Synchronous work on the loop, like an uncached json.load in a dialog step
+    time.sleep(0.3)
+
+
+class LoopWatchdogTest(aiounittest.AsyncTestCase):
+    def test_histogram_percentiles(self):
+        histogram = LagHistogram((1, 10, 100))
+        for lag in [0.5] * 98 + [50, 700]:
+            histogram.add(lag)
+        self.assertEqual(histogram.percentile(50), 1)
+        self.assertEqual(histogram.percentile(99), 100)
+        self.assertEqual(histogram.percentile(100), 700)
+        self.assertEqual(histogram.to_dict()["buckets_ms"], {"<=1": 98, "<=10": 0, "<=100": 1, ">100": 1})
+
+    async def test_stall_is_attributed_to_the_blocking_function(self):
+        watchdog = LoopWatchdog(interval_seconds=0.01, stall_seconds=0.1)
+        await watchdog.start()
+        await asyncio.sleep(0.05)
+        parse_large_card()
+        await asyncio.sleep(0.05)
+        await watchdog.stop()
+
+        self.assertEqual(len(watchdog.stalls), 1)
+        stall = watchdog.stalls[0]
+        self.assertTrue(stall["location"].endswith("test_loop_watchdog.py:parse_large_card"))
+        self.assertIn("test_stall_is_attributed_to_the_blocking_function", stall["stack"])
+        self.assertGreaterEqual(watchdog.histogram.max_ms, 250)
+
+    async def test_stacks_are_not_served(self):
+        watchdog = LoopWatchdog()
+        watchdog._report_stall(traceback.extract_stack(), 0.5)  # pylint: disable=protected-access
+        response = await watchdog.lag_handler(None)
+        (stall,) = json.loads(response.text)["stalls"]
+        self.assertNotIn("stack", stall)
+        self.assertEqual(stall["blocked_ms"], 500.0)
+        self.assertIn("stack", watchdog.stalls[0])
@@ -0,0 +1,58 @@
+import aiounittest
+from botbuilder.core import ConversationState, IntentScore, MemoryStorage, RecognizerResult, TurnContext
+from botbuilder.core.adapters import TestAdapter
+from botbuilder.dialogs import DialogSet, DialogTurnStatus
+
+from dialogs import MainDialog, BookingDialog
+
+
+class StubRecognizer:
+    """Answers every utterance with a fixed intent."""
+
+    def __init__(self, intent):
+        self.intent = intent
+        self.is_configured = True
+
+    async def recognize(self, turn_context: TurnContext) -> RecognizerResult:
+        return RecognizerResult(
+            text=turn_context.activity.text,
+            intents={self.intent: IntentScore(0.9)},
+            entities={"$instance": {}},
+        )
+
+
+class MainDialogTest(aiounittest.AsyncTestCase):
+    def make_adapter(self, main_dialog):
+        conversation_state = ConversationState(MemoryStorage())
+        dialogs = DialogSet(conversation_state.create_property("dialog_state"))
+        dialogs.add(main_dialog)
+
+        async def logic(turn_context):
+            dialog_context = await dialogs.create_context(turn_context)
+            result = await dialog_context.continue_dialog()
+            if result.status == DialogTurnStatus.Empty:
+                await dialog_context.begin_dialog(main_dialog.id)
+            await conversation_state.save_changes(turn_context)
+
+        return TestAdapter(logic)
+
+    async def test_canned_intent_reply(self):
+        adapter = self.make_adapter(MainDialog(StubRecognizer("Communication_Cancel"), BookingDialog()))
+        step = await adapter.test("Hey!", "What can I help you with today?")
+        await step.test("forget it", "See you soon!")
+
+    async def test_unknown_intent_falls_back(self):
+        adapter = self.make_adapter(MainDialog(StubRecognizer("GetWeather"), BookingDialog()))
+        step = await adapter.test("Hey!", "What can I help you with today?")
+        await step.test(
+            "weather in Paris?",
+            "Sorry, I didn't get that. Please try asking in a different way. "
+            "(Press a key to restart the bot)",
+        )
+
+    async def test_registered_intent(self):
+        main_dialog = MainDialog(StubRecognizer("GetWeather"), BookingDialog())
+        main_dialog.register_intent("GetWeather", "I can only book flights.", "Weather")
+        adapter = self.make_adapter(main_dialog)
+        step = await adapter.test("Hey!", "What can I help you with today?")
+        await step.test("weather in Paris?", "I can only book flights.")
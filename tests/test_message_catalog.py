@@ -0,0 +1,53 @@
+import json
+import os
+import tempfile
+import unittest
+
+from botbuilder.schema import InputHints
+
+from compacting_storage import StaticPromptRegistry
+from dialogs.message_catalog import MESSAGES, MessageCatalog
+
+
+class MessageCatalogTest(unittest.TestCase):
+    def test_static_activities_are_shared(self):
+        first = MESSAGES.prompt_options("booking.budget", "booking.budget_retry")
+        second = MESSAGES.prompt_options("booking.budget", "booking.budget_retry")
+
+        self.assertIsNot(first, second)
+        self.assertIs(first.prompt, second.prompt)
+        self.assertIs(first.retry_prompt, second.retry_prompt)
+        self.assertEqual(first.prompt.input_hint, InputHints.expecting_input)
+        self.assertEqual(MESSAGES.activity("booking.failed").input_hint, InputHints.ignoring_input)
+
+    def test_render_parameterized_message(self):
+        options = MESSAGES.prompt_options(
+            "booking.confirm", or_city="Paris", dst_city="London", str_date="2025-06-12",
+            end_date="2025-06-20", n_adults=2, n_children=1, budget="500 dollars",
+        )
+        self.assertEqual(
+            options.prompt.text,
+            "Just confirming, you are traveling from Paris to London from 2025-06-12 to "
+            "2025-06-20 with 2 adult(s) and 1 child(ren), and a budget of 500 dollars. "
+            "Does this sound correct?",
+        )
+        with self.assertRaises(KeyError):
+            MESSAGES.text("main.unsupported_airports")
+
+    def test_load_checks_placeholders_and_registers_prompts(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "xx.json")
+            with open(path, "w", encoding="utf-8") as catalog_file:
+                json.dump({"prompts": {"ask": "Name?", "hello": "Hi {name}, {{'{name}'}}"},
+                           "replies": {"bye": "Bye"}}, catalog_file)
+            registry = StaticPromptRegistry()
+            catalog = MessageCatalog.load("xx", directory, registry)
+
+            self.assertIs(registry.get("xx:ask"), catalog.activity("ask"))
+            self.assertIsNone(registry.id_of(catalog.activity("bye")))
+            self.assertEqual(catalog.text("hello", name="Ann"), "Hi Ann, {'Ann'}")
+
+            with open(path, "w", encoding="utf-8") as catalog_file:
+                json.dump({"prompts": {"bad": "Hi {name!r}"}}, catalog_file)
+            with self.assertRaises(ValueError):
+                MessageCatalog.load("xx", directory, StaticPromptRegistry())
@@ -0,0 +1,131 @@
+import asyncio
+import os
+import struct
+import tempfile
+import unittest
+from hashlib import blake2b
+
+import aiounittest
+
+from local_recognizer import LocalFlightBookingModel, numpy, tokenize
+from model_artifact import (
+    ArtifactError,
+    ArtifactReloader,
+    compile_artifact,
+    current_artifact,
+    load_artifact,
+    serialize,
+    write_artifact,
+)
+
+MODEL_PATH = "cognitiveModels/Flight Booking Chatbot.json"
+UTTERANCES = ("book a flight from Paris to Berlin on May 5th for 2 adults", "help", "cancel that")
+
+
+def with_vocabularies(data: bytes, vocabularies: bytes) -> bytes:
+    """`data` with other vocabularies, under a header and version that match them."""
+    header = struct.Struct("<4sIIIQQ16s")
+    fields = list(header.unpack_from(data))
+    numbers = data[header.size:fields[4]]
+    fields[5] = len(vocabularies)
+    fields[6] = blake2b(numbers + vocabularies, digest_size=8).hexdigest().encode("ascii")
+    return header.pack(*fields) + numbers + vocabularies
+
+
+class ModelArtifactTest(aiounittest.AsyncTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.trained = LocalFlightBookingModel.from_luis_export(MODEL_PATH)
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_mapped_model_predicts_like_the_trained_one(self):
+        path = compile_artifact(MODEL_PATH, self.directory.name)
+        self.assertEqual(current_artifact(self.directory.name, "Flight Booking Chatbot"), path)
+        self.assertEqual(compile_artifact(MODEL_PATH, self.directory.name), path)
+
+        mapped = load_artifact(path)
+        self.assertEqual(len(mapped.version), 16)
+        for text in UTTERANCES:
+            expected, actual = self.trained.predict(text), mapped.predict(text)
+            self.assertEqual(actual.intents.keys(), expected.intents.keys())
+            self.assertEqual(
+                actual.get_top_scoring_intent().score, expected.get_top_scoring_intent().score
+            )
+            self.assertEqual(actual.entities, expected.entities)
+
+    @unittest.skipUnless(numpy, "NumPy is not installed")
+    def test_vectorized_scoring_reads_the_mapped_weights_in_place(self):
+        mapped = load_artifact(compile_artifact(MODEL_PATH, self.directory.name))
+        token_lists = [[token for token, _, _ in tokenize(text)] for text in UTTERANCES]
+        for actual, expected in zip(
+            mapped.score_intents_batch(token_lists), self.trained.score_intents_batch(token_lists)
+        ):
+            for actual_score, expected_score in zip(actual, expected):
+                self.assertAlmostEqual(actual_score, expected_score)
+        weights = mapped._arrays[1]  # pylint: disable=protected-access
+        self.assertFalse(weights.flags.owndata)
+        self.assertFalse(weights.flags.writeable)
+
+    async def test_a_new_version_is_swapped_in(self):
+        reloader = ArtifactReloader(self.directory.name)
+        recognizer = reloader.load(MODEL_PATH)
+        first = recognizer.model
+        self.assertEqual(reloader.check(), 0)
+
+        retrained = LocalFlightBookingModel.from_luis_export(MODEL_PATH)
+        retrained.cities = dict(retrained.cities, gotham=1)
+        write_artifact(retrained, self.directory.name, "Flight Booking Chatbot")
+        self.assertEqual(reloader.check(), 1)
+        self.assertNotEqual(recognizer.model.version, first.version)
+        result = recognizer.model.predict("fly to gotham")
+        self.assertEqual(result.entities["dst_city"], ["gotham"])
+        # Predictions that started with the old model still work.
+        self.assertEqual(first.predict("help").text, "help")
+
+    def test_other_files_are_rejected(self):
+        path = os.path.join(self.directory.name, "model.lfbm")
+        with open(path, "wb") as artifact:
+            artifact.write(b"not a model" * 10)
+        with self.assertRaises(ArtifactError):
+            load_artifact(path)
+
+    def write(self, data: bytes) -> str:
+        path = os.path.join(self.directory.name, "model.lfbm")
+        with open(path, "wb") as artifact:
+            artifact.write(data)
+        return path
+
+    def test_damaged_artifacts_are_rejected(self):
+        data = serialize(self.trained)
+        flipped = bytearray(data)
+        flipped[len(data) // 2] ^= 1
+        for damaged in (
+            b"",
+            data[:-1],
+            bytes(flipped),
+            with_vocabularies(data, b"{not json"),
+            with_vocabularies(data, b'{"intents":[]}'),
+            with_vocabularies(data, b'{"intents":1,"cities":{},"city_cues":{},"culture":"en-us"}'),
+        ):
+            with self.assertRaises(ArtifactError):
+                load_artifact(self.write(damaged))
+        self.assertEqual(load_artifact(self.write(data)).intents, self.trained.intents)
+
+    async def test_a_damaged_artifact_is_not_swapped_in(self):
+        reloader = ArtifactReloader(self.directory.name, interval_seconds=0.01)
+        recognizer = reloader.load(MODEL_PATH)
+        first = recognizer.model
+        pointer_path = os.path.join(self.directory.name, "Flight Booking Chatbot.current")
+        with open(pointer_path, "w", encoding="utf-8") as pointer:
+            pointer.write(os.path.basename(self.write(b"LFBM" + bytes(100))))
+
+        await reloader.start()
+        await asyncio.sleep(0.05)
+        self.assertFalse(reloader._task.done())  # pylint: disable=protected-access
+        await reloader.stop()
+        self.assertIs(recognizer.model, first)
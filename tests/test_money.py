@@ -0,0 +1,101 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import aiounittest
+
+from booking_details import BookingDetails
+from money import Money, RateRefresher, RateTable, budget_from_entities, parse_money
+
+
+class ParseMoneyTest(unittest.TestCase):
+    def test_amounts_and_currencies(self):
+        cases = {
+            "I only have a budget of 800$, I hope it's enough": Money(800, "USD"),
+            "500 dollars": Money(500, "USD"),
+            "€1,500": Money(1500, "EUR"),
+            "1.500,50 EUR": Money(1500.5, "EUR"),
+            "around 2k usd": Money(2000, "USD"),
+            "$ 1 200": Money(1200, "USD"),
+            "12.5 pounds": Money(12.5, "GBP"),
+            "1.500 €": Money(1500, "EUR"),
+            "€2.000": Money(2000, "EUR"),
+            "12.345 $": Money(12345, "USD"),
+        }
+        for text, money in cases.items():
+            self.assertEqual(parse_money(text), money, text)
+
+    def test_bare_amounts_need_a_default_currency(self):
+        self.assertIsNone(parse_money("about 900"))
+        self.assertEqual(parse_money("about 900", "EUR"), Money(900, "EUR"))
+        self.assertIsNone(parse_money("no idea", "EUR"))
+
+    def test_luis_money_entity_wins_inside_the_budget_span(self):
+        entities = {
+            "money": [{"number": 800, "units": "Dollar"}],
+            "budget": ["800 $"],
+            "$instance": {
+                "money": [{"startIndex": 24, "endIndex": 29, "text": "800 $"}],
+                "budget": [{"startIndex": 24, "endIndex": 29, "text": "800 $"}],
+            },
+        }
+        self.assertEqual(budget_from_entities(entities, "EUR"), Money(800, "USD"))
+        entities["$instance"]["budget"] = [{"startIndex": 0, "endIndex": 3, "text": "900"}]
+        self.assertEqual(budget_from_entities(entities, "EUR"), Money(900, "EUR"))
+
+
+class RateTableTest(unittest.TestCase):
+    def test_conversion_and_display(self):
+        rates = RateTable("EUR", {"USD": 1.08})
+        details = BookingDetails()
+        details.set_budget(Money(540, "USD"), rates)
+
+        self.assertEqual(details.budget, 500.0)
+        self.assertEqual(details.summary()["budget"], "540 USD")
+        self.assertIsNone(rates.to_base(Money(10, "XYZ")))
+
+    def test_refresh_rebases_and_caches(self):
+        with tempfile.TemporaryDirectory() as directory:
+            bundled = os.path.join(directory, "rates.json")
+            cache = os.path.join(directory, "rates.cache.json")
+            with open(bundled, "w", encoding="utf-8") as rates_file:
+                json.dump({"base": "EUR", "updated": 100, "rates": {"USD": 1.0}}, rates_file)
+            rates = RateTable.load(bundled, cache, url="http://rates", clock=lambda: 200000)
+            self.assertTrue(rates.is_stale)
+
+            response = mock.MagicMock()
+            response.__enter__.return_value.read.return_value = json.dumps(
+                {"base": "USD", "rates": {"EUR": 0.5, "GBP": 0.4}}
+            ).encode()
+            with mock.patch("urllib.request.urlopen", return_value=response):
+                rates.refresh()
+
+            self.assertEqual(rates.rates, {"EUR": 1.0, "GBP": 0.8, "USD": 2.0})
+            self.assertFalse(rates.is_stale)
+            reloaded = RateTable.load(bundled, cache)
+            self.assertEqual((reloaded.updated, reloaded.rates), (200000, rates.rates))
+
+
+
+class RateRefresherTest(aiounittest.AsyncTestCase):
+    async def test_stale_rates_are_refreshed_in_the_background(self):
+        now = [100.0]
+        rates = RateTable("EUR", {"USD": 1.0}, 100, url="http://rates", clock=lambda: now[0])
+        refresher = RateRefresher(rates, interval_seconds=0.01)
+
+        def refresh():
+            rates.rates = {"EUR": 1.0, "USD": 2.0}
+            rates.updated = now[0]
+
+        with mock.patch.object(rates, "refresh", side_effect=refresh) as fetched:
+            self.assertFalse(await refresher.check())
+            await refresher.start()
+            now[0] += 86401
+            await asyncio.sleep(0.05)
+            await refresher.stop()
+
+        self.assertEqual(fetched.call_count, 1)
+        self.assertEqual(rates.rates["USD"], 2.0)
@@ -0,0 +1,52 @@
+import aiounittest
+from botbuilder.core import TurnContext
+from botbuilder.core.adapters import TestAdapter
+from botbuilder.dialogs.prompts import ConfirmPrompt, DateTimePrompt, NumberPrompt
+from botbuilder.schema import Activity, ActivityTypes
+
+from dialogs.custom_prompts import (
+    SharedModelConfirmPrompt,
+    SharedModelDateTimePrompt,
+    SharedModelNumberPrompt,
+)
+from prompt_models import culture_of, iso_date, plain_integer, prompt_models
+
+
+async def recognize(prompt, text, locale="en-US"):
+    context = TurnContext(
+        TestAdapter(), Activity(type=ActivityTypes.message, text=text, locale=locale)
+    )
+    result = await prompt.on_recognize(context, {}, None)
+    value = result.value
+    if isinstance(value, list):
+        value = [(resolution.timex, resolution.value) for resolution in value]
+    return result.succeeded, value
+
+
+class PromptModelsTest(aiounittest.AsyncTestCase):
+    def test_models_are_shared_per_culture(self):
+        self.assertEqual(culture_of("fr-CA"), "fr-fr")
+        self.assertEqual(culture_of(None), "en-us")
+        self.assertIs(prompt_models("en-US"), prompt_models("en-GB"))
+
+    def test_fast_paths(self):
+        self.assertEqual(plain_integer(" 2 "), 2)
+        self.assertIsNone(plain_integer("2 adults"))
+        self.assertEqual(iso_date("2025-06-12"), "2025-06-12")
+        self.assertIsNone(iso_date("2025-02-30"))
+
+    async def test_same_results_as_the_stock_prompts(self):
+        cases = (
+            (NumberPrompt("n"), SharedModelNumberPrompt("n"), ("2", "two adults", "none")),
+            (
+                DateTimePrompt("d"),
+                SharedModelDateTimePrompt("d"),
+                ("2025-06-12", "June 20 2025", "no idea"),
+            ),
+            (ConfirmPrompt("c"), SharedModelConfirmPrompt("c"), ("yes", "nope", "1", "2", "maybe")),
+        )
+        for stock, shared, utterances in cases:
+            for text in utterances:
+                self.assertEqual(
+                    await recognize(shared, text), await recognize(stock, text), text
+                )
@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import unittest
+
+import aiounittest
+from botbuilder.schema import Activity, ConversationAccount
+
+from local_recognizer import (
+    LocalFlightBookingModel,
+    LocalFlightBookingRecognizer,
+    numpy,
+    tokenize,
+)
+from recognition_batcher import RecognitionBatcher
+
+UTTERANCES = [
+    "I want to fly from Paris to London",
+    "book a flight to Berlin for 2 adults",
+    "help",
+    "cancel",
+]
+
+
+class FakeContext:
+    def __init__(self, text):
+        self.activity = Activity(type="message", text=text, conversation=ConversationAccount(id="c"))
+
+
+class RecognitionBatcherTest(aiounittest.AsyncTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.model = LocalFlightBookingModel.from_luis_export(
+            "cognitiveModels/Flight Booking Chatbot.json"
+        )
+
+    async def test_concurrent_recognitions_share_a_batch(self):
+        recognizer = LocalFlightBookingRecognizer(
+            self.model, batch_window_seconds=0.01, executor_batch_size=len(UTTERANCES) + 1
+        )
+        results = await asyncio.gather(
+            *(recognizer.recognize(FakeContext(text)) for text in UTTERANCES)
+        )
+        self.assertEqual(recognizer.batcher.sizes, {len(UTTERANCES): 1})
+        for text, result in zip(UTTERANCES, results):
+            alone = self.model.predict(text)
+            self.assertEqual(result.text, text)
+            self.assertEqual(result.get_top_scoring_intent(), alone.get_top_scoring_intent())
+            self.assertEqual(result.entities, alone.entities)
+
+    async def test_full_batches_do_not_wait_for_the_window(self):
+        batcher = RecognitionBatcher(
+            lambda texts: [text.upper() for text in texts], window_seconds=60, max_batch_size=2
+        )
+        self.assertEqual(
+            await asyncio.gather(batcher.predict("a"), batcher.predict("b")), ["A", "B"]
+        )
+        self.assertEqual(batcher.sizes, {2: 1})
+
+    async def test_prediction_errors_reach_every_caller(self):
+        def fail(texts):
+            raise RuntimeError("model")
+
+        batcher = RecognitionBatcher(fail, window_seconds=0.001)
+        results = await asyncio.gather(
+            batcher.predict("a"), batcher.predict("b"), return_exceptions=True
+        )
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+
+    async def test_large_batches_run_in_the_executor(self):
+        threads = []
+
+        def predict_batch(texts):
+            threads.append(threading.current_thread())
+            return [text.upper() for text in texts]
+
+        batcher = RecognitionBatcher(
+            predict_batch, window_seconds=0.001, max_batch_size=8, executor_batch_size=2
+        )
+        self.assertEqual(await batcher.predict("a"), "A")
+        self.assertEqual(
+            await asyncio.gather(batcher.predict("b"), batcher.predict("c")), ["B", "C"]
+        )
+        self.assertIs(threads[0], threading.current_thread())
+        self.assertIsNot(threads[1], threading.current_thread())
+        self.assertEqual(batcher.sizes, {1: 1, 2: 1})
+
+    @unittest.skipUnless(numpy, "NumPy is not installed")
+    def test_vectorized_scores_match_the_scalar_ones(self):
+        token_lists = [[token for token, _, _ in tokenize(text)] for text in UTTERANCES + [""]]
+        for vectorized, scalar in zip(
+            self.model.score_intents_batch(token_lists),
+            [self.model.score_intents(tokens) for tokens in token_lists],
+        ):
+            for vectorized_score, scalar_score in zip(vectorized, scalar):
+                self.assertAlmostEqual(vectorized_score, scalar_score)
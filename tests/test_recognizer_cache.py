@@ -0,0 +1,84 @@
+import aiounittest
+from botbuilder.schema import Activity, ConversationAccount
+
+from local_recognizer import LocalFlightBookingRecognizer
+from recognizer_cache import NearDuplicateIndex, NearDuplicateRecognizer, _Entry
+
+
+class FakeContext:
+    def __init__(self, text):
+        self.activity = Activity(type="message", text=text, conversation=ConversationAccount(id="c"))
+
+
+class CountingRecognizer(LocalFlightBookingRecognizer):
+    calls = 0
+
+    async def recognize(self, turn_context):
+        self.calls += 1
+        return await super().recognize(turn_context)
+
+
+class NearDuplicateRecognizerTest(aiounittest.AsyncTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.model = LocalFlightBookingRecognizer.from_luis_export(
+            "cognitiveModels/Flight Booking Chatbot.json"
+        ).model
+
+    def setUp(self):
+        self.inner = CountingRecognizer(self.model)
+        self.cache = NearDuplicateRecognizer(self.inner)
+
+    async def test_variants_reuse_the_result_with_moved_spans(self):
+        cached = await self.cache.recognize(FakeContext("ok one last try how about milan"))
+        variant = "  :disappointed: :disappointed: OK one last try, how about Milan?"
+        result = await self.cache.recognize(FakeContext(variant))
+
+        self.assertEqual(self.inner.calls, 1)
+        self.assertEqual(result.text, variant)
+        self.assertEqual(result.get_top_scoring_intent(), cached.get_top_scoring_intent())
+        for name, spans in result.entities["$instance"].items():
+            for span in spans:
+                self.assertEqual(variant[span["startIndex"]:span["endIndex"]], span["text"])
+                self.assertEqual(span["text"].lower(), cached.entities["$instance"][name][0]["text"])
+
+        await self.cache.recognize(FakeContext("ok one last tyr how about milan"))
+        self.assertEqual(self.inner.calls, 1)
+        self.assertEqual(self.cache.stats["near_hits"], 1)
+        self.assertAlmostEqual(self.cache.hit_rate, 2 / 3)
+
+    async def test_new_entities_are_not_served_from_the_cache(self):
+        await self.cache.recognize(FakeContext("i want to fly from paris to london"))
+        for text in (
+            "i want to fly from paris to berlin",
+            "i want to fly from paris to london tomorrow",
+            "i want to fly from paris to london on the 5th",
+        ):
+            result = await self.cache.recognize(FakeContext(text))
+            self.assertEqual(result.text, text)
+        self.assertEqual(self.inner.calls, 4)
+        self.assertEqual(self.cache.stats["hits"], 0)
+
+    async def test_results_with_dates_are_not_cached(self):
+        for _ in range(2):
+            result = await self.cache.recognize(FakeContext("book a flight to paris tomorrow"))
+            self.assertTrue(result.entities["datetime"])
+        self.assertEqual(self.inner.calls, 2)
+        self.assertEqual(self.cache.stats["uncacheable"], 2)
+        self.assertEqual(len(self.cache.index), 0)
+
+    async def test_reordered_words_are_not_served_from_the_cache(self):
+        await self.cache.recognize(FakeContext("book a flight from paris to london"))
+        result = await self.cache.recognize(FakeContext("book a flight from london to paris"))
+        self.assertEqual(self.inner.calls, 2)
+        self.assertEqual(self.cache.stats["hits"], 0)
+        self.assertEqual(result.entities["or_city"], ["london"])
+        self.assertEqual(result.entities["dst_city"], ["paris"])
+
+    def test_least_recently_used_utterances_are_evicted(self):
+        index = NearDuplicateIndex(capacity=2)
+        for text in ("book a flight", "cancel", "help"):
+            index.put(_Entry.of(text))
+        self.assertEqual(len(index), 2)
+        self.assertIsNone(index.get("book a flight"))
+        self.assertAlmostEqual(index.nearest(_Entry.of("help"))[0][0], 1.0)
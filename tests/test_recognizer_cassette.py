@@ -0,0 +1,74 @@
+import os
+import tempfile
+
+import aiounittest
+from botbuilder.schema import Activity, ConversationAccount
+
+from local_recognizer import LocalFlightBookingRecognizer
+from recognizer_cassette import Cassette, CassetteMiss, CassetteRecognizer
+
+
+class FakeContext:
+    def __init__(self, text):
+        self.activity = Activity(type="message", text=text, conversation=ConversationAccount(id="c"))
+
+
+class RecognizerCassetteTest(aiounittest.AsyncTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.local = LocalFlightBookingRecognizer.from_luis_export(
+            "cognitiveModels/Flight Booking Chatbot.json"
+        )
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "luis.cassette")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    async def test_record_then_replay(self):
+        recorder = CassetteRecognizer(self.local, self.path, "record")
+        recorded = await recorder.recognize(FakeContext("I want to fly from Paris to London"))
+        await recorder.recognize(FakeContext("help"))
+        recorder.close()
+
+        player = CassetteRecognizer(None, self.path, "replay")
+        self.assertTrue(player.is_configured)
+        replayed = await player.recognize(FakeContext("I want to fly from Paris to London"))
+        self.assertEqual(replayed.entities, recorded.entities)
+        self.assertEqual(
+            {name: score.score for name, score in replayed.intents.items()},
+            {name: score.score for name, score in recorded.intents.items()},
+        )
+        with self.assertRaises(CassetteMiss):
+            await player.recognize(FakeContext("never recorded"))
+        player.close()
+
+    def test_index_grows_and_reopens(self):
+        cassette = Cassette(self.path, writable=True)
+        for number in range(3000):
+            cassette.put(f"utterance {number}", {"n": number})
+        cassette.put("utterance 7", {"n": "latest"})
+        cassette.close()
+
+        # Appending to an existing cassette keeps the earlier records.
+        cassette = Cassette(self.path, writable=True)
+        cassette.put("one more", {"n": -1})
+        cassette.close()
+
+        cassette = Cassette(self.path)
+        self.assertEqual(len(cassette), 3001)
+        self.assertGreaterEqual(cassette.index.capacity, 2 * 3001)
+        self.assertEqual(cassette.get("utterance 2999"), {"n": 2999})
+        self.assertEqual(cassette.get("utterance 7"), {"n": "latest"})
+        self.assertEqual(cassette.get("one more"), {"n": -1})
+        self.assertIsNone(cassette.get("utterance 3000"))
+        cassette.close()
+
+    async def test_passthrough_times_calls(self):
+        recognizer = CassetteRecognizer(self.local, self.path, "passthrough")
+        await recognizer.recognize(FakeContext("Book a flight to Berlin"))
+        self.assertEqual(recognizer.stats["calls"], 1)
+        self.assertGreater(recognizer.stats["total_ms"], 0)
+        self.assertFalse(os.path.exists(self.path))
@@ -0,0 +1,111 @@
+import asyncio
+
+import aiounittest
+from botbuilder.core import IntentScore, RecognizerResult
+from botbuilder.schema import Activity
+
+from local_recognizer import LocalFlightBookingRecognizer
+from recognizer_cassette import CassetteMiss
+from recognizer_circuit_breaker import BreakerState, CircuitBreakerRecognizer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRecognizer:
+    def __init__(self, clock, latency=0.0, error=None):
+        self.clock = clock
+        self.latency = latency
+        self.error = error
+        self.calls = 0
+        self.is_configured = True
+
+    async def recognize(self, turn_context):
+        self.calls += 1
+        self.clock.now += self.latency
+        if self.error:
+            raise self.error
+        return RecognizerResult(text="remote", intents={"None": IntentScore(1.0)}, entities={})
+
+
+class FakeContext:
+    def __init__(self, text):
+        self.activity = Activity(type="message", text=text)
+
+
+class CircuitBreakerRecognizerTest(aiounittest.AsyncTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.fallback = LocalFlightBookingRecognizer.from_luis_export(
+            "cognitiveModels/Flight Booking Chatbot.json"
+        )
+
+    def make_breaker(self, remote, clock):
+        return CircuitBreakerRecognizer(
+            remote, self.fallback, window_size=4, minimum_calls=4,
+            slow_call_ms=1000, open_seconds=30, clock=clock,
+        )
+
+    async def test_errors_open_the_breaker_and_route_to_fallback(self):
+        clock = FakeClock()
+        remote = FakeRecognizer(clock, error=TimeoutError("LUIS timeout"))
+        breaker = self.make_breaker(remote, clock)
+
+        for _ in range(4):
+            result = await breaker.recognize(FakeContext("I want to fly from Paris to London"))
+        self.assertEqual(breaker.state, BreakerState.OPEN)
+        self.assertIn("BookFlightIntent", result.intents)
+        self.assertEqual(result.entities["or_city"], ["Paris"])
+        self.assertEqual(result.entities["dst_city"], ["London"])
+
+        await breaker.recognize(FakeContext("to Sydney"))
+        self.assertEqual(remote.calls, 4)
+
+    async def test_slow_calls_trip_and_probe_closes(self):
+        clock = FakeClock()
+        remote = FakeRecognizer(clock, latency=2.0)
+        breaker = self.make_breaker(remote, clock)
+
+        for _ in range(4):
+            await breaker.recognize(FakeContext("hello"))
+        self.assertEqual(breaker.state, BreakerState.OPEN)
+
+        clock.now += 31
+        remote.latency = 0.1
+        result = await breaker.recognize(FakeContext("hello"))
+        self.assertEqual(result.text, "remote")
+        self.assertEqual(breaker.state, BreakerState.CLOSED)
+
+    async def test_cassette_misses_are_raised_without_tripping(self):
+        clock = FakeClock()
+        remote = FakeRecognizer(clock, error=CassetteMiss("to Sydney"))
+        breaker = self.make_breaker(remote, clock)
+
+        for _ in range(4):
+            with self.assertRaises(CassetteMiss):
+                await breaker.recognize(FakeContext("to Sydney"))
+        self.assertEqual(breaker.state, BreakerState.CLOSED)
+        self.assertEqual(remote.calls, 4)
+
+    async def test_cancelled_probes_free_their_slot(self):
+        clock = FakeClock()
+        remote = FakeRecognizer(clock, error=asyncio.CancelledError())
+        breaker = self.make_breaker(remote, clock)
+        breaker._open("test")  # pylint: disable=protected-access
+        clock.now += 31
+
+        for _ in range(3):
+            with self.assertRaises(asyncio.CancelledError):
+                await breaker.recognize(FakeContext("help"))
+        self.assertEqual(remote.calls, 3)
+        self.assertEqual(breaker.state, BreakerState.HALF_OPEN)
+
+        remote.error = None
+        result = await breaker.recognize(FakeContext("help"))
+        self.assertEqual(result.text, "remote")
+        self.assertEqual(breaker.state, BreakerState.CLOSED)
@@ -0,0 +1,93 @@
+import aiounittest
+from botbuilder.core import IntentScore, RecognizerResult
+from botbuilder.schema import Activity, ChannelAccount, ConversationAccount
+
+from recognizer_circuit_breaker import BreakerState, CircuitBreakerRecognizer
+from recognizer_quota import QuotaExceededError, QuotaRecognizer, RecognizerQuota, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRecognizer:
+    def __init__(self, text):
+        self.text = text
+        self.calls = 0
+        self.is_configured = True
+
+    async def recognize(self, turn_context):
+        self.calls += 1
+        return RecognizerResult(text=self.text, intents={"None": IntentScore(1.0)}, entities={})
+
+
+class FakeContext:
+    def __init__(self, user="u", conversation="c"):
+        self.activity = Activity(
+            type="message",
+            text="hello",
+            from_property=ChannelAccount(id=user),
+            conversation=ConversationAccount(id=conversation),
+        )
+
+
+class RecognizerQuotaTest(aiounittest.AsyncTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.remote = FakeRecognizer("remote")
+        self.local = FakeRecognizer("local")
+
+    def make(self, **kwargs) -> CircuitBreakerRecognizer:
+        self.quota = RecognizerQuota(clock=self.clock, **kwargs)
+        return CircuitBreakerRecognizer(
+            QuotaRecognizer(self.remote, self.quota), self.local, minimum_calls=1, clock=self.clock
+        )
+
+    def test_token_bucket_refills_and_schedules_reservations(self):
+        bucket = TokenBucket(rate=2, burst=2, clock=self.clock)
+        self.assertTrue(bucket.take())
+        self.assertTrue(bucket.take())
+        self.assertFalse(bucket.take())
+        self.assertEqual(bucket.reserve(1.0), 0.5)
+        self.assertEqual(bucket.reserve(1.0), 1.0)
+        self.assertIsNone(bucket.reserve(1.0))
+        self.clock.now += 10
+        self.assertEqual(bucket.tokens, 2)
+
+    async def test_user_and_conversation_budgets_fall_back_to_the_local_model(self):
+        recognizer = self.make(
+            user_calls_per_minute=60, user_burst=2, conversation_calls_per_minute=60,
+            conversation_burst=3,
+        )
+        texts = [(await recognizer.recognize(FakeContext("a", "c1"))).text for _ in range(3)]
+        self.assertEqual(texts, ["remote", "remote", "local"])
+        # Another user of the conversation gets one more call, then the conversation is out.
+        texts = [(await recognizer.recognize(FakeContext("b", "c1"))).text for _ in range(2)]
+        self.assertEqual(texts, ["remote", "local"])
+        self.assertEqual(self.quota.stats["user"], 1)
+        self.assertEqual(self.quota.stats["conversation"], 1)
+        # Over budget is not a LUIS failure.
+        self.assertEqual(recognizer.state, BreakerState.CLOSED)
+
+        self.clock.now += 1
+        self.assertEqual((await recognizer.recognize(FakeContext("a", "c2"))).text, "remote")
+
+    async def test_rejection_is_raised_through_the_breaker(self):
+        recognizer = self.make(user_calls_per_minute=60, user_burst=1, reject_over_quota=True)
+        await recognizer.recognize(FakeContext())
+        with self.assertRaises(QuotaExceededError) as raised:
+            await recognizer.recognize(FakeContext())
+        self.assertEqual(raised.exception.scope, "user")
+        self.assertEqual(self.remote.calls, 1)
+
+    async def test_global_budget_queues_briefly_then_falls_back(self):
+        recognizer = self.make(tps=1000, tps_burst=1, max_wait_seconds=0.0015)
+        texts = [(await recognizer.recognize(FakeContext())).text for _ in range(3)]
+        self.assertEqual(texts, ["remote", "remote", "local"])
+        self.assertEqual(self.quota.stats["queued"], 1)
+        self.assertEqual(self.quota.stats["global"], 1)
+        self.assertEqual(self.quota.stats["admitted"], 2)
@@ -0,0 +1,190 @@
+import asyncio
+import os
+import tempfile
+
+import aiohttp
+import aiounittest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from botbuilder.core import MemoryStorage
+
+from shard_router import HashRing, ShardMembership, ShardRouter, WORKER_HEADER
+from write_behind_storage import SqliteStorage, WriteBehindStorage
+
+WORKERS = ["http://worker-a", "http://worker-b", "http://worker-c"]
+CONVERSATIONS = [f"conversation-{index}" for index in range(3000)]
+
+
+class HashRingTest(aiounittest.AsyncTestCase):
+    async def test_conversations_are_balanced_and_few_move_on_scale_up(self):
+        ring = HashRing(WORKERS)
+        owners = {conversation: ring.node_for(conversation) for conversation in CONVERSATIONS}
+        for worker in WORKERS:
+            self.assertGreater(list(owners.values()).count(worker), len(CONVERSATIONS) / 6)
+
+        scaled = HashRing(WORKERS + ["http://worker-d"])
+        moved = [item for item in CONVERSATIONS if scaled.node_for(item) != owners[item]]
+        # Only to the new worker, about a quarter of the conversations
+        self.assertEqual({scaled.node_for(item) for item in moved}, {"http://worker-d"})
+        self.assertLess(len(moved), len(CONVERSATIONS) * 0.4)
+
+
+class WriteBehindStorageTest(aiounittest.AsyncTestCase):
+    async def test_writes_reach_the_durable_store_on_flush(self):
+        durable = MemoryStorage()
+        storage = WriteBehindStorage(MemoryStorage(), durable)
+        await storage.write({"test/conversations/a": {"n": 1}, "test/users/u": {"n": 2}})
+
+        # User state is written through, conversation state on flush.
+        self.assertEqual(set(await durable.read(["test/conversations/a", "test/users/u"])), {"test/users/u"})
+        self.assertEqual(storage.pending, 1)
+        self.assertEqual(await storage.flush(), 1)
+        self.assertEqual((await durable.read(["test/conversations/a"]))["test/conversations/a"]["n"], 1)
+
+    async def test_evicted_state_is_read_back_from_the_durable_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            durable = SqliteStorage(os.path.join(directory, "state.sqlite3"))
+            storage = WriteBehindStorage(MemoryStorage(), durable)
+            await storage.write({"test/conversations/a": {"n": 1}, "test/conversations/b": {"n": 2}})
+
+            self.assertEqual(await storage.evict(lambda key: key.endswith("/a")), 1)
+            self.assertEqual(storage.pending, 0)
+            self.assertEqual(await storage.local.read(["test/conversations/b"]), {})
+            # The next owner reads what this one flushed.
+            other = WriteBehindStorage(MemoryStorage(), durable)
+            item = (await other.read(["test/conversations/b"]))["test/conversations/b"]
+            self.assertEqual(item["n"], 2)
+            await other.write({"test/conversations/b": dict(item, n=3)})
+            self.assertEqual((await other.read(["test/conversations/b"]))["test/conversations/b"]["n"], 3)
+            await durable.close()
+
+
+class ShardMembershipTest(aiounittest.AsyncTestCase):
+    async def test_rebalance_waits_for_the_turns_of_moved_conversations(self):
+        storage = WriteBehindStorage(MemoryStorage(), MemoryStorage())
+        membership = ShardMembership(WORKERS[0], WORKERS[:1], storage)
+        scaled = HashRing(WORKERS)
+        moved = next(item for item in CONVERSATIONS if scaled.node_for(item) != WORKERS[0])
+        await storage.write({f"test/conversations/{moved}": {"n": 1}})
+
+        turn_may_end = asyncio.Event()
+
+        async def turn():
+            async with membership.turn(moved):
+                await turn_may_end.wait()
+                await storage.write({f"test/conversations/{moved}": {"n": 2}})
+
+        running = asyncio.ensure_future(turn())
+        await asyncio.sleep(0)
+        rebalance = asyncio.ensure_future(membership.rebalance(WORKERS))
+        await asyncio.sleep(0.01)
+        self.assertFalse(rebalance.done())
+        self.assertFalse(membership.owns(moved))
+
+        turn_may_end.set()
+        self.assertEqual((await rebalance)["evicted"], 1)
+        await running
+        durable = await storage.durable.read([f"test/conversations/{moved}"])
+        self.assertEqual(durable[f"test/conversations/{moved}"]["n"], 2)
+
+
+    async def test_a_ring_is_only_accepted_with_the_secret(self):
+        membership = ShardMembership(WORKERS[0], WORKERS, secret="s3cret")
+        app = web.Application()
+        app.router.add_post("/api/shard", membership.shard_handler)
+        client = TestClient(TestServer(app))
+        await client.start_server()
+        try:
+            for headers in ({}, {"Authorization": "Bearer wrong"}):
+                response = await client.post(
+                    "/api/shard", json={"workers": WORKERS[:1]}, headers=headers
+                )
+                self.assertEqual(response.status, 401)
+            self.assertEqual(membership.ring.nodes, sorted(WORKERS))
+
+            response = await client.post(
+                "/api/shard",
+                json={"workers": WORKERS[:1]},
+                headers={"Authorization": "Bearer s3cret"},
+            )
+            self.assertEqual(response.status, 200)
+            self.assertEqual(membership.ring.nodes, WORKERS[:1])
+        finally:
+            await client.close()
+
+
+class ShardRouterTest(aiounittest.AsyncTestCase):
+    async def test_misdirected_turns_are_retried_after_the_rebalance(self):
+        served = []
+
+        def worker(name: str, owned: bool):
+            async def messages(_):
+                served.append(name)
+                if not owned:
+                    return web.Response(status=421)
+                return web.json_response({"activities": []})
+
+            async def shard(_):
+                return web.json_response({})
+
+            app = web.Application()
+            app.router.add_post("/api/messages", messages)
+            app.router.add_post("/api/shard", shard)
+            return TestServer(app)
+
+        old, new = worker("old", owned=False), worker("new", owned=True)
+        await old.start_server()
+        await new.start_server()
+        old_url, new_url = str(old.make_url("")).rstrip("/"), str(new.make_url("")).rstrip("/")
+        router = ShardRouter([old_url])
+        await router.start()
+        router._settled.clear()  # pylint: disable=protected-access
+        try:
+
+            async def rebalance():
+                await asyncio.sleep(0.01)
+                router.ring = HashRing([new_url])
+                router._settled.set()  # pylint: disable=protected-access
+
+            body = b'{"type": "message", "conversation": {"id": "a"}}'
+            _, response = await asyncio.gather(rebalance(), router.route("a", body, {}))
+            self.assertEqual(response.status, 200)
+            self.assertEqual(response.headers[WORKER_HEADER], new_url)
+            self.assertEqual(served, ["old", "new"])
+        finally:
+            await router.stop()
+            await old.close()
+            await new.close()
+
+    async def test_a_rejected_ring_is_rolled_back(self):
+        rings = {}
+
+        def worker(name: str, accepts: bool):
+            async def shard(req):
+                if not accepts:
+                    return web.Response(status=500)
+                rings[name] = (await req.json())["workers"]
+                return web.json_response({})
+
+            app = web.Application()
+            app.router.add_post("/api/shard", shard)
+            return TestServer(app)
+
+        servers = {"a": worker("a", True), "b": worker("b", True), "c": worker("c", False)}
+        urls = {}
+        for name, server in servers.items():
+            await server.start_server()
+            urls[name] = str(server.make_url("")).rstrip("/")
+        router = ShardRouter([urls["a"], urls["b"]])
+        await router.start()
+        try:
+            with self.assertRaises(aiohttp.ClientResponseError):
+                await router.rebalance(list(urls.values()))
+            old = sorted([urls["a"], urls["b"]])
+            self.assertEqual(router.ring.nodes, old)
+            self.assertEqual(rings, {"a": old, "b": old})
+        finally:
+            await router.stop()
+            for server in servers.values():
+                await server.close()
+
@@ -0,0 +1,38 @@
+import asyncio
+import json
+
+import aiounittest
+
+from startup import StartupMonitor
+
+
+class StartupMonitorTest(aiounittest.AsyncTestCase):
+    async def test_ready_after_warm_up(self):
+        startup = StartupMonitor()
+        warmed = []
+
+        async def warm_model():
+            await asyncio.sleep(0.01)
+            warmed.append("model")
+
+        async def fetch_keys():
+            raise ConnectionError("no network")
+
+        startup.start_warm_up({"model": warm_model, "keys": fetch_keys})
+        response = await startup.ready_handler(None)
+        self.assertEqual(response.status, 503)
+
+        await asyncio.sleep(0.05)
+        response = await startup.ready_handler(None)
+        self.assertEqual(response.status, 200)
+        body = json.loads(response.text)
+        self.assertEqual(warmed, ["model"])
+        # A failed task is reported without keeping the bot unready.
+        self.assertIn("keys", body["failures"])
+        self.assertIn("warm_up.model", body["phases_ms"])
+
+    def test_phase_records_duration(self):
+        startup = StartupMonitor()
+        with startup.phase("imports"):
+            pass
+        self.assertGreaterEqual(startup.phases["imports"], 0)
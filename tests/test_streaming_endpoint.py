@@ -0,0 +1,115 @@
+import json
+from http import HTTPStatus
+
+import aiounittest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from botbuilder.core import (
+    BotFrameworkAdapterSettings,
+    ConversationState,
+    InvokeResponse,
+    MemoryStorage,
+    TurnContext,
+)
+from botbuilder.schema import Activity, ActivityTypes
+
+from adapter_with_error_handler import AdapterWithErrorHandler
+from streaming_endpoint import SERVICE_URL_PREFIX, StreamingEndpoint
+from turn_scheduler import TurnRejected
+
+
+async def echo(turn_context: TurnContext):
+    if turn_context.activity.type == ActivityTypes.invoke:
+        await turn_context.send_activity(
+            Activity(type=ActivityTypes.invoke_response, value=InvokeResponse(status=200, body={"ok": 1}))
+        )
+        return
+    await turn_context.send_activity(f"1: {turn_context.activity.text}")
+    await turn_context.send_activity(f"2: {turn_context.activity.text}")
+
+
+def frame(request_id: str, activity_type: str = "message", text: str = "hello") -> dict:
+    return {
+        "requestId": request_id,
+        "activity": {
+            "type": activity_type,
+            "id": f"activity-{request_id}",
+            "name": "test" if activity_type == "invoke" else None,
+            "channelId": "test",
+            "serviceUrl": "https://channel.example",
+            "from": {"id": "user"},
+            "recipient": {"id": "bot"},
+            "conversation": {"id": "conversation"},
+            "text": text,
+        },
+    }
+
+
+class StreamingEndpointTest(aiounittest.AsyncTestCase):
+    async def open(self, authenticate=None, process=None):
+        self.adapter = AdapterWithErrorHandler(
+            BotFrameworkAdapterSettings("", ""), ConversationState(MemoryStorage())
+        )
+        self.streaming = StreamingEndpoint(
+            authenticate or self.adapter.authenticate,
+            process
+            or (lambda activity, identity: self.adapter.process_activity_with_identity(activity, identity, echo)),
+        )
+        self.adapter.streams = self.streaming
+        app = web.Application()
+        app.router.add_get("/api/stream", self.streaming.handler)
+        self.client = TestClient(TestServer(app))
+        await self.client.start_server()
+        return await self.client.ws_connect("/api/stream")
+
+    async def close(self, socket):
+        await socket.close()
+        await self.client.close()
+
+    @staticmethod
+    async def receive_until_done(socket, request_id: str) -> list:
+        frames = []
+        while not frames or frames[-1].get("requestId") != request_id:
+            frames.append(json.loads(await socket.receive_str()))
+        return frames
+
+    async def test_replies_stream_before_the_turn_completes(self):
+        socket = await self.open()
+        await socket.send_str(json.dumps(frame("1")))
+        frames = await self.receive_until_done(socket, "1")
+        await socket.send_str(json.dumps(frame("2", "invoke")))
+        invoke = await self.receive_until_done(socket, "2")
+        await self.close(socket)
+
+        self.assertEqual([item["activity"]["text"] for item in frames[:-1]], ["1: hello", "2: hello"])
+        self.assertEqual(frames[0]["activity"]["replyToId"], "activity-1")
+        self.assertTrue(frames[0]["activity"]["serviceUrl"].startswith(SERVICE_URL_PREFIX))
+        self.assertEqual(frames[-1], {"requestId": "1", "status": 200})
+        self.assertEqual(invoke, [{"requestId": "2", "status": 200, "body": {"ok": 1}}])
+        self.assertEqual(self.streaming.stats["replies"], 2)
+        self.assertEqual(self.streaming.stats["turns"], 2)
+
+    async def test_turns_that_do_not_run_get_their_status(self):
+        async def authenticate(activity, auth_header):
+            if activity.text == "intruder":
+                raise PermissionError()
+            return await self.adapter.authenticate(activity, auth_header)
+
+        async def process(activity, identity):
+            raise TurnRejected(HTTPStatus.TOO_MANY_REQUESTS, 2, "queue full")
+
+        socket = await self.open(authenticate, process)
+        await socket.send_str("not json")
+        await socket.send_str(json.dumps(frame("2", text="intruder")))
+        await socket.send_str(json.dumps(frame("3")))
+        frames = [json.loads(await socket.receive_str()) for _ in range(3)]
+        await self.close(socket)
+
+        self.assertCountEqual(
+            frames,
+            [
+                {"requestId": None, "status": 400},
+                {"requestId": "2", "status": 401},
+                {"requestId": "3", "status": 429, "retryAfter": 2},
+            ],
+        )
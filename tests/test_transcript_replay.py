@@ -0,0 +1,39 @@
+import copy
+
+import aiounittest
+
+from transcript_replay import ReplayRecognizer, TranscriptReplayer, load_transcripts
+
+
+class TranscriptReplayTest(aiounittest.AsyncTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.conversations = load_transcripts(["tests/transcripts"])
+
+    async def test_recorded_transcripts_pass(self):
+        replayer = TranscriptReplayer(ReplayRecognizer(), concurrency=50)
+        report = await replayer.replay(self.conversations * 20)
+
+        self.assertEqual(report.failures, [])
+        self.assertEqual(report.conversations, len(self.conversations) * 20)
+        self.assertEqual(len(report.latencies), report.turns)
+
+    async def test_changed_reply_fails(self):
+        conversation = copy.deepcopy(self.conversations[0])
+        conversation["turns"][1]["bot"] = ["Where to?"]
+
+        report = await TranscriptReplayer(ReplayRecognizer()).replay([conversation])
+        self.assertEqual(len(report.failures), 1)
+        self.assertIn("turn 2", report.failures[0])
+
+    async def test_recognizer_call_count_is_checked(self):
+        conversation = copy.deepcopy(self.conversations[0])
+        turn = conversation["turns"][1]
+        turn["recognizer"] = turn["recognizer"] * 2
+
+        report = await TranscriptReplayer(ReplayRecognizer()).replay([conversation])
+        self.assertIn("1 recorded recognizer calls not made", report.failures[0])
+
+        del conversation["turns"][1]["recognizer"]
+        report = await TranscriptReplayer(ReplayRecognizer()).replay([conversation])
+        self.assertIn("unexpected recognizer call", report.failures[0])
@@ -0,0 +1,58 @@
+import asyncio
+from http import HTTPStatus
+
+import aiounittest
+
+from turn_scheduler import TurnScheduler, TurnRejected
+
+
+class TurnSchedulerTest(aiounittest.AsyncTestCase):
+    async def test_turns_of_a_conversation_run_in_order(self):
+        scheduler = TurnScheduler(max_in_flight=4)
+        running = []
+        order = []
+
+        async def turn(index):
+            running.append(index)
+            self.assertEqual(len(running), 1)
+            await asyncio.sleep(0.01)
+            order.append(index)
+            running.remove(index)
+
+        await asyncio.gather(
+            *[scheduler.run("conv", lambda i=i: turn(i)) for i in range(5)]
+        )
+        self.assertEqual(order, [0, 1, 2, 3, 4])
+        self.assertEqual(scheduler.in_flight, 0)
+
+    async def test_conversation_backlog_is_shed_with_429(self):
+        scheduler = TurnScheduler(max_in_flight=4, max_queued_per_conversation=1)
+        release = asyncio.Event()
+
+        first = asyncio.ensure_future(scheduler.run("conv", release.wait))
+        second = asyncio.ensure_future(scheduler.run("conv", release.wait))
+        await asyncio.sleep(0.01)
+
+        with self.assertRaises(TurnRejected) as rejected:
+            await scheduler.run("conv", release.wait)
+        self.assertEqual(rejected.exception.status, HTTPStatus.TOO_MANY_REQUESTS)
+        self.assertEqual(rejected.exception.retry_after, 1)
+
+        release.set()
+        await asyncio.gather(first, second)
+
+    async def test_global_overload_is_shed_with_503(self):
+        scheduler = TurnScheduler(max_in_flight=1, max_queued=1)
+        release = asyncio.Event()
+
+        first = asyncio.ensure_future(scheduler.run("a", release.wait))
+        second = asyncio.ensure_future(scheduler.run("b", release.wait))
+        await asyncio.sleep(0.01)
+
+        with self.assertRaises(TurnRejected) as rejected:
+            await scheduler.run("c", release.wait)
+        self.assertEqual(rejected.exception.status, HTTPStatus.SERVICE_UNAVAILABLE)
+
+        release.set()
+        await asyncio.gather(first, second)
+        self.assertEqual(scheduler.queued, 0)
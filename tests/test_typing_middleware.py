@@ -0,0 +1,75 @@
+import asyncio
+
+import aiounittest
+from botbuilder.core import NullTelemetryClient, TurnContext
+from botbuilder.core.adapters import TestAdapter
+from botbuilder.schema import ActivityTypes
+
+from typing_middleware import DeferredTypingMiddleware
+
+
+async def wait_for_luis(seconds: float):
+    await asyncio.sleep(seconds)
+
+
+class DeferredTypingMiddlewareTest(aiounittest.AsyncTestCase):
+    def make_adapter(self, middleware, recognition_seconds):
+        async def logic(turn_context: TurnContext):
+            await wait_for_luis(recognition_seconds)
+            await turn_context.send_activity("Booked")
+            # Work after the first reply does not bring the typing indicator back
+            await asyncio.sleep(recognition_seconds)
+
+        adapter = TestAdapter(logic)
+        adapter.use(middleware)
+        return adapter
+
+    async def test_slow_turn_gets_typing_until_the_first_reply(self):
+        middleware = DeferredTypingMiddleware(delay_seconds=0.05, period_seconds=0.05)
+        adapter = self.make_adapter(middleware, 0.18)
+
+        await adapter.send("book a flight")
+
+        types = [activity.type for activity in adapter.activity_buffer]
+        typing = types.count(ActivityTypes.typing)
+        self.assertGreaterEqual(typing, 2)
+        self.assertEqual(types, [ActivityTypes.typing] * typing + [ActivityTypes.message])
+        (step, count), = middleware.crossings.items()
+        self.assertTrue(step.endswith("test_typing_middleware.py:wait_for_luis"), step)
+        self.assertEqual(count, typing)
+
+    async def test_fast_turn_sends_no_typing(self):
+        middleware = DeferredTypingMiddleware(delay_seconds=0.05)
+        adapter = self.make_adapter(middleware, 0.01)
+
+        await adapter.send("book a flight")
+        await asyncio.sleep(0.1)
+
+        self.assertEqual([activity.text for activity in adapter.activity_buffer], ["Booked"])
+        self.assertFalse(middleware.crossings)
+
+    async def test_failed_typing_is_reported(self):
+        events = []
+
+        class Telemetry(NullTelemetryClient):
+            def track_event(self, name, properties=None, measurements=None):
+                events.append((name, properties))
+
+        class FailingTypingAdapter(TestAdapter):
+            async def send_activities(self, context, activities):
+                if activities[0].type == ActivityTypes.typing:
+                    raise ConnectionError("channel unreachable")
+                return await super().send_activities(context, activities)
+
+        async def logic(turn_context: TurnContext):
+            await wait_for_luis(0.1)
+            await turn_context.send_activity("Booked")
+
+        adapter = FailingTypingAdapter(logic)
+        adapter.use(DeferredTypingMiddleware(delay_seconds=0.02, telemetry_client=Telemetry()))
+        await adapter.send("book a flight")
+
+        self.assertEqual([activity.text for activity in adapter.activity_buffer], ["Booked"])
+        self.assertEqual(
+            events, [("TypingIndicatorFailed", {"error": "ConnectionError('channel unreachable')"})]
+        )
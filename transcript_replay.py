@@ -0,0 +1,305 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Replay recorded conversations through MainDialog, without LUIS.
+
+A transcript file is JSONL, one conversation per line:
+
+    {"name": "...", "turns": [
+        {"user": "...", "bot": ["...", ...], "recognizer": [<RecognizerResult>, ...]},
+        ...]}
+
+`bot` lists the replies of the turn (attachments as "[attachment:<type>]")
+and `recognizer` the results the recognizer returned during the turn, in
+order. Replaying serves those results from a ReplayRecognizer, so a turn
+that now calls the recognizer more (or less) often than when it was recorded
+fails just like a turn whose replies changed. Conversations run concurrently
+on one event loop and every turn is timed.
+
+    python -m transcript_replay replay tests/transcripts --concurrency 200 --max-p95-ms 50
+    python -m transcript_replay record utterances.jsonl transcripts.jsonl --recognizer local
+
+`record` reads one JSON list of utterances per line and writes the
+transcripts produced by the local model or by LUIS.
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os.path
+import sys
+import time
+from collections import defaultdict, deque
+from typing import Dict, Iterable, List, NamedTuple
+
+from botbuilder.core import (
+    ConversationState,
+    MemoryStorage,
+    Recognizer,
+    RecognizerResult,
+    TurnContext,
+    UserState,
+)
+from botbuilder.core.adapters import TestAdapter
+from botbuilder.schema import Activity, ChannelAccount, ConversationAccount
+
+from booking_snapshot import BookingSnapshotStore
+from bots import DialogAndWelcomeBot
+from dialogs import MainDialog, BookingDialog
+from recognizer_cassette import result_from_json, result_to_json
+
+
+class ReplayMismatch(Exception):
+    pass
+
+
+def reply_text(activity: Activity) -> str:
+    if activity.attachments:
+        return " ".join(f"[attachment:{item.content_type}]" for item in activity.attachments)
+    return activity.text
+
+
+class ReplayRecognizer(Recognizer):
+    """Serves the recorded results of the current turn, per conversation.
+
+    LuisHelper swallows recognizer errors, so mismatches are also kept in
+    `mismatches` for the replayer to report.
+    """
+
+    def __init__(self):
+        self._queues: Dict[str, deque] = {}
+        self.mismatches: Dict[str, List[str]] = defaultdict(list)
+
+    @property
+    def is_configured(self) -> bool:
+        return True
+
+    def load(self, conversation_id: str, results: List[dict]):
+        self._queues[conversation_id] = deque(results)
+
+    def remaining(self, conversation_id: str) -> int:
+        return len(self._queues.get(conversation_id, ()))
+
+    async def recognize(self, turn_context: TurnContext) -> RecognizerResult:
+        text = turn_context.activity.text
+        conversation_id = turn_context.activity.conversation.id
+        queue = self._queues.get(conversation_id)
+        if not queue:
+            error = f"unexpected recognizer call for {text!r}"
+        elif queue[0]["text"] != text:
+            error = f"recognizer called for {text!r}, recorded {queue[0]['text']!r}"
+        else:
+            return result_from_json(queue.popleft())
+        self.mismatches[conversation_id].append(error)
+        raise ReplayMismatch(error)
+
+
+class RecordingRecognizer(Recognizer):
+    """Forwards to `recognizer` and keeps the results of the current turn."""
+
+    def __init__(self, recognizer: Recognizer):
+        self._recognizer = recognizer
+        self.recorded: Dict[str, List[dict]] = defaultdict(list)
+
+    @property
+    def is_configured(self) -> bool:
+        return self._recognizer.is_configured
+
+    def take(self, conversation_id: str) -> List[dict]:
+        return self.recorded.pop(conversation_id, [])
+
+    async def recognize(self, turn_context: TurnContext) -> RecognizerResult:
+        result = await self._recognizer.recognize(turn_context)
+        self.recorded[turn_context.activity.conversation.id].append(result_to_json(result))
+        return result
+
+
+class TurnOutcome(NamedTuple):
+    replies: List[str]
+    elapsed: float
+    error: Exception
+
+
+class ReplayReport:
+    def __init__(self):
+        self.conversations = 0
+        self.turns = 0
+        self.failures: List[str] = []
+        self.latencies: List[float] = []
+        self.wall_seconds = 0.0
+
+    @property
+    def passed(self) -> bool:
+        return not self.failures
+
+    def percentile_ms(self, percentile: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+        return ordered[index] * 1000
+
+    def summary(self) -> str:
+        lines = [
+            f"{self.conversations} conversations, {self.turns} turns, "
+            f"{len(self.failures)} failures in {self.wall_seconds:.2f}s "
+            f"({self.turns / max(self.wall_seconds, 1e-9):.0f} turns/s)",
+            "turn latency ms: p50 %.2f  p95 %.2f  p99 %.2f  max %.2f" % (
+                self.percentile_ms(50), self.percentile_ms(95),
+                self.percentile_ms(99), self.percentile_ms(100),
+            ),
+        ]
+        return "\n".join(lines + self.failures)
+
+
+class TranscriptReplayer:
+    """Runs conversations through the bot the way app.py wires it."""
+
+    def __init__(self, recognizer: Recognizer, concurrency: int = 100):
+        self.recognizer = recognizer
+        self.concurrency = concurrency
+        storage = MemoryStorage()
+        user_state = UserState(storage)
+        snapshots = BookingSnapshotStore(user_state)
+        dialog = MainDialog(
+            recognizer,
+            BookingDialog(luis_recognizer=recognizer, snapshots=snapshots),
+            snapshots=snapshots,
+        )
+        self.bot = DialogAndWelcomeBot(ConversationState(storage), user_state, dialog, None)
+
+    def _adapter(self, conversation_id: str) -> TestAdapter:
+        return TestAdapter(
+            self.bot.on_turn,
+            Activity(
+                channel_id="test",
+                service_url="https://test.com",
+                from_property=ChannelAccount(id=f"user-{conversation_id}", name="user"),
+                recipient=ChannelAccount(id="bot", name="Bot"),
+                conversation=ConversationAccount(id=conversation_id),
+            ),
+        )
+
+    @staticmethod
+    async def _turn(adapter: TestAdapter, text: str) -> TurnOutcome:
+        started = time.perf_counter()
+        error = None
+        try:
+            await adapter.receive_activity(text)
+        except Exception as exception:  # pylint: disable=broad-except
+            error = exception
+        elapsed = time.perf_counter() - started
+        replies = [reply_text(activity) for activity in adapter.activity_buffer]
+        adapter.activity_buffer.clear()
+        return TurnOutcome(replies, elapsed, error)
+
+    async def replay(self, conversations: List[dict]) -> ReplayReport:
+        report = ReplayReport()
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def run(index: int, conversation: dict):
+            async with slots:
+                await self._replay_conversation(f"{index}-{conversation['name']}", conversation, report)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(run(index, item) for index, item in enumerate(conversations)))
+        report.wall_seconds = time.perf_counter() - started
+        return report
+
+    async def _replay_conversation(self, conversation_id: str, conversation: dict, report: ReplayReport):
+        report.conversations += 1
+        adapter = self._adapter(conversation_id)
+        for number, turn in enumerate(conversation["turns"], 1):
+            self.recognizer.load(conversation_id, turn.get("recognizer", []))
+            outcome = await self._turn(adapter, turn["user"])
+            report.turns += 1
+            report.latencies.append(outcome.elapsed)
+
+            where = f"{conversation['name']} turn {number} ({turn['user']!r})"
+            mismatches = self.recognizer.mismatches.pop(conversation_id, None)
+            if mismatches:
+                report.failures.append(f"{where}: {'; '.join(mismatches)}")
+                return
+            if outcome.error is not None:
+                report.failures.append(f"{where}: {outcome.error!r}")
+                return
+            if outcome.replies != turn["bot"]:
+                report.failures.append(f"{where}: expected {turn['bot']!r}, got {outcome.replies!r}")
+                return
+            if self.recognizer.remaining(conversation_id):
+                report.failures.append(
+                    f"{where}: {self.recognizer.remaining(conversation_id)} recorded recognizer calls not made"
+                )
+                return
+
+    async def record(self, name: str, utterances: List[str]) -> dict:
+        """Play `utterances`; self.recognizer must be a RecordingRecognizer."""
+        adapter = self._adapter(name)
+        turns = []
+        for text in utterances:
+            outcome = await self._turn(adapter, text)
+            if outcome.error is not None:
+                raise outcome.error
+            turns.append(
+                {"user": text, "bot": outcome.replies, "recognizer": self.recognizer.take(name)}
+            )
+        return {"name": name, "turns": turns}
+
+
+def load_transcripts(paths: Iterable[str]) -> List[dict]:
+    conversations = []
+    for path in paths:
+        files = sorted(glob.glob(os.path.join(path, "*.jsonl"))) if os.path.isdir(path) else [path]
+        for file_name in files:
+            with open(file_name, encoding="utf-8") as transcript_file:
+                conversations.extend(json.loads(line) for line in transcript_file if line.strip())
+    return conversations
+
+
+def _live_recognizer(kind: str) -> Recognizer:
+    from config import DefaultConfig
+
+    if kind == "luis":
+        from flight_booking_recognizer import FlightBookingRecognizer
+
+        return FlightBookingRecognizer(DefaultConfig())
+    from local_recognizer import LocalFlightBookingRecognizer
+
+    return LocalFlightBookingRecognizer.from_luis_export(DefaultConfig.LOCAL_MODEL_PATH)
+
+
+async def _main(args) -> int:
+    if args.command == "record":
+        replayer = TranscriptReplayer(RecordingRecognizer(_live_recognizer(args.recognizer)))
+        with open(args.utterances, encoding="utf-8") as source, \
+                open(args.output, "w", encoding="utf-8") as output:
+            for number, line in enumerate(source, 1):
+                if line.strip():
+                    transcript = await replayer.record(f"conversation-{number}", json.loads(line))
+                    output.write(json.dumps(transcript) + "\n")
+        return 0
+
+    conversations = load_transcripts(args.paths) * args.repeat
+    report = await TranscriptReplayer(ReplayRecognizer(), args.concurrency).replay(conversations)
+    print(report.summary())
+    for percentile, budget in ((95, args.max_p95_ms), (99, args.max_p99_ms)):
+        if budget and report.percentile_ms(percentile) > budget:
+            print(f"p{percentile} turn latency over the {budget} ms budget")
+            return 1
+    return 0 if report.passed else 1
+
+
+if __name__ == "__main__":
+    PARSER = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    COMMANDS = PARSER.add_subparsers(dest="command", required=True)
+    REPLAY = COMMANDS.add_parser("replay")
+    REPLAY.add_argument("paths", nargs="+", help="transcript files or directories")
+    REPLAY.add_argument("--concurrency", type=int, default=100)
+    REPLAY.add_argument("--repeat", type=int, default=1, help="replay every transcript N times")
+    REPLAY.add_argument("--max-p95-ms", type=float, default=0)
+    REPLAY.add_argument("--max-p99-ms", type=float, default=0)
+    RECORD = COMMANDS.add_parser("record")
+    RECORD.add_argument("utterances", help="JSONL, one list of utterances per conversation")
+    RECORD.add_argument("output")
+    RECORD.add_argument("--recognizer", choices=("local", "luis"), default="local")
+    sys.exit(asyncio.run(_main(PARSER.parse_args())))
@@ -0,0 +1,115 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Admission control in front of the adapter.
+
+Turns of the same conversation run one at a time, in arrival order, so two
+activities never race on the same ConversationState. A global cap bounds the
+number of turns in flight; arrivals beyond the queue limits are shed right
+away with 429 (conversation backlog) or 503 (bot overloaded) and a
+Retry-After hint instead of piling up behind slow recognition.
+"""
+
+import asyncio
+import time
+from http import HTTPStatus
+from typing import Awaitable, Callable, Dict
+
+from botbuilder.core import BotTelemetryClient, NullTelemetryClient
+
+
+class TurnRejected(Exception):
+    """Raised when a turn is shed instead of queued."""
+
+    def __init__(self, status: HTTPStatus, retry_after: int, reason: str):
+        super(TurnRejected, self).__init__(reason)
+        self.status = status
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class _ConversationQueue:
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending = 0
+
+
+class TurnScheduler:
+    """Serializes turns per conversation and bounds turns in flight."""
+
+    def __init__(
+        self,
+        max_in_flight: int = 64,
+        max_queued: int = 256,
+        max_queued_per_conversation: int = 8,
+        max_queue_wait: float = 10.0,
+        retry_after: int = 1,
+        telemetry_client: BotTelemetryClient = None,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.max_queued_per_conversation = max_queued_per_conversation
+        self.max_queue_wait = max_queue_wait
+        self.retry_after = retry_after
+        self.telemetry_client = telemetry_client or NullTelemetryClient()
+
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._conversations: Dict[str, _ConversationQueue] = {}
+        self.in_flight = 0
+        self.queued = 0
+
+    async def run(self, conversation_id: str, turn: Callable[[], Awaitable]):
+        """Run `turn` once the conversation and a global slot are free."""
+        queue = self._conversations.get(conversation_id)
+        pending = queue.pending if queue is not None else 0
+
+        # A conversation with nothing pending goes straight through, whatever
+        # the global backlog, as long as a slot is free.
+        if pending > 0 or self._slots.locked():
+            if pending > self.max_queued_per_conversation:
+                self._shed(HTTPStatus.TOO_MANY_REQUESTS, "conversation backlog full")
+            if self.queued >= self.max_queued:
+                self._shed(HTTPStatus.SERVICE_UNAVAILABLE, "turn queue full")
+
+        if queue is None:
+            queue = self._conversations[conversation_id] = _ConversationQueue()
+        queue.pending += 1
+        self.queued += 1
+        arrived = time.perf_counter()
+        try:
+            try:
+                await asyncio.wait_for(self._acquire(queue), self.max_queue_wait)
+            except asyncio.TimeoutError:
+                self._shed(HTTPStatus.SERVICE_UNAVAILABLE, "turn queue wait exceeded")
+            finally:
+                self.queued -= 1
+
+            self.telemetry_client.track_metric(
+                "TurnQueueWaitMs", (time.perf_counter() - arrived) * 1000
+            )
+            self.in_flight += 1
+            try:
+                return await turn()
+            finally:
+                self.in_flight -= 1
+                self._slots.release()
+                queue.lock.release()
+        finally:
+            queue.pending -= 1
+            if queue.pending == 0:
+                del self._conversations[conversation_id]
+
+    async def _acquire(self, queue: _ConversationQueue):
+        # Take the conversation first so that a conversation waiting on its own
+        # earlier turn does not hold one of the global slots.
+        await queue.lock.acquire()
+        try:
+            await self._slots.acquire()
+        except BaseException:
+            queue.lock.release()
+            raise
+
+    def _shed(self, status: HTTPStatus, reason: str):
+        self.telemetry_client.track_metric(
+            "TurnsShed", 1, properties={"status": str(int(status)), "reason": reason}
+        )
+        raise TurnRejected(status, self.retry_after, reason)
@@ -0,0 +1,140 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Typing indicator for the turns that keep the user waiting.
+
+While LUIS answers (MainDialog.act_step, TextToLuisPrompt.on_recognize) the
+user sees nothing. DeferredTypingMiddleware sends a typing activity when a
+message turn has not replied within `delay_seconds`, then every
+`period_seconds` until the turn's first reply or its end.
+
+A fast turn only costs a loop timer, cancelled by the first reply; unlike
+botbuilder's ShowTypingMiddleware no task is started, and the typing
+activities go straight to the adapter, so they neither run the turn's send
+handlers nor mark the turn as responded. Sends still in progress when the
+turn ends are cancelled; failed ones are reported as TypingIndicatorFailed.
+
+Each time a turn crosses the delay, the dialog code it is waiting in (the
+innermost frame of dialogs/ in the turn's chain of awaited coroutines, else
+of the bot's own code) is counted in `crossings` and reported as
+TypingIndicatorSent, a latency signal per dialog step.
+"""
+
+import asyncio
+import os
+import traceback
+from collections import Counter
+from typing import Awaitable, Callable, List, Optional, Set
+
+from botbuilder.core import (
+    BotAdapter,
+    BotTelemetryClient,
+    Middleware,
+    NullTelemetryClient,
+    TurnContext,
+)
+from botbuilder.schema import Activity, ActivityTypes, DeliveryModes
+from botframework.connector.auth import ClaimsIdentity, SkillValidation
+
+from loop_watchdog import ROOT, attribute
+
+
+def awaiting_stack(task: asyncio.Task) -> traceback.StackSummary:
+    """The frames of the coroutines `task` is awaiting, outermost first."""
+    frames = []
+    awaited = task.get_coro()
+    while awaited is not None:
+        frame = getattr(awaited, "cr_frame", None) or getattr(awaited, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append((frame, frame.f_lineno))
+        awaited = getattr(awaited, "cr_await", None) or getattr(awaited, "gi_await", None)
+    return traceback.StackSummary.extract(frames, lookup_lines=False)
+
+
+class DeferredTypingMiddleware(Middleware):
+    def __init__(
+        self,
+        delay_seconds: float = 1.0,
+        period_seconds: float = 3.0,
+        telemetry_client: BotTelemetryClient = None,
+    ):
+        if delay_seconds < 0 or period_seconds <= 0:
+            raise ValueError("The delay must be >= 0 and the period > 0")
+        self.delay_seconds = delay_seconds
+        self.period_seconds = period_seconds
+        self.telemetry_client = telemetry_client or NullTelemetryClient()
+        # Dialog step -> turns that crossed the delay while waiting in it
+        self.crossings: Counter = Counter()
+
+    async def on_turn(self, context: TurnContext, logic: Callable[[], Awaitable]):
+        if not self._wants_typing(context):
+            return await logic()
+
+        loop = asyncio.get_event_loop()
+        task = asyncio.current_task()
+        timer: List[Optional[asyncio.TimerHandle]] = [None]
+        # Typing activities being sent
+        sends: Set[asyncio.Future] = set()
+
+        def send_typing():
+            step = self.step_of(task)
+            self.crossings[step] += 1
+            self.telemetry_client.track_metric("TypingIndicatorSent", 1, properties={"step": step})
+            typing = TurnContext.apply_conversation_reference(
+                Activity(type=ActivityTypes.typing, relates_to=context.activity.relates_to),
+                TurnContext.get_conversation_reference(context.activity),
+            )
+            sending = asyncio.ensure_future(context.adapter.send_activities(context, [typing]))
+            sends.add(sending)
+            sending.add_done_callback(sent)
+            timer[0] = loop.call_later(self.period_seconds, send_typing)
+
+        def sent(sending: asyncio.Future):
+            sends.discard(sending)
+            if not sending.cancelled() and sending.exception() is not None:
+                self.telemetry_client.track_event(
+                    "TypingIndicatorFailed", properties={"error": repr(sending.exception())}
+                )
+
+        def stop():
+            if timer[0] is not None:
+                timer[0].cancel()
+                timer[0] = None
+
+        async def on_send(_, activities: List[Activity], next_send: Callable):
+            if any(activity.type != ActivityTypes.typing for activity in activities):
+                stop()
+            return await next_send()
+
+        context.on_send_activities(on_send)
+        timer[0] = loop.call_later(self.delay_seconds, send_typing)
+        try:
+            return await logic()
+        finally:
+            stop()
+            # No typing after the turn's end: sends still in progress are cancelled.
+            for sending in list(sends):
+                sending.cancel()
+            if sends:
+                await asyncio.gather(*sends, return_exceptions=True)
+
+    @staticmethod
+    def step_of(task: Optional[asyncio.Task]) -> str:
+        if task is None:
+            return ""
+        stack = awaiting_stack(task)
+        dialogs = [frame for frame in stack if frame.filename.startswith(os.path.join(ROOT, "dialogs"))]
+        return attribute(dialogs or stack)[0]
+
+    @staticmethod
+    def _wants_typing(context: TurnContext) -> bool:
+        # Skills do not send typing, and expectReplies buffers replies into the HTTP response.
+        claims_identity = context.turn_state.get(BotAdapter.BOT_IDENTITY_KEY)
+        return (
+            context.activity.type == ActivityTypes.message
+            and context.activity.delivery_mode != DeliveryModes.expect_replies
+            and not (
+                isinstance(claims_identity, ClaimsIdentity)
+                and SkillValidation.is_skill_claim(claims_identity.claims)
+            )
+        )
@@ -0,0 +1,261 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Local state cache with write-behind to a durable store.
+
+When conversations are sharded across workers (see shard_router.py), the
+worker that owns a conversation is the only one to read and write its
+state, so that state can be served from the worker's memory.
+WriteBehindStorage keeps conversation state in a local Storage (a
+BoundedMemoryStorage) and writes it to the durable Storage in batches every
+`flush_seconds`, instead of a durable round trip on every turn:
+
+- reads are served locally; a conversation not resident locally is read
+  from the pending writes, else from the durable store, and cached;
+- writes go to the local store, which checks e_tags, and are queued as a
+  snapshot of the written item;
+- flush() writes the latest snapshot of each queued key to the durable
+  store (unconditionally: the owner's write is the latest one);
+- evict() flushes, then drops the cached conversations the worker no longer
+  owns, for the durable store to serve them to their new owner.
+
+Other keys (user state, which any worker may write) are read from and
+written to the durable store directly.
+
+SqliteStorage is a durable Storage in a SQLite file, which the workers of
+one machine can share; production deployments would use a shared database
+Storage instead.
+"""
+
+import asyncio
+import pickle
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Set
+
+from botbuilder.core import BotTelemetryClient, NullTelemetryClient, Storage, StoreItem
+
+
+def is_conversation_key(key: str) -> bool:
+    # ConversationState keys are "<channel id>/conversations/<conversation id>".
+    return "/conversations/" in key
+
+
+def conversation_of(key: str) -> str:
+    return key.split("/conversations/", 1)[1]
+
+
+def _with_e_tag(item: object, e_tag: str) -> object:
+    if isinstance(item, dict):
+        return dict(item, e_tag=e_tag)
+    item.e_tag = e_tag
+    return item
+
+
+def _get_e_tag(item: object):
+    if isinstance(item, dict):
+        return item.get("e_tag")
+    return getattr(item, "e_tag", None)
+
+
+class SqliteStorage(Storage):
+    """Storage in a SQLite file (WAL) that the processes of a machine can share.
+
+    Like SpillStore, statements run on a single dedicated thread and the
+    connection is opened on first use. Every write gets a new e_tag.
+    """
+
+    def __init__(self, path: str):
+        super(SqliteStorage, self).__init__()
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            import sqlite3
+
+            self._connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, data BLOB NOT NULL, e_tag TEXT)"
+            )
+        return self._connection
+
+    def _read(self, keys: List[str]) -> Dict[str, object]:
+        connection = self._connect()
+        found = {}
+        for key in keys:
+            row = connection.execute("SELECT data FROM state WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                found[key] = pickle.loads(row[0])
+        return found
+
+    def _write(self, changes: Dict[str, StoreItem]):
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            for key, change in changes.items():
+                new_e_tag = _get_e_tag(change)
+                if new_e_tag not in (None, "*"):
+                    row = connection.execute(
+                        "SELECT e_tag FROM state WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None and row[0] != new_e_tag:
+                        raise KeyError(
+                            "Etag conflict.\nOriginal: %s\r\nCurrent: %s" % (new_e_tag, row[0])
+                        )
+                e_tag = f"{time.time_ns():x}"
+                data = pickle.dumps(_with_e_tag(change, e_tag), pickle.HIGHEST_PROTOCOL)
+                connection.execute(
+                    "INSERT OR REPLACE INTO state (key, data, e_tag) VALUES (?, ?, ?)",
+                    (key, data, e_tag),
+                )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def _delete(self, keys: List[str]):
+        self._connect().executemany("DELETE FROM state WHERE key = ?", [(key,) for key in keys])
+
+    def _close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    async def _run(self, function, *args):
+        return await asyncio.get_event_loop().run_in_executor(self._executor, function, *args)
+
+    async def read(self, keys: List[str]) -> Dict[str, object]:
+        return await self._run(self._read, list(keys or []))
+
+    async def write(self, changes: Dict[str, StoreItem]):
+        # Pickled here so that the caller's objects are not shared with the thread.
+        changes = pickle.loads(pickle.dumps(changes, pickle.HIGHEST_PROTOCOL))
+        await self._run(self._write, changes)
+
+    async def delete(self, keys: List[str]):
+        await self._run(self._delete, list(keys))
+
+    async def close(self):
+        await self._run(self._close)
+        self._executor.shutdown(wait=True)
+
+
+class WriteBehindStorage(Storage):
+    def __init__(
+        self,
+        local: Storage,
+        durable: Storage,
+        flush_seconds: float = 1.0,
+        max_pending: int = 1000,
+        cached: Callable[[str], bool] = is_conversation_key,
+        telemetry_client: BotTelemetryClient = None,
+    ):
+        super(WriteBehindStorage, self).__init__()
+        self.local = local
+        self.durable = durable
+        self.flush_seconds = flush_seconds
+        # A write queuing more keys than this flushes at once
+        self.max_pending = max_pending
+        self.cached = cached
+        self.telemetry_client = telemetry_client or NullTelemetryClient()
+        # Key -> pickled latest write not yet in the durable store
+        self._pending: Dict[str, bytes] = {}
+        # Keys that may be in the local store
+        self._resident: Set[str] = set()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+
+    async def read(self, keys: List[str]) -> Dict[str, object]:
+        keys = keys or []
+        cached = [key for key in keys if self.cached(key)]
+        data = await self.local.read(cached) if cached else {}
+        missing = [key for key in cached if key not in data]
+        restored = {
+            key: pickle.loads(self._pending[key]) for key in missing if key in self._pending
+        }
+        durable_keys = [key for key in keys if key not in data and key not in restored]
+        if durable_keys:
+            for key, item in (await self.durable.read(durable_keys)).items():
+                if self.cached(key):
+                    restored[key] = item
+                else:
+                    data[key] = item
+        if restored:
+            # Cached with the e_tag they were read with, for the next write to match.
+            await self.local.write(restored)
+            self._resident.update(restored)
+            data.update(restored)
+        return data
+
+    async def write(self, changes: Dict[str, StoreItem]):
+        if changes is None:
+            raise Exception("Changes are required when writing")
+        cached = {key: change for key, change in changes.items() if self.cached(key)}
+        if cached:
+            await self.local.write(cached)
+            for key, change in cached.items():
+                self._pending[key] = pickle.dumps(change, pickle.HIGHEST_PROTOCOL)
+            self._resident.update(cached)
+        direct = {key: change for key, change in changes.items() if not self.cached(key)}
+        if direct:
+            await self.durable.write(direct)
+        if len(self._pending) >= self.max_pending:
+            await self.flush()
+
+    async def delete(self, keys: List[str]):
+        for key in keys:
+            self._pending.pop(key, None)
+            self._resident.discard(key)
+        await self.local.delete([key for key in keys if self.cached(key)])
+        await self.durable.delete(keys)
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def flush(self) -> int:
+        """Write the pending changes to the durable store; returns how many."""
+        async with self._flush_lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            changes = {key: _with_e_tag(pickle.loads(data), "*") for key, data in pending.items()}
+            try:
+                await self.durable.write(changes)
+            except Exception:
+                # Retried by the next flush, unless a newer write replaced them.
+                for key, data in pending.items():
+                    self._pending.setdefault(key, data)
+                raise
+            self.telemetry_client.track_metric("StateWriteBehindFlushed", len(changes))
+            return len(changes)
+
+    async def evict(self, keep: Callable[[str], bool]) -> int:
+        """Flush, then drop the cached keys for which `keep` is false; returns how many."""
+        await self.flush()
+        dropped = [key for key in self._resident if not keep(key)]
+        if dropped:
+            await self.local.delete(dropped)
+            self._resident.difference_update(dropped)
+        return len(dropped)
+
+    async def start(self):
+        self._task = asyncio.ensure_future(self._flush_periodically())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        await self.flush()
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                await self.flush()
+            except Exception as error:  # pylint: disable=broad-except
+                self.telemetry_client.track_event(
+                    "StateWriteBehindFailed", properties={"error": repr(error)}
+                )